@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from app.services.file_parser import UnsupportedFileType
+from app.services.ingest import DocumentInProgress, DuplicateDocument
+from app.services.search import EmbeddingModelMismatch, UnsupportedSearchFilter
+from app.services.uploads import UploadTooLarge
+
+
+@contextmanager
+def upload_errors():
+    # ошибки загрузки файла → понятные клиенту 4xx вместо 500
+    try:
+        yield
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except DuplicateDocument as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UnsupportedFileType as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@contextmanager
+def search_errors():
+    try:
+        yield
+    except UnsupportedSearchFilter as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except EmbeddingModelMismatch as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@contextmanager
+def delete_errors():
+    try:
+        yield
+    except DocumentInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
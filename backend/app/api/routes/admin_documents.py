@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, File, Form, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from sqlalchemy.orm import Session
 
 from app.api.deps import require_admin
+from app.api.errors import delete_errors, upload_errors
 from app.db.session import get_db
-from app.schemas.document import DocumentOut
+from app.schemas.document import BulkDeleteRequest, DocumentOut, DocumentStatusOut
 from app.models.document import Document
 
 router = APIRouter(prefix="/admin/documents", tags=["admin"])
@@ -21,23 +22,71 @@ def list_documents(
 def upload_document(
     title: str = Form(...),
     file: UploadFile = File(...),
+    tag: str | None = Form(default=None, max_length=128),
+    corpus: str | None = Form(default=None, max_length=64),
     db: Session = Depends(get_db),
     admin=Depends(require_admin),
 ):
     from app.services.ingest import ingest_document
-    doc = ingest_document(db=db, title=title, file=file, uploaded_by=admin.id)
+    with upload_errors():
+        doc = ingest_document(db=db, title=title, file=file, uploaded_by=admin.id, tag=tag or None, corpus=corpus or None)
     return doc
 
 
-@router.delete("/{document_id}")
-def delete_document(
+@router.get("/{document_id}/status", response_model=DocumentStatusOut)
+def document_status(
+    document_id: str,
+    db: Session = Depends(get_db),
+    _: object = Depends(require_admin),
+):
+    doc = db.query(Document).filter(Document.id == document_id).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return doc
+
+
+@router.post("/{document_id}/retry", response_model=DocumentStatusOut)
+def retry_document(
     document_id: str,
     db: Session = Depends(get_db),
     _: object = Depends(require_admin),
 ):
     doc = db.query(Document).filter(Document.id == document_id).first()
     if not doc:
-        return {"ok": True}
-    db.delete(doc)
-    db.commit()
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc.status == "failed":
+        from app.services.ingest_queue import notify_ingest_workers
+
+        doc.status = "queued"
+        doc.attempts = 0
+        doc.next_attempt_at = None
+        db.commit()
+        db.refresh(doc)
+        notify_ingest_workers()
+    return doc
+
+
+@router.delete("/{document_id}")
+def delete_document(
+    document_id: str,
+    db: Session = Depends(get_db),
+    _: object = Depends(require_admin),
+):
+    from app.services.ingest import delete_documents
+
+    with delete_errors():
+        delete_documents(db, [document_id])
     return {"ok": True}
+
+
+@router.post("/bulk-delete")
+def bulk_delete_documents(
+    payload: BulkDeleteRequest,
+    db: Session = Depends(get_db),
+    _: object = Depends(require_admin),
+):
+    from app.services.ingest import delete_documents
+
+    with delete_errors():
+        deleted = delete_documents(db, payload.ids)
+    return {"ok": True, "deleted": len(deleted)}
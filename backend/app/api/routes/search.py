@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, File, Form, UploadFile
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 
 from app.api.deps import get_optional_user
+from app.api.errors import search_errors, upload_errors
+from app.core.config import settings
 from app.db.session import get_db
 from app.models.user import User
 from app.observability.langfuse_client import get_langfuse
 from app.observability.metrics import SEARCH_DURATION_SECONDS, SEARCH_REQUESTS_TOTAL
-from app.schemas.search import SearchResponse
+from app.schemas.search import BatchSearchRequest, BatchSearchResponse, SearchFilters, SearchResponse
 from sqlalchemy.orm import Session
 import time
 
@@ -13,11 +18,17 @@ router = APIRouter(prefix="/search", tags=["search"])
 
 
 @router.post("", response_model=SearchResponse)
-def search(
+async def search(
     text: str | None = Form(default=None),
     file: UploadFile | None = File(default=None),
     min_similarity_percent: float | None = Form(default=None),
+    query_mode: Literal["auto", "single", "document"] = Form(default="single"),
     rerank: bool = Form(default=True),
+    uploaded_after: datetime | None = Form(default=None),
+    uploaded_before: datetime | None = Form(default=None),
+    uploaded_by: str | None = Form(default=None),
+    tag: str | None = Form(default=None),
+    corpus: str | None = Form(default=None),
     db: Session = Depends(get_db),
     user: User | None = Depends(get_optional_user),
 ):
@@ -25,32 +36,92 @@ def search(
     started = time.perf_counter()
     SEARCH_REQUESTS_TOTAL.labels(mode=mode).inc()
 
+    filters = SearchFilters(
+        uploaded_after=uploaded_after,
+        uploaded_before=uploaded_before,
+        uploaded_by=uploaded_by,
+        tag=tag,
+        corpus=corpus,
+    )
+
     lf = get_langfuse()
-    from app.services.search import search_sources
-    if lf:
-        with lf.start_as_current_span(
-            name="search",
-            input={"has_file": bool(file), "text_len": len(text or ""), "min_similarity_percent": min_similarity_percent, "rerank": rerank},
-            metadata={"user_id": (user.id if user else None)},
-        ) as span:
-            query_text, results = search_sources(
+    from app.services.search import search_sources_async
+    with upload_errors(), search_errors():
+        if lf:
+            with lf.start_as_current_span(
+                name="search",
+                input={"has_file": bool(file), "text_len": len(text or ""), "min_similarity_percent": min_similarity_percent, "query_mode": query_mode, "rerank": rerank, "filters": filters.model_dump(mode="json", exclude_none=True)},
+                metadata={"user_id": (user.id if user else None)},
+            ) as span:
+                query_text, results = await search_sources_async(
+                    db=db,
+                    text=text,
+                    file=file,
+                    user_id=(user.id if user else None),
+                    min_similarity_percent=min_similarity_percent,
+                    query_mode=query_mode,
+                    rerank=rerank,
+                    filters=filters,
+                )
+                span.update(output={"results": len(results)})
+        else:
+            query_text, results = await search_sources_async(
                 db=db,
                 text=text,
                 file=file,
                 user_id=(user.id if user else None),
                 min_similarity_percent=min_similarity_percent,
+                query_mode=query_mode,
                 rerank=rerank,
+                filters=filters,
             )
-            span.update(output={"results": len(results)})
-    else:
-        query_text, results = search_sources(
-            db=db,
-            text=text,
-            file=file,
-            user_id=(user.id if user else None),
-            min_similarity_percent=min_similarity_percent,
-            rerank=rerank,
-        )
 
     SEARCH_DURATION_SECONDS.labels(mode=mode).observe(time.perf_counter() - started)
     return SearchResponse(query=query_text, results=results)
+
+
+@router.post("/batch", response_model=BatchSearchResponse)
+async def search_batch(
+    req: BatchSearchRequest,
+    db: Session = Depends(get_db),
+    user: User | None = Depends(get_optional_user),
+):
+    if len(req.queries) > settings.search_batch_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries (max {settings.search_batch_max_queries})",
+        )
+
+    started = time.perf_counter()
+    SEARCH_REQUESTS_TOTAL.labels(mode="batch").inc()
+
+    lf = get_langfuse()
+    from app.services.search import search_sources_batch_async
+    with search_errors():
+        if lf:
+            with lf.start_as_current_span(
+                name="search_batch",
+                input={"queries": len(req.queries), "min_similarity_percent": req.min_similarity_percent, "rerank": req.rerank, "filters": bool(req.filters)},
+                metadata={"user_id": (user.id if user else None)},
+            ) as span:
+                items = await search_sources_batch_async(
+                    db=db,
+                    queries=req.queries,
+                    user_id=(user.id if user else None),
+                    min_similarity_percent=req.min_similarity_percent,
+                    rerank=req.rerank,
+                    filters=req.filters,
+                )
+                span.update(output={"results": sum(len(r) for _, r in items)})
+        else:
+            items = await search_sources_batch_async(
+                db=db,
+                queries=req.queries,
+                user_id=(user.id if user else None),
+                min_similarity_percent=req.min_similarity_percent,
+                rerank=req.rerank,
+                filters=req.filters,
+            )
+
+    SEARCH_DURATION_SECONDS.labels(mode="batch").observe(time.perf_counter() - started)
+    return BatchSearchResponse(results=[SearchResponse(query=q, results=r) for q, r in items])
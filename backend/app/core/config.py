@@ -18,8 +18,42 @@ class Settings(BaseSettings):
 
     milvus_host: str = "standalone"
     milvus_port: int = 19530
+    # ANN-индекс: IVF_FLAT | IVF_SQ8 | IVF_PQ | HNSW | FLAT. Строится при создании версии коллекции,
+    # так что смена типа/параметров построения вступает в силу после reindex_milvus.
+    # Выбор — по замерам: python -m app.scripts.bench_ann_index
+    milvus_index_type: str = "IVF_FLAT"
+    milvus_ivf_nlist: int = 128
+    milvus_pq_m: int = 8
+    milvus_pq_nbits: int = 8
+    milvus_hnsw_m: int = 16
+    milvus_hnsw_ef_construction: int = 200
+    milvus_search_nprobe: int = 10
+    milvus_search_ef: int = 64
+    search_top_k: int = 8
+    # новые версии коллекции хранят текст чанка, окно контекста и название документа —
+    # поиск не читает чанки из Postgres.
+    # Существующая коллекция мигрирует через reindex_milvus
+    milvus_payload_enabled: bool = False
+    # корпус документов без явного корпуса; его векторы лежат в partition _default
+    default_corpus: str = "default"
+    # при пороге min_similarity_percent — range search: Milvus возвращает все хиты выше порога, но не больше этого.
+    # Все они идут в реранкер, поэтому по умолчанию — небольшое кратное top_k (None → 2 * search_top_k)
+    search_range_max_results: int | None = None
+    # вставки в Milvus копятся фоновым писателем (services/milvus_writer.py) и уходят пачками, без flush на каждую
+    milvus_write_batch_rows: int = 1000
+    milvus_write_max_wait_ms: float = 200.0
 
     storage_dir: Path = Path("/data/storage")
+    # совпадает с client_max_body_size в nginx
+    max_upload_bytes: int = 50 * 1024 * 1024
+    upload_block_size: int = 1024 * 1024
+
+    # параллельный разбор PDF по диапазонам страниц (пул процессов); <= 1 — всегда последовательно
+    pdf_parse_workers: int = 4
+    pdf_parallel_min_pages: int = 32
+    # движок извлечения текста: "pdfium" (быстрый) или "pdfplumber"; пустые страницы pdfium добираются pdfplumber
+    pdf_backend: str = "pdfium"
+    pdf_fallback_min_chars: int = 1
     embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
 
     panel_email: str = Field(
@@ -39,6 +73,73 @@ class Settings(BaseSettings):
         default=None,
         validation_alias=AliasChoices("CUSTOM_LLM_ENDPOINT", "custom_llm_endpoint"),
     )
+    custom_llm_batch_endpoint: str | None = Field(
+        default=None,
+        validation_alias=AliasChoices("CUSTOM_LLM_BATCH_ENDPOINT", "custom_llm_batch_endpoint"),
+    )
+    custom_llm_timeout_seconds: float = 30.0
+
+    # async search pipeline: размеры пулов для CPU-шагов (парсинг, encode) и блокирующего I/O
+    search_cpu_workers: int = 4
+    search_io_workers: int = 32
+    # пул соединений Postgres: поиск держит соединение только на время выборки, не на время await
+    postgres_pool_size: int = 20
+    postgres_max_overflow: int = 20
+    search_batch_max_queries: int = 256
+
+    # document-режим поиска (длинный запрос режется на чанки)
+    document_query_max_chunks: int = 256
+    document_query_max_results: int = 20
+    document_query_max_spans: int = 5
+    document_query_coverage_min_score: float = 0.5
+
+    # общий Redis (сервис redisdb); пусто — только in-process кеши
+    redis_url: str | None = None
+    redis_socket_timeout_seconds: float = 0.5
+    # после ошибки Redis кеши столько секунд работают только in-process
+    redis_retry_cooldown_seconds: float = 30.0
+
+    embedding_cache_size: int = 2048
+    embedding_cache_ttl_seconds: int = 60 * 60
+    embedding_cache_redis_ttl_seconds: int = 60 * 60 * 24
+
+    # постоянное хранилище эмбеддингов чанков (memmap + индекс text_hash → строка), по каталогу на модель;
+    # пусто — storage_dir/embeddings. Заполняется при ingest, читается reindex_milvus
+    embedding_store_enabled: bool = True
+    embedding_store_dir: Path | None = None
+
+    # кеш готовых ответов поиска; ключ включает версию индекса (см. search_cache.bump_index_version)
+    search_cache_enabled: bool = True
+    search_cache_size: int = 1024
+    search_cache_ttl_seconds: int = 60 * 5
+    search_cache_redis_ttl_seconds: int = 60 * 60
+
+    # SearchEvent пишутся фоновым потоком пачками; False — синхронно в запросе, как раньше
+    search_events_buffered: bool = True
+    search_events_queue_size: int = 10000
+    search_events_batch_size: int = 200
+    search_events_flush_interval_seconds: float = 2.0
+
+    # фоновая очередь ingest (Postgres: documents.status). Воркеры — отдельный процесс
+    # (python -m app.services.ingest_queue), чтобы парсинг и encode не отнимали CPU и модель у поиска;
+    # воркеры внутри API-процесса — только явно (например, для локальной разработки)
+    ingest_workers: int = 2
+    ingest_workers_in_process: bool = False
+    ingest_worker_metrics_port: int = 8001
+    ingest_max_attempts: int = 3
+    ingest_retry_backoff_seconds: float = 10.0
+    ingest_poll_interval_seconds: float = 2.0
+    # задача в промежуточном статусе без обновлений дольше этого считается брошенной (упавший процесс)
+    # и берётся снова; живая обработка продлевает её на каждой записанной пачке
+    ingest_job_stale_seconds: int = 60 * 60
+    # потоковый конвейер parse → chunk → embed → insert: чанков в пачке и пачек в каждой очереди между стадиями
+    ingest_embed_batch_size: int = 64
+    ingest_pipeline_queue_size: int = 2
+
+    # micro-batching одновременных encode-запросов
+    embedding_batching_enabled: bool = True
+    embedding_batch_max_size: int = 32
+    embedding_batch_max_wait_ms: float = 5.0
 
 
 settings = Settings()
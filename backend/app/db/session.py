@@ -3,7 +3,12 @@ from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-engine = create_engine(settings.postgres_dsn, pool_pre_ping=True)
+engine = create_engine(
+    settings.postgres_dsn,
+    pool_pre_ping=True,
+    pool_size=settings.postgres_pool_size,
+    max_overflow=settings.postgres_max_overflow,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
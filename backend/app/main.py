@@ -19,6 +19,7 @@ from app.models.user import User
 from sqlalchemy import text
 from sqlalchemy import inspect
 from app.services.embeddings import get_model
+from app.services.ingest_queue import get_ingest_workers, update_queue_depth
 from app.services.milvus_client import get_collection
 from app.observability.metrics import (
     ACTIVE_USERS,
@@ -60,6 +61,44 @@ def on_startup():
                 conn.execute(text("ALTER TABLE users ADD COLUMN is_active BOOLEAN NOT NULL DEFAULT TRUE"))
             if "created_at" not in cols:
                 conn.execute(text("ALTER TABLE users ADD COLUMN created_at TIMESTAMP NOT NULL DEFAULT NOW()"))
+    if "documents" in insp.get_table_names():
+        cols = {c["name"] for c in insp.get_columns("documents")}
+        with engine.begin() as conn:
+            if "attempts" not in cols:
+                conn.execute(text("ALTER TABLE documents ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"))
+            if "error" not in cols:
+                conn.execute(text("ALTER TABLE documents ADD COLUMN error TEXT"))
+            if "next_attempt_at" not in cols:
+                conn.execute(text("ALTER TABLE documents ADD COLUMN next_attempt_at TIMESTAMP"))
+            if "updated_at" not in cols:
+                conn.execute(text("ALTER TABLE documents ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT NOW()"))
+            if "sha256" not in cols:
+                conn.execute(text("ALTER TABLE documents ADD COLUMN sha256 VARCHAR(64)"))
+            if "chunks_embedded" not in cols:
+                conn.execute(text("ALTER TABLE documents ADD COLUMN chunks_embedded INTEGER NOT NULL DEFAULT 0"))
+            if "chunks_reused" not in cols:
+                conn.execute(text("ALTER TABLE documents ADD COLUMN chunks_reused INTEGER NOT NULL DEFAULT 0"))
+            if "tag" not in cols:
+                conn.execute(text("ALTER TABLE documents ADD COLUMN tag VARCHAR(128)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_tag ON documents (tag)"))
+            if "corpus" not in cols:
+                # существующие документы — в корпусе по умолчанию, как и их векторы (partition _default)
+                default_corpus = settings.default_corpus.replace("'", "''")
+                conn.execute(
+                    text(f"ALTER TABLE documents ADD COLUMN corpus VARCHAR(64) NOT NULL DEFAULT '{default_corpus}'")
+                )
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_corpus ON documents (corpus)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_status ON documents (status)"))
+            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_documents_sha256 ON documents (sha256)"))
+    if "chunks" in insp.get_table_names():
+        cols = {c["name"] for c in insp.get_columns("chunks")}
+        with engine.begin() as conn:
+            if "text_hash" not in cols:
+                conn.execute(text("ALTER TABLE chunks ADD COLUMN text_hash VARCHAR(64)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chunks_text_hash ON chunks (text_hash)"))
+            conn.execute(
+                text("CREATE INDEX IF NOT EXISTS ix_chunks_document_id_chunk_index ON chunks (document_id, chunk_index)")
+            )
 
     # Warm up heavy deps so first request doesn't hang behind proxy timeouts.
     try:
@@ -78,6 +117,10 @@ def on_startup():
     # Не блокируем startup: Milvus/gRPC иногда стартует медленно.
     threading.Thread(target=_milvus_warmup, daemon=True).start()
 
+    # ingest идёт фоновыми воркерами, а не в запросе загрузки; по умолчанию — в отдельном процессе
+    if settings.ingest_workers_in_process:
+        get_ingest_workers().start()
+
     def _update_business_metrics():
         while True:
             db = SessionLocal()
@@ -94,6 +137,7 @@ def on_startup():
                 TOTAL_DOCUMENTS.set(total_documents)
                 TOTAL_SEARCHES.set(total_searches)
                 SEARCHES_24H.set(searches_24h)
+                update_queue_depth(db)
             except Exception as e:
                 logger.warning("Business metrics update failed: %s", e)
             finally:
@@ -120,3 +164,26 @@ def on_startup():
                 db.commit()
     finally:
         db.close()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    from app.services.embedding_store import close_embedding_store
+    from app.services.embeddings import stop_batcher
+    from app.services.event_sink import stop_event_sink
+    from app.services.executors import shutdown_executors
+    from app.services.file_parser import shutdown_pdf_pool
+    from app.services.ingest_queue import stop_ingest_workers
+    from app.services.llm import close_async_http_client
+    from app.services.milvus_writer import stop_milvus_writer
+
+    await close_async_http_client()
+    stop_ingest_workers()
+    # дописывает очередь вставок и делает завершающий flush
+    stop_milvus_writer()
+    stop_batcher()
+    close_embedding_store()
+    # дописываем буфер SearchEvent до закрытия процесса
+    stop_event_sink()
+    shutdown_executors()
+    shutdown_pdf_pool()
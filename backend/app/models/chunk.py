@@ -1,17 +1,21 @@
 from __future__ import annotations
 
 import uuid
-from sqlalchemy import Column, ForeignKey, Integer, String, Text
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Text
 
 from app.models.base import Base
 
 
 class Chunk(Base):
     __tablename__ = "chunks"
+    # поиск соседей идёт по точным парам (document_id, chunk_index); префикс покрывает и выборки по document_id
+    __table_args__ = (Index("ix_chunks_document_id_chunk_index", "document_id", "chunk_index"),)
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    document_id = Column(String, ForeignKey("documents.id"), index=True, nullable=False)
+    document_id = Column(String, ForeignKey("documents.id"), nullable=False)
     chunk_index = Column(Integer, nullable=False)
     page_number = Column(Integer, nullable=True)
     text = Column(Text, nullable=False)
+    # sha256 нормализованного текста (file_parser.chunk_text_hash) — ключ повторного использования эмбеддингов
+    text_hash = Column(String(64), nullable=True, index=True)
 
@@ -2,8 +2,9 @@ from __future__ import annotations
 
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
 
+from app.core.config import settings
 from app.models.base import Base
 
 
@@ -16,6 +17,20 @@ class Document(Base):
     content_type = Column(String, nullable=False)
     uploaded_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     uploaded_by = Column(String, ForeignKey("users.id"), nullable=True)
-    status = Column(String, default="processed", nullable=False)
+    # произвольная метка источника (коллекция, подборка) — фильтр поиска
+    tag = Column(String(128), nullable=True, index=True)
+    # корпус (отдел) — отдельный partition в Milvus, поиск идёт в пределах одного корпуса
+    corpus = Column(String(64), default=lambda: settings.default_corpus, nullable=False, index=True)
+    # queued → parsing → embedding → indexing → processed | failed (см. services/ingest_queue.py)
+    status = Column(String, default="processed", nullable=False, index=True)
     num_pages = Column(Integer, default=0, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # sha256 исходного файла: повторная загрузка того же файла отклоняется
+    sha256 = Column(String(64), nullable=True, unique=True, index=True)
+    # сколько чанков закодировано моделью заново, а сколько взято готовыми по text_hash
+    chunks_embedded = Column(Integer, default=0, nullable=False)
+    chunks_reused = Column(Integer, default=0, nullable=False)
 
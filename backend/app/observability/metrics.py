@@ -30,3 +30,56 @@ ACTIVE_USERS = Gauge("app_active_users", "Active users")
 TOTAL_DOCUMENTS = Gauge("app_total_documents", "Total documents")
 TOTAL_SEARCHES = Gauge("app_total_searches", "Total searches")
 SEARCHES_24H = Gauge("app_searches_24h", "Searches in last 24h")
+
+CACHE_REQUESTS_TOTAL = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache name, tier and result",
+    labelnames=("cache", "tier", "result"),
+)
+
+EMBEDDING_QUEUE_DEPTH = Gauge("embedding_queue_depth", "Embedding requests waiting for the batcher")
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_batch_size",
+    "Texts per coalesced encode call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+EMBEDDING_BATCH_WAIT_SECONDS = Histogram(
+    "embedding_batch_wait_seconds",
+    "Time an embedding request spent queued before its batch was encoded",
+    buckets=(0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.5, 1),
+)
+
+SEARCH_EVENTS_QUEUE_DEPTH = Gauge("search_events_queue_depth", "Search events waiting to be written")
+SEARCH_EVENTS_WRITTEN_TOTAL = Counter("search_events_written_total", "Search events written to Postgres")
+SEARCH_EVENTS_DROPPED_TOTAL = Counter(
+    "search_events_dropped_total",
+    "Search events dropped before reaching Postgres",
+    labelnames=("reason",),
+)
+SEARCH_EVENTS_FLUSH_SECONDS = Histogram(
+    "search_events_flush_seconds",
+    "Duration of one bulk search events write",
+    buckets=(0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2),
+)
+
+INGEST_JOBS_TOTAL = Counter(
+    "ingest_jobs_total",
+    "Finished ingest job attempts by result",
+    labelnames=("result",),
+)
+MILVUS_WRITE_QUEUE_DEPTH = Gauge("milvus_write_queue_depth", "Insert requests waiting for the Milvus writer")
+
+MILVUS_WRITE_BATCH_ROWS = Histogram(
+    "milvus_write_batch_rows",
+    "Rows per coalesced Milvus insert",
+    buckets=(1, 8, 32, 64, 128, 256, 512, 1000, 2000, 5000),
+)
+
+INGEST_CHUNKS_TOTAL = Counter(
+    "ingest_chunks_total",
+    "Ingested chunks by embedding source (embedded by the model or reused by text hash)",
+    labelnames=("source",),
+)
+INGEST_QUEUE_DEPTH = Gauge("ingest_queue_depth", "Documents waiting in the ingest queue")
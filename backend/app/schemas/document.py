@@ -1,5 +1,5 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class DocumentOut(BaseModel):
@@ -8,9 +8,29 @@ class DocumentOut(BaseModel):
     filename: str
     content_type: str
     uploaded_at: datetime
+    uploaded_by: str | None = None
+    tag: str | None = None
+    corpus: str = "default"
     status: str
     num_pages: int
 
     class Config:
         from_attributes = True
 
+
+class DocumentStatusOut(BaseModel):
+    id: str
+    status: str
+    attempts: int
+    error: str | None = None
+    next_attempt_at: datetime | None = None
+    updated_at: datetime
+    chunks_embedded: int = 0
+    chunks_reused: int = 0
+
+    class Config:
+        from_attributes = True
+
+
+class BulkDeleteRequest(BaseModel):
+    ids: list[str] = Field(min_length=1, max_length=1000)
@@ -1,6 +1,15 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
+class MatchedSpan(BaseModel):
+    query_chunk_index: int
+    query_excerpt: str
+    score: float
+    page_number: int | None = None
+
+
 class SearchResultItem(BaseModel):
     document_id: str
     title: str
@@ -8,8 +17,38 @@ class SearchResultItem(BaseModel):
     rerank_score: float | None = None
     excerpt: str
     page_number: int | None = None
+    # только для document-режима: доля чанков запроса, нашедших этот источник, и сами совпадения
+    coverage: float | None = None
+    matched_spans: list[MatchedSpan] | None = None
 
 
 class SearchResponse(BaseModel):
     query: str
     results: list[SearchResultItem]
+
+
+class SearchFilters(BaseModel):
+    # применяются внутри поиска Milvus; naive datetime считается UTC
+    uploaded_after: datetime | None = None
+    uploaded_before: datetime | None = None
+    uploaded_by: str | None = None
+    tag: str | None = None
+    # корпус (отдел): поиск только в его partition
+    corpus: str | None = None
+
+    def is_empty(self) -> bool:
+        return not any(self.model_dump().values())
+
+    def has_scalar_filters(self) -> bool:
+        return any(self.model_dump(exclude={"corpus"}).values())
+
+
+class BatchSearchRequest(BaseModel):
+    queries: list[str]
+    min_similarity_percent: float | None = None
+    rerank: bool = False
+    filters: SearchFilters | None = None
+
+
+class BatchSearchResponse(BaseModel):
+    results: list[SearchResponse]
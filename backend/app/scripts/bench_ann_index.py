@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+from app.services.embedding_store import get_embedding_store
+from app.services.milvus_client import INDEX_TYPES, connect, get_collection
+
+DEFAULT_CONFIGS = [
+    "IVF_FLAT:nlist=128:nprobe=10",
+    "IVF_FLAT:nlist=1024:nprobe=32",
+    "IVF_SQ8:nlist=1024:nprobe=32",
+    "IVF_PQ:nlist=1024,m=16,nbits=8:nprobe=32",
+    "HNSW:M=16,efConstruction=200:ef=64",
+    "HNSW:M=32,efConstruction=360:ef=128",
+]
+
+
+def parse_config(spec: str) -> tuple[str, dict, dict]:
+    """TYPE[:build k=v,...][:search k=v,...], например HNSW:M=16,efConstruction=200:ef=64."""
+    parts = spec.split(":")
+    index_type = parts[0].upper()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type '{index_type}' (available: {', '.join(INDEX_TYPES)})")
+
+    def kv(text: str) -> dict:
+        return {k: int(v) for k, v in (item.split("=", 1) for item in text.split(",") if item)}
+
+    build = kv(parts[1]) if len(parts) > 1 else {}
+    search = kv(parts[2]) if len(parts) > 2 else {}
+    return index_type, build, search
+
+
+def load_vectors(source: str, limit: int) -> np.ndarray:
+    if source == "store":
+        store = get_embedding_store()
+        if store is None:
+            raise SystemExit("Embedding store is disabled (EMBEDDING_STORE_ENABLED=false); use --source milvus")
+        data = store.vectors()
+        return np.asarray(data[:limit], dtype=np.float32)
+
+    col = get_collection()
+    it = col.query_iterator(batch_size=1000, expr="", output_fields=["embedding"])
+    rows: list[list[float]] = []
+    try:
+        while len(rows) < limit:
+            page = it.next()
+            if not page:
+                break
+            rows.extend(r["embedding"] for r in page)
+    finally:
+        it.close()
+    return np.asarray(rows[:limit], dtype=np.float32)
+
+
+def exact_top_k(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    # эталон: полный перебор по скалярному произведению (та же метрика IP, что в проде)
+    scores = queries @ data.T
+    top = np.argpartition(-scores, kth=min(k, data.shape[0] - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def bench_config(name: str, spec: str, data: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    index_type, build, search = parse_config(spec)
+    if utility.has_collection(name):
+        utility.drop_collection(name)
+    schema = CollectionSchema(
+        fields=[
+            FieldSchema("id", DataType.INT64, is_primary=True),
+            FieldSchema("embedding", DataType.FLOAT_VECTOR, dim=data.shape[1]),
+        ]
+    )
+    col = Collection(name, schema)
+    try:
+        for start in range(0, data.shape[0], 10000):
+            part = data[start : start + 10000]
+            col.insert([list(range(start, start + part.shape[0])), part.tolist()])
+        col.flush()
+        started = time.perf_counter()
+        col.create_index(
+            field_name="embedding",
+            index_params={"index_type": index_type, "metric_type": "IP", "params": build},
+        )
+        utility.wait_for_index_building_complete(name)
+        build_seconds = time.perf_counter() - started
+        col.load()
+
+        param = {"metric_type": "IP", "params": search}
+        for q in queries[:5]:
+            col.search(data=[q.tolist()], anns_field="embedding", param=param, limit=k)
+
+        latencies: list[float] = []
+        hits = 0
+        for q, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            res = col.search(data=[q.tolist()], anns_field="embedding", param=param, limit=k)
+            latencies.append(time.perf_counter() - t0)
+            hits += len({h.id for h in res[0]} & set(expected.tolist()))
+    finally:
+        utility.drop_collection(name)
+
+    total = sum(latencies)
+    return {
+        "config": spec,
+        "recall": hits / (len(queries) * k),
+        "qps": len(queries) / total if total > 0 else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "build_s": build_seconds,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Recall@k / QPS / p95 ANN-индексов Milvus на наших эмбеддингах")
+    ap.add_argument("configs", nargs="*", default=DEFAULT_CONFIGS, help="TYPE[:build k=v,...][:search k=v,...]")
+    ap.add_argument("--source", choices=("store", "milvus"), default="store", help="откуда брать векторы")
+    ap.add_argument("--limit", type=int, default=100_000, help="сколько векторов индексировать")
+    ap.add_argument("--queries", type=int, default=500, help="сколько отложенных векторов использовать как запросы")
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    connect()
+    vectors = load_vectors(args.source, args.limit + args.queries)
+    if vectors.shape[0] <= args.queries:
+        raise SystemExit(f"Not enough vectors ({vectors.shape[0]}) for {args.queries} queries")
+
+    # запросы — отложенные векторы корпуса: в индексируемых данных их нет
+    rng = np.random.default_rng(args.seed)
+    perm = rng.permutation(vectors.shape[0])
+    queries = vectors[perm[: args.queries]]
+    data = vectors[perm[args.queries :]]
+    truth = exact_top_k(data, queries, args.k)
+    print(f"{data.shape[0]} vectors (dim {data.shape[1]}), {queries.shape[0]} queries, k={args.k}")
+
+    print(f"{'config':<44} {'recall@k':>9} {'QPS':>8} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}")
+    for i, spec in enumerate(args.configs):
+        try:
+            r = bench_config(f"bench_ann_{i}", spec, data, queries, truth, args.k)
+        except Exception as e:
+            print(f"{spec:<44} error: {type(e).__name__}: {e}")
+            continue
+        print(
+            f"{r['config']:<44} {r['recall']:>9.3f} {r['qps']:>8.0f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['build_s']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from app.services.file_parser import PDF_BACKENDS, get_pdf_backend
+
+
+def bench_backend(name: str, files: list[Path]) -> dict:
+    backend = get_pdf_backend(name)
+    pages = chars = empty = errors = 0
+    started = time.perf_counter()
+    for path in files:
+        try:
+            n = backend.page_count(path)
+            texts = backend.extract_range(path, 0, n)
+        except Exception as e:
+            errors += 1
+            print(f"  [{name}] {path.name}: {type(e).__name__}: {e}")
+            continue
+        pages += len(texts)
+        chars += sum(len(t) for t in texts)
+        empty += sum(1 for t in texts if not t.strip())
+    elapsed = time.perf_counter() - started
+    return {
+        "backend": name,
+        "files": len(files) - errors,
+        "errors": errors,
+        "pages": pages,
+        "seconds": elapsed,
+        "pages_per_sec": pages / elapsed if elapsed > 0 else 0.0,
+        "chars": chars,
+        "empty_pages": empty,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Сравнение движков извлечения текста PDF на каталоге файлов")
+    ap.add_argument("dir", type=Path, help="каталог с PDF (ищется рекурсивно)")
+    ap.add_argument("--backends", default=",".join(PDF_BACKENDS), help="через запятую")
+    ap.add_argument("--limit", type=int, default=0, help="максимум файлов (0 — все)")
+    args = ap.parse_args()
+
+    files = sorted(p for p in args.dir.rglob("*") if p.suffix.lower() == ".pdf")
+    if args.limit:
+        files = files[: args.limit]
+    if not files:
+        print(f"No PDF files found in {args.dir}")
+        return
+
+    print(f"Benchmarking {len(files)} PDF files (single process, no fallback) ...")
+    rows = [bench_backend(name.strip(), files) for name in args.backends.split(",") if name.strip()]
+
+    header = f"{'backend':<12} {'files':>6} {'pages':>7} {'sec':>9} {'pages/s':>9} {'chars':>11} {'empty':>6}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['backend']:<12} {r['files']:>6} {r['pages']:>7} {r['seconds']:>9.2f} "
+            f"{r['pages_per_sec']:>9.1f} {r['chars']:>11} {r['empty_pages']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
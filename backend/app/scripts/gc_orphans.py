@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.chunk import Chunk
+from app.models.document import Document
+from app.services.ingest_queue import IN_PROGRESS_STATUSES
+from app.services.milvus_client import connect, delete_chunk_embeddings, iter_index_entries
+from app.services.search_cache import bump_index_version
+
+# файлы и каталоги storage_dir, которые не относятся к документам
+_STORAGE_SERVICE_NAMES = {
+    "tmp",
+    "embeddings",
+    "reindex_checkpoint.json",
+    "reindex_checkpoint.json.tmp",
+    "released_partitions.json",
+    "released_partitions.json.tmp",
+}
+
+
+def orphan_chunk_ids(db: Session) -> list[str]:
+    stmt = select(Chunk.id).outerjoin(Document, Document.id == Chunk.document_id).where(Document.id.is_(None))
+    return list(db.execute(stmt).scalars())
+
+
+def orphan_vector_ids(db: Session, batch_size: int) -> list[str]:
+    """Векторы, у которых нет чанка в Postgres (кроме документов, которые сейчас индексируются)."""
+    busy = set(
+        db.execute(
+            select(Document.id).where(Document.status.in_(("queued", *IN_PROGRESS_STATUSES)))
+        ).scalars()
+    )
+    orphans: list[str] = []
+    for page in iter_index_entries(batch_size):
+        candidates = [chunk_id for chunk_id, document_id in page if document_id not in busy]
+        if not candidates:
+            continue
+        # чанк без документа тоже сирота: его вектор удаляется вместе с ним
+        stmt = select(Chunk.id).join(Document, Document.id == Chunk.document_id).where(Chunk.id.in_(candidates))
+        known = set(db.execute(stmt).scalars())
+        orphans.extend(c for c in candidates if c not in known)
+    return orphans
+
+
+def orphan_files(db: Session, tmp_max_age_seconds: float) -> list:
+    known = set(db.execute(select(Document.filename)).scalars())
+    files = [
+        p
+        for p in settings.storage_dir.iterdir()
+        if p.is_file() and p.name not in _STORAGE_SERVICE_NAMES and p.name not in known
+    ]
+    # недописанные загрузки (упавший запрос) в storage_dir/tmp
+    tmp_dir = settings.storage_dir / "tmp"
+    if tmp_dir.is_dir():
+        cutoff = time.time() - tmp_max_age_seconds
+        files.extend(p for p in tmp_dir.iterdir() if p.is_file() and p.stat().st_mtime < cutoff)
+    return files
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Поиск и удаление осиротевших векторов Milvus, чанков и файлов")
+    ap.add_argument("--dry-run", action="store_true", help="только показать, что будет удалено")
+    ap.add_argument("--batch-size", type=int, default=10000, help="векторов Milvus за одну сверку с Postgres")
+    ap.add_argument("--tmp-max-age", type=float, default=3600, help="возраст (с) временных загрузок для удаления")
+    args = ap.parse_args()
+
+    db: Session = SessionLocal()
+    try:
+        chunk_ids = orphan_chunk_ids(db)
+        connect()
+        vector_ids = orphan_vector_ids(db, args.batch_size)
+        files = orphan_files(db, args.tmp_max_age)
+        print(f"Orphans: {len(vector_ids)} vectors, {len(chunk_ids)} chunks, {len(files)} files")
+        if args.dry_run or not (vector_ids or chunk_ids or files):
+            return
+
+        delete_chunk_embeddings(vector_ids)
+        if chunk_ids:
+            db.query(Chunk).filter(Chunk.id.in_(chunk_ids)).delete(synchronize_session=False)
+            db.commit()
+        for p in files:
+            p.unlink(missing_ok=True)
+        if vector_ids or chunk_ids:
+            bump_index_version()
+        print("Done.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import argparse
+
+from sqlalchemy import func, select
+
+from app.db.session import SessionLocal
+from app.models.document import Document
+from app.services.milvus_client import (
+    connect,
+    corpus_partition,
+    load_corpus,
+    partition_load_states,
+    release_corpus,
+)
+
+
+def list_corpora() -> None:
+    db = SessionLocal()
+    try:
+        counts = dict(db.execute(select(Document.corpus, func.count()).group_by(Document.corpus)).all())
+    finally:
+        db.close()
+    states = partition_load_states()
+    print(f"{'corpus':<32} {'partition':<32} {'documents':>9}  state")
+    for corpus in sorted(counts):
+        partition = corpus_partition(corpus)
+        print(f"{corpus:<32} {partition:<32} {counts[corpus]:>9}  {states.get(partition, '-')}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Корпуса документов и их partition в Milvus: загрузка и выгрузка из памяти")
+    group = ap.add_mutually_exclusive_group(required=True)
+    group.add_argument("--list", action="store_true", help="корпуса, их partition и состояние загрузки")
+    group.add_argument("--load", metavar="CORPUS", help="загрузить partition корпуса в память")
+    group.add_argument("--release", metavar="CORPUS", help="выгрузить partition корпуса (поиск по нему загрузит снова)")
+    args = ap.parse_args()
+
+    connect()
+    if args.list:
+        list_corpora()
+    elif args.load:
+        load_corpus(args.load)
+        print(f"Loaded {corpus_partition(args.load)}")
+    else:
+        release_corpus(args.release)
+        print(f"Released {corpus_partition(args.release)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,342 @@
 from __future__ import annotations
 
 import argparse
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, NamedTuple
 
+from pymilvus import Collection
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.db.session import SessionLocal
 from app.models.chunk import Chunk
+from app.models.document import Document
+from app.services.embedding_store import get_embedding_store
 from app.services.embeddings import embed_texts
-from app.services.milvus_client import COLLECTION_NAME, connect, insert_embeddings
+from app.services.file_parser import chunk_context, chunk_text_hash
+from app.services.milvus_client import (
+    COLLECTION_NAME,
+    PAYLOAD_FIELDS,
+    activate_collection_version,
+    collection_fields,
+    connect,
+    count_rows,
+    create_collection_version,
+    current_collection_version,
+    flush_embeddings,
+    get_collection,
+    insert_embeddings,
+    list_collection_versions,
+    live_model_matches,
+)
+from app.services.pipeline import BoundedWorker, prefetch
+from app.services.search_cache import bump_index_version
 
+_COLUMNS = (
+    Chunk.id,
+    Chunk.document_id,
+    Chunk.chunk_index,
+    Chunk.page_number,
+    Chunk.text,
+    Chunk.text_hash,
+    Document.title,
+    Document.uploaded_at,
+    Document.uploaded_by,
+    Document.tag,
+    Document.corpus,
+)
 
-def batched(items: list, batch_size: int):
-    for i in range(0, len(items), batch_size):
-        yield items[i : i + batch_size]
+
+class ChunkRow(NamedTuple):
+    id: str
+    document_id: str
+    chunk_index: int
+    page_number: int | None
+    text: str
+    text_hash: str | None
+    title: str | None
+    uploaded_at: datetime | None
+    uploaded_by: str | None
+    tag: str | None
+    corpus: str | None
+    context: str | None = None
+
+
+def _neighbor_texts(db: Session, rows: list) -> dict[tuple[str, int], str]:
+    # соседи внутри пачки уже есть; отдельно дочитываются только чанки на её границах
+    texts = {(r.document_id, r.chunk_index): r.text for r in rows}
+    keys = {(r.document_id, r.chunk_index + d) for r in rows for d in (-1, 1)} - texts.keys()
+    keys = sorted(k for k in keys if k[1] >= 0)
+    if keys:
+        stmt = select(Chunk.document_id, Chunk.chunk_index, Chunk.text).where(
+            tuple_(Chunk.document_id, Chunk.chunk_index).in_(keys)
+        )
+        texts.update(((d, i), t) for d, i, t in db.execute(stmt))
+    return texts
+
+
+def iter_chunk_batches(
+    db: Session,
+    batch_size: int,
+    after: tuple[str, int] | None = None,
+    document_ids: list[str] | None = None,
+    with_context: bool = False,
+) -> Iterator[list[ChunkRow]]:
+    """
+    Чанки пачками в порядке (document_id, chunk_index) — keyset-пагинация по составному индексу:
+    в памяти только одна пачка строк, каждая страница — дешёвый range scan, с любого места можно продолжить.
+    with_context — дополнительно окно из соседних чанков (для коллекции с payload).
+    """
+    while True:
+        stmt = (
+            select(*_COLUMNS)
+            .outerjoin(Document, Document.id == Chunk.document_id)
+            .order_by(Chunk.document_id, Chunk.chunk_index)
+            .limit(batch_size)
+        )
+        if document_ids is not None:
+            stmt = stmt.where(Chunk.document_id.in_(document_ids))
+        if after is not None:
+            stmt = stmt.where(tuple_(Chunk.document_id, Chunk.chunk_index) > tuple_(*after))
+        rows = [ChunkRow(*r) for r in db.execute(stmt)]
+        if not rows:
+            return
+        if with_context:
+            texts = _neighbor_texts(db, rows)
+            rows = [
+                r._replace(
+                    context=chunk_context(
+                        texts.get((r.document_id, r.chunk_index - 1)),
+                        r.text,
+                        texts.get((r.document_id, r.chunk_index + 1)),
+                    )
+                )
+                for r in rows
+            ]
+        yield rows
+        after = (rows[-1].document_id, rows[-1].chunk_index)
+
+
+def count_chunks(db: Session, after: tuple[str, int] | None = None) -> int:
+    stmt = select(func.count()).select_from(Chunk)
+    if after is not None:
+        stmt = stmt.where(tuple_(Chunk.document_id, Chunk.chunk_index) > tuple_(*after))
+    return db.execute(stmt).scalar() or 0
+
+
+def load_checkpoint(path: Path) -> dict | None:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_checkpoint(path: Path, state: dict) -> None:
+    # запись через временный файл: прерванный процесс не оставит битый чекпоинт
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(state))
+    tmp.replace(path)
+
+
+def embed_batch(rows: list[ChunkRow], store) -> tuple[list, int]:
+    # векторы берутся из хранилища эмбеддингов; моделью кодируется только то, чего там нет
+    hashes = [r.text_hash or chunk_text_hash(r.text) for r in rows]
+    known = store.get_many(hashes) if store is not None else {}
+    texts_by_hash = {h: r.text for h, r in zip(hashes, rows) if h not in known}
+    if texts_by_hash:
+        fresh = dict(zip(texts_by_hash, embed_texts(list(texts_by_hash.values()))))
+        if store is not None:
+            store.put_many(fresh)
+        known.update(fresh)
+    return [known[h] for h in hashes], len(texts_by_hash)
+
+
+def _rows_for_milvus(rows: list[ChunkRow], vectors: list) -> list[dict]:
+    return [
+        {
+            "chunk_id": r.id,
+            "document_id": r.document_id,
+            "page_number": r.page_number or 0,
+            "chunk_index": r.chunk_index,
+            "embedding": v,
+            "text": r.text,
+            "context": r.context,
+            "title": r.title,
+            "uploaded_at": r.uploaded_at,
+            "uploaded_by": r.uploaded_by,
+            "tag": r.tag,
+            "corpus": r.corpus,
+        }
+        for r, v in zip(rows, vectors)
+    ]
+
+
+def load_batches(batches: Iterator[list], collection, store, queue_size: int, on_written) -> int:
+    """Чтение, encode и вставка в Milvus внахлёст; возвращает, сколько чанков закодировано моделью."""
+    encoded = 0
+
+    def write_batch(item: tuple[list, list]) -> None:
+        rows, vectors = item
+        insert_embeddings(_rows_for_milvus(rows, vectors), flush=False, upsert=True, collection=collection)
+        on_written(rows)
+
+    writer = BoundedWorker(write_batch, maxsize=queue_size, name="reindex-write")
+    try:
+        for rows in prefetch(batches, maxsize=queue_size, name="reindex-read"):
+            vectors, n = embed_batch(rows, store)
+            encoded += n
+            writer.put((rows, vectors))
+    finally:
+        writer.close()
+    return encoded
+
+
+def rollback() -> None:
+    connect()
+    current = current_collection_version()
+    versions = list_collection_versions()
+    older = [v for v in versions if current is None or versions.index(v) < versions.index(current)]
+    if not older:
+        raise SystemExit(f"No version before {current} to roll back to")
+    activate_collection_version(older[-1])
+    bump_index_version()
+    print(f"Alias '{COLLECTION_NAME}': {current} -> {older[-1]}")
+
+
+def list_versions() -> None:
+    connect()
+    current = current_collection_version()
+    for name in list_collection_versions():
+        marker = "*" if name == current else " "
+        print(f"{marker} {name}")
 
 
 def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--batch-size", type=int, default=64)
+    ap = argparse.ArgumentParser(description="Перезаливка векторов всех чанков из Postgres в Milvus")
+    ap.add_argument("--batch-size", type=int, default=256)
+    ap.add_argument("--queue-size", type=int, default=4, help="пачек в очередях между чтением, encode и вставкой")
+    ap.add_argument("--checkpoint", type=Path, default=None, help="по умолчанию storage_dir/reindex_checkpoint.json")
+    ap.add_argument("--resume", action="store_true", help="продолжить с последней пачки из чекпоинта")
+    ap.add_argument(
+        "--in-place",
+        action="store_true",
+        help="писать в живую коллекцию, а не в новую версию (без переключения алиаса)",
+    )
+    ap.add_argument("--rollback", action="store_true", help="вернуть алиас на предыдущую версию и выйти")
+    ap.add_argument("--list", action="store_true", help="показать версии коллекции и выйти")
     args = ap.parse_args()
 
+    if args.rollback:
+        rollback()
+        return
+    if args.list:
+        list_versions()
+        return
+
+    checkpoint_path = args.checkpoint or settings.storage_dir / "reindex_checkpoint.json"
+    state = load_checkpoint(checkpoint_path) if args.resume else None
+    after = (state["document_id"], state["chunk_index"]) if state else None
+    done = state["inserted"] if state else 0
+
     db: Session = SessionLocal()
     try:
-        chunks = db.query(Chunk).order_by(Chunk.document_id.asc(), Chunk.chunk_index.asc()).all()
-        if not chunks:
+        remaining = count_chunks(db, after)
+        if not remaining and not state:
             print("No chunks found. Upload documents first.")
             return
 
         connect()
-        # NB: мы не делаем drop коллекции автоматически, чтобы не сносить данные случайно.
-        # Если Milvus пустой (после очистки volumes) — вставка просто создаст коллекцию.
-        print(f"Reindexing {len(chunks)} chunks into Milvus collection '{COLLECTION_NAME}' ...")
-
-        total = 0
-        for batch in batched(chunks, args.batch_size):
-            texts = [c.text for c in batch]
-            vectors = embed_texts(texts)
-            rows = []
-            for c, v in zip(batch, vectors):
-                rows.append(
-                    {
-                        "chunk_id": c.id,
-                        "document_id": c.document_id,
-                        "page_number": c.page_number or 0,
-                        "chunk_index": c.chunk_index,
-                        "embedding": v,
-                    }
+        # blue/green: новая версия наполняется, пока поиск работает по старой; алиас переключается в конце
+        if args.in_place:
+            if not live_model_matches():
+                raise SystemExit(
+                    f"Live collection was built with another embedding model; "
+                    f"--in-place would mix models. Run a full reindex with {settings.embedding_model_name}."
                 )
-            insert_embeddings(rows)
-            total += len(rows)
-            print(f"  inserted: {total}/{len(chunks)}")
+            target = get_collection()
+        elif state and state.get("collection"):
+            target = Collection(state["collection"])
+        else:
+            target = create_collection_version()
+        target_name = COLLECTION_NAME if args.in_place else target.name
+        started_at = state["started_at"] if state else datetime.utcnow().isoformat()
+
+        payload = all(name in collection_fields(target) for name in PAYLOAD_FIELDS)
+        total = done + remaining
+        where = f" (resuming after {after[0]}#{after[1]})" if after else ""
+        print(f"Reindexing {remaining} chunks into Milvus collection '{target_name}'{where} ...")
 
+        store = get_embedding_store()
+        started = time.perf_counter()
+        progress = {"inserted": done}
+
+        def on_written(rows: list) -> None:
+            progress["inserted"] += len(rows)
+            # чекпоинт — только после вставки: при --resume пачка может повториться, но не потеряться
+            save_checkpoint(
+                checkpoint_path,
+                {
+                    "collection": None if args.in_place else target_name,
+                    "started_at": started_at,
+                    "document_id": rows[-1].document_id,
+                    "chunk_index": rows[-1].chunk_index,
+                    "inserted": progress["inserted"],
+                },
+            )
+            elapsed = time.perf_counter() - started
+            rate = (progress["inserted"] - done) / elapsed if elapsed > 0 else 0.0
+            eta = (total - progress["inserted"]) / rate if rate > 0 else 0.0
+            print(f"  inserted: {progress['inserted']}/{total} ({rate:.0f} chunks/s, eta {eta:.0f}s)")
+
+        encoded = load_batches(
+            iter_chunk_batches(db, args.batch_size, after, with_context=payload),
+            target,
+            store,
+            args.queue_size,
+            on_written,
+        )
+
+        if not args.in_place:
+            # документы, обработанные ingest за время прохода, могли попасть только в живую версию — догоняем
+            changed = [
+                doc_id
+                for (doc_id,) in db.query(Document.id).filter(Document.updated_at >= datetime.fromisoformat(started_at))
+            ]
+            if changed:
+                print(f"Catching up {len(changed)} documents changed during reindex ...")
+                encoded += load_batches(
+                    iter_chunk_batches(db, args.batch_size, document_ids=changed, with_context=payload),
+                    target,
+                    store,
+                    args.queue_size,
+                    lambda rows: None,
+                )
+
+        flush_embeddings(target)
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        indexed = progress["inserted"] - done
+        print(f"Loaded {indexed} chunks in {elapsed:.1f}s ({indexed / elapsed:.0f} chunks/s, encoded: {encoded}).")
+
+        if not args.in_place:
+            # загрузка новой версии идёт до переключения, поиск пока работает по старой
+            target.load()
+            expected = count_chunks(db)
+            actual = count_rows(target)
+            if actual != expected:
+                # алиас не трогаем: поиск продолжает работать по прежней версии
+                raise SystemExit(
+                    f"Row count mismatch: {target_name} has {actual}, Postgres has {expected} chunks. "
+                    f"Alias '{COLLECTION_NAME}' left unchanged; rerun with --resume or drop {target_name}."
+                )
+            # выгруженные оператором корпуса (released_partitions.json) выгружаются до переключения алиаса
+            previous = activate_collection_version(target_name)
+            print(f"Alias '{COLLECTION_NAME}': {previous} -> {target_name} (rollback: --rollback)")
+
+        checkpoint_path.unlink(missing_ok=True)
+        bump_index_version()
         print("Done.")
     finally:
         db.close()
@@ -58,4 +344,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from app.observability.metrics import CACHE_REQUESTS_TOTAL
+from app.services.redis_client import get_redis, mark_redis_failed
+
+
+class TTLCache:
+    """Потокобезопасный LRU с ограничением по размеру и времени жизни записи."""
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    In-process TTLCache + общий Redis (если настроен).
+    Ошибки Redis не пробрасываются: кеш — оптимизация, а не источник истины. После ошибки Redis
+    пропускается на redis_retry_cooldown_seconds; нечитаемое значение считается промахом.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        ttl_seconds: float,
+        redis_ttl_seconds: int,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any],
+    ):
+        self.name = name
+        self.memory = TTLCache(maxsize, ttl_seconds)
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self._dumps = dumps
+        self._loads = loads
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def get(self, key: str) -> Any | None:
+        value = self.memory.get(key)
+        if value is not None:
+            CACHE_REQUESTS_TOTAL.labels(cache=self.name, tier="memory", result="hit").inc()
+            return value
+        CACHE_REQUESTS_TOTAL.labels(cache=self.name, tier="memory", result="miss").inc()
+
+        r = get_redis()
+        if r is None:
+            return None
+        try:
+            raw = r.get(self._redis_key(key))
+        except Exception as e:
+            mark_redis_failed(e)
+            raw = None
+        value = None
+        if raw is not None:
+            try:
+                value = self._loads(raw)
+            except Exception:
+                value = None
+        if value is None:
+            CACHE_REQUESTS_TOTAL.labels(cache=self.name, tier="redis", result="miss").inc()
+            return None
+        CACHE_REQUESTS_TOTAL.labels(cache=self.name, tier="redis", result="hit").inc()
+        self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            r.set(self._redis_key(key), self._dumps(value), ex=self.redis_ttl_seconds)
+        except Exception as e:
+            mark_redis_failed(e)
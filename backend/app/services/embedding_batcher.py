@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable
+
+from app.observability.metrics import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_WAIT_SECONDS,
+    EMBEDDING_QUEUE_DEPTH,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+_STOP = object()
+
+
+@dataclass
+class _Request:
+    texts: list[str]
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class EmbeddingBatcher:
+    """
+    Склеивает одновременные запросы на эмбеддинги в один вызов encode.
+    Запросы копятся не дольше max_wait_ms (отсчёт от первого в пачке) или до max_batch_size
+    текстов; каждый вызывающий получает свой срез результата через Future.
+    """
+
+    def __init__(self, encode: Callable[[list[str]], list[list[float]]], max_batch_size: int, max_wait_ms: float):
+        self._encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list[str]) -> Future:
+        req = _Request(texts=list(texts))
+        if not req.texts:
+            req.future.set_result([])
+            return req.future
+        self._queue.put(req)
+        EMBEDDING_QUEUE_DEPTH.set(self._queue.qsize())
+        return req.future
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return self.submit(texts).result()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+
+    def _collect(self, first: _Request) -> tuple[list[_Request], bool]:
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            size += len(item.texts)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect(first)
+            EMBEDDING_QUEUE_DEPTH.set(self._queue.qsize())
+            self._process(batch)
+
+        # дорабатываем то, что успело попасть в очередь до остановки
+        leftover: list[_Request] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            self._process(leftover)
+        EMBEDDING_QUEUE_DEPTH.set(0)
+
+    def _process(self, batch: list[_Request]) -> None:
+        texts = [t for req in batch for t in req.texts]
+        now = time.monotonic()
+        for req in batch:
+            EMBEDDING_BATCH_WAIT_SECONDS.observe(now - req.enqueued_at)
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
+        try:
+            vectors = self._encode(texts)
+        except Exception as e:
+            logger.warning("Embedding batch of %d texts failed: %s", len(texts), e)
+            for req in batch:
+                req.future.set_exception(e)
+            return
+
+        offset = 0
+        for req in batch:
+            n = len(req.texts)
+            req.future.set_result(vectors[offset : offset + n])
+            offset += n
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def _model_dir_name(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "__", model_name)
+
+
+class EmbeddingStore:
+    """
+    Постоянное хранилище эмбеддингов чанков одной модели: <root>/<model>/
+      vectors.f32 — float32-векторы подряд (только дозапись), читается через np.memmap;
+      index.sqlite — text_hash → номер строки в vectors.f32;
+      meta.json    — имя модели и размерность.
+    Каталог самодостаточен: его можно скопировать в другое окружение вместе с моделью.
+    """
+
+    def __init__(self, root: Path, model_name: str):
+        self.model_name = model_name
+        self.path = Path(root) / _model_dir_name(model_name)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.path / "vectors.f32"
+        self._meta_path = self.path / "meta.json"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path / "index.sqlite", check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS vectors (text_hash TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._db.commit()
+        self.dim: int | None = None
+        self._memmap: np.memmap | None = None
+        self._load_meta()
+
+    def _load_meta(self) -> None:
+        # размерность фиксируется первой записью (возможно, другим процессом)
+        if self.dim is None and self._meta_path.exists():
+            self.dim = int(json.loads(self._meta_path.read_text())["dim"])
+
+    @contextmanager
+    def _file_lock(self):
+        # дозапись может идти из нескольких процессов (backend, скрипт reindex)
+        with open(self.path / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _rows(self) -> int:
+        if self.dim is None or not self._vectors_path.exists():
+            return 0
+        return self._vectors_path.stat().st_size // (self.dim * 4)
+
+    def _matrix(self, min_rows: int) -> np.memmap:
+        # memmap переоткрывается, только когда файл дописан дальше уже отображённого
+        if self._memmap is None or self._memmap.shape[0] < min_rows:
+            self._memmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._rows(), self.dim))
+        return self._memmap
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def vectors(self) -> np.ndarray:
+        """Все векторы хранилища (memmap, только чтение) — для офлайн-замеров без Milvus."""
+        with self._lock:
+            self._load_meta()
+            if self.dim is None or not self._rows():
+                return np.empty((0, self.dim or 0), dtype=np.float32)
+            return self._matrix(self._rows())
+
+    def get_many(self, hashes: list[str]) -> dict[str, list[float]]:
+        unique = list(dict.fromkeys(hashes))
+        if not unique:
+            return {}
+        with self._lock:
+            self._load_meta()
+            if self.dim is None:
+                return {}
+            offsets: dict[str, int] = {}
+            # лимит SQLite на число параметров в одном запросе
+            for i in range(0, len(unique), 500):
+                part = unique[i : i + 500]
+                marks = ", ".join("?" * len(part))
+                offsets.update(
+                    self._db.execute(f"SELECT text_hash, row FROM vectors WHERE text_hash IN ({marks})", part).fetchall()
+                )
+            if not offsets:
+                return {}
+            matrix = self._matrix(max(offsets.values()) + 1)
+            return {h: matrix[row].tolist() for h, row in offsets.items()}
+
+    def put_many(self, vectors_by_hash: dict[str, list[float]]) -> int:
+        """Дописывает отсутствующие векторы; возвращает, сколько добавлено."""
+        if not vectors_by_hash:
+            return 0
+        with self._lock, self._file_lock():
+            self._load_meta()
+            hashes = list(vectors_by_hash)
+            present: set[str] = set()
+            for i in range(0, len(hashes), 500):
+                part = hashes[i : i + 500]
+                marks = ", ".join("?" * len(part))
+                present.update(
+                    h for (h,) in self._db.execute(f"SELECT text_hash FROM vectors WHERE text_hash IN ({marks})", part)
+                )
+            new = [h for h in hashes if h not in present]
+            if not new:
+                return 0
+
+            matrix = np.asarray([vectors_by_hash[h] for h in new], dtype=np.float32)
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+                self._meta_path.write_text(json.dumps({"model": self.model_name, "dim": self.dim}))
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {matrix.shape[1]} does not match store dim {self.dim}")
+
+            # сначала векторы, потом индекс: при сбое между ними остаются лишь недостижимые строки в конце файла
+            start = self._rows()
+            with open(self._vectors_path, "r+b" if self._vectors_path.exists() else "wb") as f:
+                f.seek(start * self.dim * 4)
+                f.write(matrix.tobytes())
+            self._db.executemany(
+                "INSERT OR IGNORE INTO vectors (text_hash, row) VALUES (?, ?)",
+                [(h, start + i) for i, h in enumerate(new)],
+            )
+            self._db.commit()
+            return len(new)
+
+    def close(self) -> None:
+        with self._lock:
+            self._memmap = None
+            self._db.close()
+
+
+@lru_cache(maxsize=1)
+def get_embedding_store() -> EmbeddingStore | None:
+    if not settings.embedding_store_enabled:
+        return None
+    root = settings.embedding_store_dir or settings.storage_dir / "embeddings"
+    return EmbeddingStore(root, settings.embedding_model_name)
+
+
+def close_embedding_store() -> None:
+    if get_embedding_store.cache_info().currsize:
+        store = get_embedding_store()
+        if store is not None:
+            store.close()
+        get_embedding_store.cache_clear()
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import re
+from array import array
 from functools import lru_cache
 from sentence_transformers import SentenceTransformer
 
 from app.core.config import settings
+from app.services.cache import TwoTierCache
+from app.services.embedding_batcher import EmbeddingBatcher
 
 
 @lru_cache(maxsize=1)
@@ -11,12 +17,81 @@ def get_model() -> SentenceTransformer:
     return SentenceTransformer(settings.embedding_model_name)
 
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
+def _encode(texts: list[str]) -> list[list[float]]:
     model = get_model()
     vectors = model.encode(texts, normalize_embeddings=True)
     return [v.tolist() for v in vectors]
 
 
-def embed_query(text: str) -> list[float]:
-    return embed_texts([text])[0]
+@lru_cache(maxsize=1)
+def get_batcher() -> EmbeddingBatcher:
+    return EmbeddingBatcher(
+        _encode,
+        max_batch_size=settings.embedding_batch_max_size,
+        max_wait_ms=settings.embedding_batch_max_wait_ms,
+    )
+
+
+def stop_batcher() -> None:
+    if get_batcher.cache_info().currsize:
+        get_batcher().stop()
+        get_batcher.cache_clear()
+
+
+def _use_batcher(texts: list[str]) -> bool:
+    # большие пачки (ingest, reindex) и так эффективно кодируются одним вызовом
+    return settings.embedding_batching_enabled and 0 < len(texts) < settings.embedding_batch_max_size
+
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    if _use_batcher(texts):
+        return get_batcher().embed(texts)
+    return _encode(texts)
+
+
+async def embed_texts_async(texts: list[str]) -> list[list[float]]:
+    from app.services.executors import run_cpu
+
+    if _use_batcher(texts):
+        return await asyncio.wrap_future(get_batcher().submit(texts))
+    return await run_cpu(_encode, texts)
+
+
+def _dump_vector(vec: tuple[float, ...]) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def _load_vector(raw: bytes) -> tuple[float, ...]:
+    return tuple(array("f", raw))
+
+
+@lru_cache(maxsize=1)
+def get_query_cache() -> TwoTierCache:
+    return TwoTierCache(
+        name="embedding",
+        maxsize=settings.embedding_cache_size,
+        ttl_seconds=settings.embedding_cache_ttl_seconds,
+        redis_ttl_seconds=settings.embedding_cache_redis_ttl_seconds,
+        dumps=_dump_vector,
+        loads=_load_vector,
+    )
+
+
+def query_cache_key(text: str) -> str:
+    normalized = re.sub(r"\s+", " ", text or "").strip()
+    payload = f"{settings.embedding_model_name}\0{normalized}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+async def embed_query_async(text: str) -> list[float]:
+    from app.services.executors import run_io
+
+    cache = get_query_cache()
+    key = query_cache_key(text)
+    cached = await run_io(cache.get, key)
+    if cached is not None:
+        return list(cached)
 
+    vector = (await embed_texts_async([text]))[0]
+    await run_io(cache.set, key, tuple(vector))
+    return vector
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from functools import lru_cache
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.search_event import SearchEvent
+from app.observability.metrics import (
+    SEARCH_EVENTS_DROPPED_TOTAL,
+    SEARCH_EVENTS_FLUSH_SECONDS,
+    SEARCH_EVENTS_QUEUE_DEPTH,
+    SEARCH_EVENTS_WRITTEN_TOTAL,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+_STOP = object()
+
+
+class SearchEventSink:
+    """
+    Буфер аналитических SearchEvent: поиск только кладёт событие в ограниченную очередь,
+    фоновый поток пишет их пачками (по batch_size или раз в flush_interval секунд).
+    При переполнении очереди событие отбрасывается и считается в метрике.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_queue_size: int,
+        batch_size: int,
+        flush_interval_seconds: float,
+    ):
+        self._session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.01, flush_interval_seconds)
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_queue_size))
+        self._thread = threading.Thread(target=self._run, name="search-event-sink", daemon=True)
+        self._thread.start()
+
+    def submit(self, event: SearchEvent) -> bool:
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            SEARCH_EVENTS_DROPPED_TOTAL.labels(reason="queue_full").inc()
+            return False
+        SEARCH_EVENTS_QUEUE_DEPTH.set(self._queue.qsize())
+        return True
+
+    def stop(self, timeout: float | None = 10.0) -> None:
+        # _STOP может не влезть в полную очередь — ждём место, поток её разбирает
+        self._queue.put(_STOP, timeout=timeout)
+        self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: list[SearchEvent] = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                self._flush(batch)
+
+        leftover: list[SearchEvent] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for i in range(0, len(leftover), self.batch_size):
+            self._flush(leftover[i : i + self.batch_size])
+
+    def _flush(self, batch: list[SearchEvent]) -> None:
+        SEARCH_EVENTS_QUEUE_DEPTH.set(self._queue.qsize())
+        started = time.perf_counter()
+        db = self._session_factory()
+        try:
+            db.add_all(batch)
+            db.commit()
+            SEARCH_EVENTS_WRITTEN_TOTAL.inc(len(batch))
+        except Exception as e:
+            db.rollback()
+            SEARCH_EVENTS_DROPPED_TOTAL.labels(reason="write_failed").inc(len(batch))
+            logger.warning("Search events flush of %d rows failed: %s", len(batch), e)
+        finally:
+            db.close()
+            SEARCH_EVENTS_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+
+@lru_cache(maxsize=1)
+def get_event_sink() -> SearchEventSink:
+    from app.db.session import SessionLocal
+
+    return SearchEventSink(
+        SessionLocal,
+        max_queue_size=settings.search_events_queue_size,
+        batch_size=settings.search_events_batch_size,
+        flush_interval_seconds=settings.search_events_flush_interval_seconds,
+    )
+
+
+def stop_event_sink() -> None:
+    if get_event_sink.cache_info().currsize:
+        get_event_sink().stop()
+        get_event_sink.cache_clear()
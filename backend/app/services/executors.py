@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=1)
+def get_cpu_executor() -> ThreadPoolExecutor:
+    # парсинг PDF/DOCX и encode модели: ограничиваем число одновременных CPU-задач
+    return ThreadPoolExecutor(max_workers=settings.search_cpu_workers, thread_name_prefix="search-cpu")
+
+
+@lru_cache(maxsize=1)
+def get_io_executor() -> ThreadPoolExecutor:
+    # блокирующие клиенты (SQLAlchemy Session, pymilvus ORM) — отдельный пул,
+    # чтобы не занимать общий threadpool AnyIO
+    return ThreadPoolExecutor(max_workers=settings.search_io_workers, thread_name_prefix="search-io")
+
+
+async def run_cpu(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    for get in (get_cpu_executor, get_io_executor):
+        if get.cache_info().currsize:
+            get().shutdown(wait=False, cancel_futures=True)
+            get.cache_clear()
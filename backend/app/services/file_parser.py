@@ -1,58 +1,282 @@
 from __future__ import annotations
 
+import hashlib
 import io
-from typing import Iterable, Tuple
+import multiprocessing
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple, Union
 
 import pdfplumber
 from docx import Document as DocxDocument
 
+from app.core.config import settings
 
-def parse_pdf(data: bytes) -> Tuple[str, int]:
-    text_parts: list[str] = []
-    num_pages = 0
-    with pdfplumber.open(io.BytesIO(data)) as pdf:
-        num_pages = len(pdf.pages)
-        for page in pdf.pages:
-            text_parts.append(page.extract_text() or "")
-    return "\n".join(text_parts).strip(), num_pages
 
+class UnsupportedFileType(ValueError):
+    pass
 
-def parse_docx(data: bytes) -> Tuple[str, int]:
-    doc = DocxDocument(io.BytesIO(data))
+
+# путь к файлу на диске (предпочтительно: парсеры читают его сами, без копии в памяти) или байты
+Source = Union[str, Path, bytes]
+
+
+def _open_source(source: Source):
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return str(source)
+
+
+def _extract_pages(pdf, start: int, end: int) -> list[str]:
+    texts: list[str] = []
+    for page in pdf.pages[start:end]:
+        texts.append(page.extract_text() or "")
+        # кеш объектов страницы pdfplumber растёт с каждой страницей — освобождаем сразу
+        page.close()
+    return texts
+
+
+class PdfPlumberBackend:
+    """Эталонный, но медленный движок (pdfminer на чистом Python)."""
+
+    name = "pdfplumber"
+
+    def page_count(self, source: Source) -> int:
+        with pdfplumber.open(_open_source(source)) as pdf:
+            return len(pdf.pages)
+
+    def extract_range(self, source: Source, start: int, end: int) -> list[str]:
+        with pdfplumber.open(_open_source(source)) as pdf:
+            return _extract_pages(pdf, start, end)
+
+
+# pdfium не потокобезопасен: в одном процессе одновременно работает только один вызов
+_PDFIUM_LOCK = threading.Lock()
+
+
+class PdfiumBackend:
+    """Быстрое извлечение текста через pypdfium2 (нативный PDFium; ставится вместе с pdfplumber)."""
+
+    name = "pdfium"
+
+    def _open(self, source: Source):
+        import pypdfium2 as pdfium
+
+        return pdfium.PdfDocument(bytes(source) if isinstance(source, (bytes, bytearray)) else str(source))
+
+    def page_count(self, source: Source) -> int:
+        with _PDFIUM_LOCK:
+            pdf = self._open(source)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+
+    def extract_range(self, source: Source, start: int, end: int) -> list[str]:
+        texts: list[str] = []
+        with _PDFIUM_LOCK:
+            pdf = self._open(source)
+            try:
+                for i in range(start, end):
+                    page = pdf[i]
+                    textpage = page.get_textpage()
+                    texts.append(textpage.get_text_range().replace("\r\n", "\n").replace("\r", "\n"))
+                    textpage.close()
+                    page.close()
+            finally:
+                pdf.close()
+        return texts
+
+
+PDF_BACKENDS = {
+    PdfPlumberBackend.name: PdfPlumberBackend,
+    PdfiumBackend.name: PdfiumBackend,
+}
+
+
+def get_pdf_backend(name: str | None = None):
+    name = name or settings.pdf_backend
+    try:
+        return PDF_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown PDF backend '{name}' (available: {', '.join(PDF_BACKENDS)})")
+
+
+def _extract_page_range(backend_name: str, source: Source, start: int, end: int) -> list[str]:
+    """
+    Диапазон страниц выбранным движком; страницы, где быстрый движок не нашёл текста
+    (меньше pdf_fallback_min_chars символов), переизвлекаются pdfplumber.
+    Выполняется и в дочерних процессах пула: каждый воркер сам открывает файл.
+    """
+    backend = get_pdf_backend(backend_name)
+    texts = backend.extract_range(source, start, end)
+    if backend.name == PdfPlumberBackend.name:
+        return texts
+
+    weak = [i for i, t in enumerate(texts) if len(t.strip()) < settings.pdf_fallback_min_chars]
+    if weak:
+        with pdfplumber.open(_open_source(source)) as pdf:
+            for i in weak:
+                page = pdf.pages[start + i]
+                fallback = page.extract_text() or ""
+                page.close()
+                if len(fallback.strip()) > len(texts[i].strip()):
+                    texts[i] = fallback
+    return texts
+
+
+@lru_cache(maxsize=1)
+def get_pdf_pool() -> ProcessPoolExecutor:
+    # spawn, а не fork: родитель многопоточный (uvicorn, воркеры ingest)
+    return ProcessPoolExecutor(
+        max_workers=settings.pdf_parse_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def shutdown_pdf_pool() -> None:
+    if get_pdf_pool.cache_info().currsize:
+        get_pdf_pool().shutdown(wait=False, cancel_futures=True)
+        get_pdf_pool.cache_clear()
+
+
+_SEQUENTIAL_RANGE_PAGES = 16
+
+
+def _page_ranges(num_pages: int, parts: int) -> list[tuple[int, int]]:
+    step = max(1, -(-num_pages // parts))
+    return [(start, min(num_pages, start + step)) for start in range(0, num_pages, step)]
+
+
+def iter_pdf_pages(source: Source, backend: str | None = None) -> Iterator[str]:
+    """
+    Текст по страницам, в порядке страниц, по мере готовности. Движок — settings.pdf_backend (или backend).
+    Большие PDF на диске режутся на диапазоны страниц и разбираются параллельно в пуле процессов
+    (pdf_parse_workers, в работе не больше двух диапазонов на воркер); маленькие файлы
+    и байты из памяти — последовательно.
+    """
+    engine = get_pdf_backend(backend)
+    num_pages = engine.page_count(source)
+    parallel = (
+        not isinstance(source, (bytes, bytearray))
+        and settings.pdf_parse_workers > 1
+        and num_pages >= settings.pdf_parallel_min_pages
+    )
+    if not parallel:
+        for start, end in _page_ranges(num_pages, max(1, num_pages // _SEQUENTIAL_RANGE_PAGES)):
+            yield from _extract_page_range(engine.name, source, start, end)
+        return
+
+    # по несколько диапазонов на воркер, чтобы тяжёлые страницы не тормозили весь разбор
+    ranges = iter(_page_ranges(num_pages, settings.pdf_parse_workers * 4))
+    pool = get_pdf_pool()
+    pending: deque = deque()
+    for start, end in islice(ranges, settings.pdf_parse_workers * 2):
+        pending.append(pool.submit(_extract_page_range, engine.name, str(source), start, end))
+    while pending:
+        texts = pending.popleft().result()
+        nxt = next(ranges, None)
+        if nxt is not None:
+            pending.append(pool.submit(_extract_page_range, engine.name, str(source), *nxt))
+        yield from texts
+
+
+def parse_pdf_pages(source: Source, backend: str | None = None) -> list[str]:
+    return list(iter_pdf_pages(source, backend=backend))
+
+
+def parse_pdf(source: Source, backend: str | None = None) -> Tuple[str, int]:
+    pages = parse_pdf_pages(source, backend=backend)
+    return "\n".join(pages).strip(), len(pages)
+
+
+def parse_docx(source: Source) -> Tuple[str, int]:
+    doc = DocxDocument(_open_source(source))
     paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
     return "\n".join(paragraphs).strip(), 0
 
 
-def extract_text(filename: str, data: bytes) -> Tuple[str, int]:
+def extract_text(filename: str, source: Source) -> Tuple[str, int]:
     lower = filename.lower()
     if lower.endswith(".pdf"):
-        return parse_pdf(data)
+        return parse_pdf(source)
     if lower.endswith(".docx"):
-        return parse_docx(data)
-    raise ValueError("Unsupported file type (only PDF/DOCX)")
+        return parse_docx(source)
+    raise UnsupportedFileType("Unsupported file type (only PDF/DOCX)")
 
 
-def chunk_text(text: str, max_chars: int = 1200, overlap: int = 150) -> Iterable[str]:
-    # Простой чанкер: режет по предложениям/абзацам, стараясь держать длину <= max_chars.
-    paragraphs = [p.strip() for p in text.splitlines() if p.strip()]
+def iter_document_pages(filename: str, source: Source) -> Iterator[tuple[int | None, str]]:
+    """(номер страницы с 1, текст) для PDF; для DOCX — один блок без номера страницы."""
+    lower = filename.lower()
+    if lower.endswith(".pdf"):
+        for i, text in enumerate(iter_pdf_pages(source), start=1):
+            yield i, text
+        return
+    if lower.endswith(".docx"):
+        text, _ = parse_docx(source)
+        yield None, text
+        return
+    raise UnsupportedFileType("Unsupported file type (only PDF/DOCX)")
+
+
+def _paragraphs(pages: Iterable[tuple[int | None, str]]) -> Iterator[tuple[int | None, str]]:
+    for page_number, text in pages:
+        for line in text.splitlines():
+            para = line.strip()
+            if para:
+                yield page_number, para
+
+
+def chunk_pages(
+    pages: Iterable[tuple[int | None, str]],
+    max_chars: int = 1200,
+    overlap: int = 150,
+) -> Iterator[tuple[int | None, str]]:
+    """Потоковый вариант chunk_text: страницы приходят по одной, чанк помечается страницей, где он начался."""
     current: list[str] = []
     current_len = 0
-    for para in paragraphs:
+    current_page: int | None = None
+    for page_number, para in _paragraphs(pages):
         if current_len + len(para) + 1 <= max_chars:
+            if not current:
+                current_page = page_number
             current.append(para)
             current_len += len(para) + 1
             continue
 
         if current:
-            yield "\n".join(current)
+            yield current_page, "\n".join(current)
             tail = "\n".join(current)[-overlap:]
             current = [tail, para]
             current_len = len(tail) + len(para) + 1
         else:
-            yield para[:max_chars]
+            yield page_number, para[:max_chars]
             current = [para[max_chars - overlap :]]
             current_len = len(current[0])
+        current_page = page_number
 
     if current:
-        yield "\n".join(current)
+        yield current_page, "\n".join(current)
+
+
+def chunk_text_hash(text: str) -> str:
+    # пробелы и переносы не влияют на хеш: одинаковый текст из разных изданий совпадает
+    normalized = re.sub(r"\s+", " ", text or "").strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def chunk_context(prev_text: str | None, text: str, next_text: str | None) -> str:
+    # окно, из которого поиск строит excerpt: соседние чанки вокруг найденного
+    return "\n".join(t for t in (prev_text, text, next_text) if t)
+
+
+def chunk_text(text: str, max_chars: int = 1200, overlap: int = 150) -> Iterable[str]:
+    # Простой чанкер: режет по предложениям/абзацам, стараясь держать длину <= max_chars.
+    for _, chunk in chunk_pages([(None, text)], max_chars=max_chars, overlap=overlap):
+        yield chunk
 
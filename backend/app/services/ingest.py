@@ -1,33 +1,69 @@
 from __future__ import annotations
 
 import uuid
+from concurrent.futures import Future, wait as futures_wait
+from datetime import datetime
 from pathlib import Path
+from typing import Iterator
+
 from fastapi import UploadFile
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.models.chunk import Chunk
 from app.models.document import Document
 
+SUPPORTED_EXTENSIONS = {".pdf", ".docx"}
 
-def ingest_document(db: Session, title: str, file: UploadFile, uploaded_by: str | None = None) -> Document:
-    from app.services.embeddings import embed_texts
-    from app.services.file_parser import chunk_text, extract_text
-    from app.services.milvus_client import insert_embeddings
 
-    data = file.file.read()
-    text, num_pages = extract_text(file.filename, data)
+class DocumentInProgress(ValueError):
+    def __init__(self, document_ids: list[str]):
+        super().__init__(f"Documents are being indexed, retry later: {', '.join(document_ids)}")
+        self.document_ids = document_ids
+
+
+class IngestJobLost(RuntimeError):
+    def __init__(self, document_id: str):
+        super().__init__(f"Ingest job for document {document_id} was taken over by another worker")
+        self.document_id = document_id
+
+
+class DuplicateDocument(ValueError):
+    def __init__(self, document_id: str):
+        super().__init__(f"This file has already been uploaded (document {document_id})")
+        self.document_id = document_id
+
+
+def ingest_document(
+    db: Session,
+    title: str,
+    file: UploadFile,
+    uploaded_by: str | None = None,
+    tag: str | None = None,
+    corpus: str | None = None,
+) -> Document:
+    """
+    Сохраняет файл и ставит документ в очередь (status="queued").
+    Парсинг, эмбеддинги и индексацию делает воркер ingest_queue через process_document.
+    """
+    from app.services.file_parser import UnsupportedFileType
+    from app.services.ingest_queue import notify_ingest_workers
+    from app.services.uploads import spool_upload
+
+    ext = Path(file.filename or "").suffix.lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise UnsupportedFileType("Unsupported file type (only PDF/DOCX)")
 
-    settings.storage_dir.mkdir(parents=True, exist_ok=True)
-    ext = Path(file.filename).suffix.lower()
-    if ext not in {".pdf", ".docx"}:
-        # extract_text уже валидирует тип, но пусть имя файла тоже будет корректным
-        ext = ".bin"
     doc_id = str(uuid.uuid4())
     stored_filename = f"{doc_id}{ext}"
-    path = settings.storage_dir / stored_filename
-    with open(path, "wb") as f:
-        f.write(data)
+    # файл пишется прямо в storage_dir блоками, без копии целиком в памяти
+    spooled = spool_upload(file, dest=settings.storage_dir / stored_filename)
+    existing = db.query(Document.id).filter(Document.sha256 == spooled.sha256).first()
+    if existing:
+        spooled.remove()
+        raise DuplicateDocument(existing.id)
 
     doc = Document(
         id=doc_id,
@@ -35,40 +71,262 @@ def ingest_document(db: Session, title: str, file: UploadFile, uploaded_by: str
         filename=stored_filename,
         content_type=file.content_type or "application/octet-stream",
         uploaded_by=uploaded_by,
-        num_pages=num_pages,
-        status="processed",
+        tag=tag,
+        corpus=corpus or settings.default_corpus,
+        num_pages=0,
+        status="queued",
+        sha256=spooled.sha256,
     )
     db.add(doc)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # тот же файл параллельно загрузили в другом запросе (уникальный индекс по sha256)
+        db.rollback()
+        spooled.remove()
+        existing = db.query(Document.id).filter(Document.sha256 == spooled.sha256).first()
+        if not existing:
+            raise
+        raise DuplicateDocument(existing.id)
     db.refresh(doc)
 
-    chunks = list(chunk_text(text))
-    vectors = embed_texts(chunks) if chunks else []
-
-    chunk_rows: list[Chunk] = []
-    milvus_rows: list[dict] = []
-    for idx, (chunk_text_value, vec) in enumerate(zip(chunks, vectors)):
-        chunk = Chunk(
-            document_id=doc.id,
-            chunk_index=idx,
-            page_number=None,
-            text=chunk_text_value,
-        )
-        db.add(chunk)
-        db.flush()
-        chunk_rows.append(chunk)
-        milvus_rows.append(
-            {
-                "chunk_id": chunk.id,
-                "document_id": doc.id,
-                "page_number": 0,
-                "chunk_index": idx,
-                "embedding": vec,
-            }
-        )
+    notify_ingest_workers()
+    return doc
+
+
+def delete_documents(db: Session, document_ids: list[str]) -> list[str]:
+    """
+    Полное удаление документов: векторы в Milvus, чанки, строки документов и файлы в storage_dir.
+    Сначала Milvus — если он недоступен, в Postgres ничего не удалено и вызов можно повторить.
+    Документы, которые сейчас индексирует воркер, не удаляются (DocumentInProgress): его вставки
+    легли бы в Milvus уже после удаления. Строки блокируются FOR UPDATE — воркер не заберёт
+    queued-документ, пока идёт удаление.
+    Возвращает id реально удалённых документов.
+    """
+    from app.services.ingest_queue import IN_PROGRESS_STATUSES
+    from app.services.milvus_client import delete_document_embeddings, delete_from_retained_versions
+    from app.services.search_cache import bump_index_version
+
+    docs = (
+        db.query(Document.id, Document.filename, Document.status)
+        .filter(Document.id.in_(set(document_ids)))
+        .with_for_update()
+        .all()
+    )
+    if not docs:
+        db.rollback()
+        return []
+    busy = [d.id for d in docs if d.status in IN_PROGRESS_STATUSES]
+    if busy:
+        db.rollback()
+        raise DocumentInProgress(busy)
+    ids = [d.id for d in docs]
+    chunk_ids = list(db.execute(select(Chunk.id).where(Chunk.document_id.in_(ids))).scalars())
 
+    delete_document_embeddings(ids)
+    delete_from_retained_versions(chunk_ids)
+    db.query(Chunk).filter(Chunk.document_id.in_(ids)).delete(synchronize_session=False)
+    db.query(Document).filter(Document.id.in_(ids)).delete(synchronize_session=False)
     db.commit()
-    if milvus_rows:
-        insert_embeddings(milvus_rows)
+    for d in docs:
+        (settings.storage_dir / d.filename).unlink(missing_ok=True)
 
-    return doc
+    bump_index_version()
+    return ids
+
+
+def _set_status(db: Session, doc: Document, status: str) -> None:
+    doc.status = status
+    doc.updated_at = datetime.utcnow()
+    db.commit()
+
+
+def _renew_job(bind, doc_id: str, attempt: int) -> None:
+    """
+    Продлевает задачу: claim_next_job перехватывает документ, не обновлявшийся дольше ingest_job_stale_seconds.
+    Отдельная короткая транзакция — чанки документа копятся в основной до конца обработки.
+    Задачу уже перехватил другой воркер (attempts сменился) — дальше не пишем.
+    """
+    with Session(bind=bind) as s:
+        renewed = s.execute(
+            update(Document)
+            .where(Document.id == doc_id, Document.attempts == attempt)
+            .values(updated_at=datetime.utcnow())
+        ).rowcount
+        s.commit()
+    if not renewed:
+        raise IngestJobLost(doc_id)
+
+
+def _iter_chunk_batches(filename: str, stats: dict) -> Iterator[list[tuple[int, int | None, str, str]]]:
+    """
+    Страницы → чанки → пачки по ingest_embed_batch_size; весь текст документа в памяти не собирается.
+    Элемент пачки — (chunk_index, page_number, text, context), context — окно из соседних чанков
+    для payload-коллекции Milvus; ради него чанк отдаётся с задержкой в один.
+    """
+    from app.services.file_parser import chunk_context, chunk_pages, iter_document_pages
+
+    def pages():
+        for page_number, text in iter_document_pages(filename, settings.storage_dir / filename):
+            if page_number is not None:
+                stats["num_pages"] = page_number
+            yield page_number, text
+
+    batch: list[tuple[int, int | None, str, str]] = []
+    prev_text: str | None = None
+    current: tuple[int, int | None, str] | None = None
+    for idx, (page_number, text) in enumerate(chunk_pages(pages())):
+        if current is not None:
+            batch.append((*current, chunk_context(prev_text, current[2], text)))
+            prev_text = current[2]
+            if len(batch) >= settings.ingest_embed_batch_size:
+                yield batch
+                batch = []
+        current = (idx, page_number, text)
+    if current is not None:
+        batch.append((*current, chunk_context(prev_text, current[2], None)))
+    if batch:
+        yield batch
+
+
+def _known_embeddings(db: Session, hashes: list[str]) -> dict[str, list[float]]:
+    """Готовые векторы для уже проиндексированных чанков с тем же текстом (по одному chunk_id на хеш)."""
+    from app.services.milvus_client import get_embeddings
+
+    chunk_by_hash: dict[str, str] = {}
+    rows = db.query(Chunk.text_hash, Chunk.id).filter(Chunk.text_hash.in_(set(hashes))).all()
+    for text_hash, chunk_id in rows:
+        chunk_by_hash.setdefault(text_hash, chunk_id)
+    vectors = get_embeddings(list(chunk_by_hash.values()))
+    return {h: vectors[c] for h, c in chunk_by_hash.items() if c in vectors}
+
+
+def process_document(db: Session, doc: Document) -> None:
+    """
+    Полная обработка сохранённого файла. Идемпотентна: повтор после сбоя начинает с чистого листа.
+    Стадии идут внахлёст через ограниченные очереди: пока пачка чанков кодируется моделью,
+    следующая уже разбирается и режется, а предыдущая пишется в Postgres и Milvus.
+    Чанки, текст которых уже встречался (хранилище эмбеддингов, индекс, повтор в пачке),
+    моделью не кодируются — вектор берётся готовый по text_hash.
+    """
+    from app.observability.metrics import INGEST_CHUNKS_TOTAL
+    from app.services.embedding_store import get_embedding_store
+    from app.services.embeddings import embed_texts
+    from app.services.file_parser import chunk_text_hash
+    from app.services.milvus_client import delete_document_embeddings, wait_until_searchable
+    from app.services.milvus_writer import get_milvus_writer
+    from app.services.pipeline import BoundedWorker, prefetch
+    from app.services.search_cache import bump_index_version
+
+    _set_status(db, doc, "parsing")
+    doc_id = doc.id
+    attempt = doc.attempts
+    # остатки прошлой неудачной попытки (в т.ч. до ручного retry): векторы могли попасть в Milvus и без коммита чанков
+    if doc.attempts > 1 or doc.error:
+        db.query(Chunk).filter(Chunk.document_id == doc_id).delete(synchronize_session=False)
+        delete_document_embeddings([doc_id])
+
+    _set_status(db, doc, "embedding")
+
+    stats = {"num_pages": 0, "embedded": 0, "reused": 0}
+    # поля документа, которые денормализуются в Milvus (payload, скалярные фильтры, partition корпуса)
+    doc_fields = {
+        "title": doc.title,
+        "uploaded_at": doc.uploaded_at,
+        "uploaded_by": doc.uploaded_by,
+        "tag": doc.tag,
+        "corpus": doc.corpus,
+    }
+    store = get_embedding_store()
+    milvus_writer = get_milvus_writer()
+    pending_writes: list[Future] = []
+    last_row: list[dict] = []
+
+    def embed_batch(lookup_db: Session, batch: list[tuple[int, int | None, str, str]]) -> tuple[list[str], list]:
+        hashes = [chunk_text_hash(text) for _, _, text, _ in batch]
+        stored = store.get_many(hashes) if store is not None else {}
+        known = dict(stored)
+        if len(known) < len(set(hashes)):
+            known.update(_known_embeddings(lookup_db, [h for h in hashes if h not in known]))
+        texts_by_hash = {h: text for h, (_, _, text, _) in zip(hashes, batch) if h not in known}
+        if texts_by_hash:
+            known.update(zip(texts_by_hash, embed_texts(list(texts_by_hash.values()))))
+        if store is not None:
+            store.put_many({h: v for h, v in known.items() if h not in stored})
+        stats["embedded"] += len(texts_by_hash)
+        stats["reused"] += len(batch) - len(texts_by_hash)
+        return hashes, [known[h] for h in hashes]
+
+    def write_batch(item: tuple[list[tuple[int, int | None, str, str]], list[str], list]) -> None:
+        # id чанков генерируем на клиенте: строки для Postgres и Milvus собираются за один проход
+        batch, hashes, vectors = item
+        # длинный документ не должен выглядеть зависшим: иначе его перехватит второй воркер
+        _renew_job(db.get_bind(), doc_id, attempt)
+        chunk_rows: list[dict] = []
+        milvus_rows: list[dict] = []
+        for (idx, page_number, text, context), text_hash, vec in zip(batch, hashes, vectors):
+            chunk_id = str(uuid.uuid4())
+            chunk_rows.append(
+                {
+                    "id": chunk_id,
+                    "document_id": doc_id,
+                    "chunk_index": idx,
+                    "page_number": page_number,
+                    "text": text,
+                    "text_hash": text_hash,
+                }
+            )
+            milvus_rows.append(
+                {
+                    "chunk_id": chunk_id,
+                    "document_id": doc_id,
+                    "page_number": page_number or 0,
+                    "chunk_index": idx,
+                    "embedding": vec,
+                    # payload: пишется, только если его поля есть в схеме живой версии коллекции
+                    "text": text,
+                    "context": context,
+                    **doc_fields,
+                }
+            )
+        # чанки копятся в одной транзакции (коммит в конце), пока она открыта — поиск их не видит
+        db.execute(insert(Chunk), chunk_rows)
+        # векторы уходят общему писателю Milvus: он склеивает вставки разных документов и не делает flush
+        pending_writes.append(milvus_writer.submit(milvus_rows))
+        last_row[:] = milvus_rows[-1:]
+
+    queue_size = settings.ingest_pipeline_queue_size
+    # пока идёт конвейер, сессией db пользуется только писатель; поиск готовых векторов — в своей сессии
+    writer = BoundedWorker(write_batch, maxsize=queue_size, name=f"ingest-write-{doc_id}")
+    try:
+        with Session(bind=db.get_bind()) as lookup_db:
+            batches = prefetch(_iter_chunk_batches(doc.filename, stats), maxsize=queue_size, name=f"ingest-parse-{doc_id}")
+            for batch in batches:
+                writer.put((batch, *embed_batch(lookup_db, batch)))
+    finally:
+        try:
+            writer.close()
+        finally:
+            # даже при ошибке дожидаемся своих вставок: иначе они могут лечь в Milvus уже после очистки при повторе
+            futures_wait(pending_writes)
+
+    INGEST_CHUNKS_TOTAL.labels(source="embedded").inc(stats["embedded"])
+    INGEST_CHUNKS_TOTAL.labels(source="reused").inc(stats["reused"])
+    doc.num_pages = stats["num_pages"]
+    doc.chunks_embedded = stats["embedded"]
+    doc.chunks_reused = stats["reused"]
+    doc.status = "indexing"
+    doc.updated_at = datetime.utcnow()
+    db.commit()
+    for f in pending_writes:
+        f.result()
+    if last_row:
+        # processed и сброс кеша поиска — только когда документ уже виден поиску: иначе запрос в этом окне
+        # закешировал бы выдачу без него под новой версией индекса. Один Strong-запрос на документ
+        # ждёт все вставки до него (вставки пачек сами видимости не ждут)
+        wait_until_searchable(last_row)
+
+    doc.error = None
+    doc.next_attempt_at = None
+    _set_status(db, doc, "processed")
+    bump_index_version()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.document import Document
+from app.observability.metrics import INGEST_JOBS_TOTAL, INGEST_QUEUE_DEPTH
+
+logger = logging.getLogger("uvicorn.error")
+
+IN_PROGRESS_STATUSES = ("parsing", "embedding", "indexing")
+
+
+def claim_next_job(db: Session) -> Document | None:
+    """
+    Берёт самый старый готовый к обработке документ: queued (с наступившим next_attempt_at)
+    или зависший в промежуточном статусе дольше ingest_job_stale_seconds.
+    На Postgres строка блокируется FOR UPDATE SKIP LOCKED, так что воркеры не дерутся за задачу.
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=settings.ingest_job_stale_seconds)
+    doc = (
+        db.query(Document)
+        .filter(
+            or_(
+                and_(
+                    Document.status == "queued",
+                    or_(Document.next_attempt_at.is_(None), Document.next_attempt_at <= now),
+                ),
+                and_(Document.status.in_(IN_PROGRESS_STATUSES), Document.updated_at < stale_before),
+            )
+        )
+        .order_by(Document.uploaded_at.asc())
+        .with_for_update(skip_locked=True)
+        .limit(1)
+        .first()
+    )
+    if doc is None:
+        db.rollback()
+        return None
+    doc.status = "parsing"
+    doc.attempts = (doc.attempts or 0) + 1
+    doc.updated_at = now
+    db.commit()
+    return doc
+
+
+def record_failure(db: Session, doc: Document, error: Exception) -> None:
+    db.rollback()
+    doc.error = f"{type(error).__name__}: {error}"[:2000]
+    doc.updated_at = datetime.utcnow()
+    if doc.attempts < settings.ingest_max_attempts:
+        # экспоненциальный backoff: base, 2*base, 4*base, ...
+        delay = settings.ingest_retry_backoff_seconds * (2 ** max(0, doc.attempts - 1))
+        doc.status = "queued"
+        doc.next_attempt_at = doc.updated_at + timedelta(seconds=delay)
+        INGEST_JOBS_TOTAL.labels(result="retry").inc()
+    else:
+        doc.status = "failed"
+        doc.next_attempt_at = None
+        INGEST_JOBS_TOTAL.labels(result="failed").inc()
+    db.commit()
+
+
+def run_job(db: Session, doc: Document) -> None:
+    from app.services.ingest import IngestJobLost, process_document
+
+    try:
+        process_document(db, doc)
+        INGEST_JOBS_TOTAL.labels(result="processed").inc()
+        logger.info(
+            "Ingested document %s: %d chunks embedded, %d reused",
+            doc.id,
+            doc.chunks_embedded,
+            doc.chunks_reused,
+        )
+    except IngestJobLost as e:
+        # статус документа теперь ведёт другой воркер — не трогаем его
+        db.rollback()
+        logger.warning("%s", e)
+    except Exception as e:
+        logger.warning("Ingest of document %s failed (attempt %d): %s", doc.id, doc.attempts, e)
+        record_failure(db, doc, e)
+
+
+class IngestWorkerPool:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        workers: int,
+        poll_interval_seconds: float,
+        ready: Callable[[], bool] | None = None,
+    ):
+        self._session_factory = session_factory
+        self.workers = max(1, workers)
+        self.poll_interval = max(0.1, poll_interval_seconds)
+        # ready() == False — задачи не берутся (и попытки не тратятся), пока условие не выполнится
+        self._ready = ready
+        self._paused = False
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def _can_claim(self) -> bool:
+        if self._ready is None:
+            return True
+        try:
+            ready = self._ready()
+        except Exception as e:
+            logger.warning("Ingest readiness check failed: %s", e)
+            return False
+        if not ready and not self._paused:
+            logger.warning("Ingest workers paused: live Milvus collection uses another embedding model")
+        elif ready and self._paused:
+            logger.info("Ingest workers resumed")
+        self._paused = not ready
+        return ready
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self._can_claim():
+                self._stop.wait(self.poll_interval)
+                continue
+            db = self._session_factory()
+            try:
+                doc = claim_next_job(db)
+                if doc is not None:
+                    run_job(db, doc)
+            except Exception as e:
+                doc = None
+                logger.warning("Ingest worker error: %s", e)
+            finally:
+                db.close()
+            if doc is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+def _embedding_model_is_live() -> bool:
+    # после reindex на новую модель воркер со старой ждёт перезапуска, а не пишет несравнимые векторы
+    from app.services.milvus_client import live_model_matches
+
+    return live_model_matches()
+
+
+def update_queue_depth(db: Session) -> None:
+    queued = db.query(Document.id).filter(Document.status == "queued").count()
+    INGEST_QUEUE_DEPTH.set(queued)
+
+
+@lru_cache(maxsize=1)
+def get_ingest_workers() -> IngestWorkerPool:
+    from app.db.session import SessionLocal
+
+    return IngestWorkerPool(
+        SessionLocal,
+        workers=settings.ingest_workers,
+        poll_interval_seconds=settings.ingest_poll_interval_seconds,
+        ready=_embedding_model_is_live,
+    )
+
+
+def notify_ingest_workers() -> None:
+    # будит только воркеры этого процесса; отдельный процесс воркеров подхватит задачу по опросу
+    if get_ingest_workers.cache_info().currsize:
+        get_ingest_workers().notify()
+
+
+def stop_ingest_workers() -> None:
+    if get_ingest_workers.cache_info().currsize:
+        get_ingest_workers().stop()
+        get_ingest_workers.cache_clear()
+
+
+def main() -> None:
+    """Отдельный процесс воркеров ingest: python -m app.services.ingest_queue."""
+    import signal
+
+    from prometheus_client import start_http_server
+
+    from app.services.embedding_store import close_embedding_store
+    from app.services.embeddings import get_model, stop_batcher
+    from app.services.file_parser import shutdown_pdf_pool
+    from app.services.milvus_writer import stop_milvus_writer
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # метрики ingest (INGEST_JOBS_TOTAL, MILVUS_WRITE_*) живут в этом процессе — отдаём их отдельно
+    start_http_server(settings.ingest_worker_metrics_port)
+    get_model()
+
+    stopping = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.set())
+
+    workers = get_ingest_workers()
+    workers.start()
+    logger.info("Ingest workers started: %d", workers.workers)
+    stopping.wait()
+
+    logger.info("Stopping ingest workers")
+    stop_ingest_workers()
+    # дописывает очередь вставок и делает завершающий flush
+    stop_milvus_writer()
+    stop_batcher()
+    close_embedding_store()
+    shutdown_pdf_pool()
+
+
+if __name__ == "__main__":
+    main()
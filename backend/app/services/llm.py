@@ -1,23 +1,45 @@
 from __future__ import annotations
 
+import asyncio
 import time
-import requests
+from functools import lru_cache
+
+import httpx
 
 from app.core.config import settings
 from app.observability.langfuse_client import get_langfuse
 from app.observability.metrics import RERANK_CALLS_TOTAL, RERANK_DURATION_SECONDS
 
 
-def rerank_sources(query: str, candidates: list[dict]) -> list[dict]:
+def _rerank_enabled() -> bool:
+    return bool(settings.use_custom_llm and settings.custom_llm_endpoint)
+
+
+@lru_cache(maxsize=1)
+def get_async_http_client() -> httpx.AsyncClient:
+    # один клиент на процесс: переиспользуем keep-alive соединения к реранкеру
+    return httpx.AsyncClient(timeout=settings.custom_llm_timeout_seconds)
+
+
+async def close_async_http_client() -> None:
+    if get_async_http_client.cache_info().currsize:
+        await get_async_http_client().aclose()
+        get_async_http_client.cache_clear()
+
+
+async def rerank_sources_async(query: str, candidates: list[dict]) -> tuple[list[dict], bool]:
     """
-    Точка интеграции вашей LLM‑модели.
+    Точка интеграции вашей LLM‑модели (httpx, не держит поток, пока реранкер считает).
     candidates: [{"document_id":..., "title":..., "score":..., "excerpt":...}, ...]
-    Возвращает те же элементы в нужном порядке/с доп. полями.
+    Реранкер возвращает те же элементы в нужном порядке/с доп. полями.
+    Возвращает (результаты, fell_back): fell_back=True — реранкер недоступен или ответил не тем,
+    отданы исходные кандидаты (такую выдачу нельзя кешировать как переранжированную).
     """
-    if not settings.use_custom_llm or not settings.custom_llm_endpoint:
-        return candidates
+    if not _rerank_enabled() or not candidates:
+        return candidates, False
 
     lf = get_langfuse()
+    client = get_async_http_client()
     started = time.perf_counter()
     try:
         if lf:
@@ -25,30 +47,64 @@ def rerank_sources(query: str, candidates: list[dict]) -> list[dict]:
                 name="rerank",
                 input={"query": query[:500], "candidates": len(candidates)},
             ) as span:
-                resp = requests.post(
+                resp = await client.post(
                     settings.custom_llm_endpoint,
                     json={"query": query, "candidates": candidates},
-                    timeout=30,
                 )
                 resp.raise_for_status()
                 data = resp.json()
                 span.update(output={"returned": len(data) if isinstance(data, list) else None})
         else:
-            resp = requests.post(
+            resp = await client.post(
                 settings.custom_llm_endpoint,
                 json={"query": query, "candidates": candidates},
-                timeout=30,
             )
             resp.raise_for_status()
             data = resp.json()
 
         if isinstance(data, list):
-            return data
+            return data, False
+    except Exception:
+        return candidates, True
+    finally:
+        dur = time.perf_counter() - started
+        RERANK_CALLS_TOTAL.inc()
+        RERANK_DURATION_SECONDS.observe(dur)
+
+    return candidates, True
+
+
+async def rerank_sources_batch_async(
+    queries: list[str], candidates_per_query: list[list[dict]]
+) -> tuple[list[list[dict]], bool]:
+    """
+    Переранжирование нескольких запросов за один HTTP-вызов (CUSTOM_LLM_BATCH_ENDPOINT).
+    Без batch-эндпоинта — параллельные одиночные вызовы rerank_sources_async.
+    Второй элемент — fell_back, как в rerank_sources_async (хотя бы один запрос остался без реранка).
+    """
+    if not _rerank_enabled() or not any(candidates_per_query):
+        return candidates_per_query, False
+    if not settings.custom_llm_batch_endpoint:
+        done = await asyncio.gather(*(rerank_sources_async(q, c) for q, c in zip(queries, candidates_per_query)))
+        return [results for results, _ in done], any(fell_back for _, fell_back in done)
+
+    client = get_async_http_client()
+    started = time.perf_counter()
+    try:
+        resp = await client.post(
+            settings.custom_llm_batch_endpoint,
+            json={"items": [{"query": q, "candidates": c} for q, c in zip(queries, candidates_per_query)]},
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        if isinstance(data, list) and len(data) == len(candidates_per_query):
+            fell_back = not all(isinstance(items, list) for items in data)
+            return [items if isinstance(items, list) else orig for items, orig in zip(data, candidates_per_query)], fell_back
     except Exception:
-        return candidates
+        return candidates_per_query, True
     finally:
         dur = time.perf_counter() - started
         RERANK_CALLS_TOTAL.inc()
         RERANK_DURATION_SECONDS.observe(dur)
 
-    return candidates
+    return candidates_per_query, True
@@ -1,15 +1,75 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import re
+from collections import defaultdict
+from datetime import datetime, timezone
 from functools import lru_cache
+from pathlib import Path
 
-from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections, utility
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, Partition, connections, utility
+from pymilvus.client.types import LoadState
 from tenacity import retry, stop_after_attempt, wait_fixed
 
 from app.core.config import settings
+from app.schemas.search import SearchFilters
+from app.services.cache import TTLCache
 from app.services.embeddings import get_model
 
 
+# алиас: поиск и вставка всегда идут через него, за ним — версия document_chunks_v{n} (blue/green reindex)
 COLLECTION_NAME = "document_chunks"
+_VERSION_PREFIX = f"{COLLECTION_NAME}_v"
+INDEX_TYPES = ("FLAT", "IVF_FLAT", "IVF_SQ8", "IVF_PQ", "HNSW")
+
+
+def index_params(index_type: str | None = None) -> dict:
+    index_type = (index_type or settings.milvus_index_type).upper()
+    if index_type in ("IVF_FLAT", "IVF_SQ8"):
+        params = {"nlist": settings.milvus_ivf_nlist}
+    elif index_type == "IVF_PQ":
+        params = {"nlist": settings.milvus_ivf_nlist, "m": settings.milvus_pq_m, "nbits": settings.milvus_pq_nbits}
+    elif index_type == "HNSW":
+        params = {"M": settings.milvus_hnsw_m, "efConstruction": settings.milvus_hnsw_ef_construction}
+    elif index_type == "FLAT":
+        params = {}
+    else:
+        raise ValueError(f"Unsupported Milvus index type '{index_type}' (available: {', '.join(INDEX_TYPES)})")
+    return {"index_type": index_type, "metric_type": "IP", "params": params}
+
+
+def search_params(top_k: int, index_type: str | None = None, min_score: float | None = None) -> dict:
+    index_type = (index_type or settings.milvus_index_type).upper()
+    if index_type == "HNSW":
+        # ef не может быть меньше limit
+        params = {"ef": max(settings.milvus_search_ef, top_k)}
+    elif index_type.startswith("IVF"):
+        params = {"nprobe": settings.milvus_search_nprobe}
+    else:
+        params = {}
+    if min_score is not None:
+        # range search по IP: Milvus оставляет хиты со score > radius (сдвиг — чтобы порог включался)
+        params["radius"] = min_score - 1e-6
+    return {"metric_type": "IP", "params": params}
+
+
+# тип ANN-индекса по имени коллекции/алиаса: MILVUS_INDEX_TYPE действует только на новые версии (reindex),
+# а поиск должен слать параметры индекса, который реально построен за алиасом (в т.ч. после --rollback).
+# TTL — чтобы подхватить переключение алиаса другим процессом
+_index_types = TTLCache(maxsize=16, ttl_seconds=30)
+
+
+def collection_index_type(col: Collection) -> str:
+    index_type = _index_types.get(col.name)
+    if index_type is None:
+        index_type = settings.milvus_index_type.upper()
+        for idx in col.indexes:
+            if idx.field_name == "embedding":
+                index_type = str(idx.params.get("index_type", index_type)).upper()
+                break
+        _index_types.set(col.name, index_type)
+    return index_type
 
 
 @retry(stop=stop_after_attempt(10), wait=wait_fixed(2))
@@ -17,72 +77,534 @@ def connect():
     connections.connect(host=settings.milvus_host, port=settings.milvus_port)
 
 
+def _version_number(name: str) -> int:
+    return int(name[len(_VERSION_PREFIX) :])
+
+
+def list_collection_versions() -> list[str]:
+    names = [n for n in utility.list_collections() if n.startswith(_VERSION_PREFIX) and n[len(_VERSION_PREFIX) :].isdigit()]
+    return sorted(names, key=_version_number)
+
+
+def current_collection_version() -> str | None:
+    """Версия, на которую сейчас указывает алиас COLLECTION_NAME."""
+    for name in list_collection_versions():
+        if COLLECTION_NAME in utility.list_aliases(name):
+            return name
+    return None
+
+
+_SEARCH_FIELDS = ["chunk_id", "document_id", "page_number", "chunk_index"]
+# денормализованный payload (MILVUS_PAYLOAD_ENABLED): поиск отдаёт готовые текст/контекст/название
+# без похода в Postgres. Лимиты VARCHAR — в байтах UTF-8
+PAYLOAD_FIELDS = {"text": 8192, "context": 32768, "title": 1024}
+# скалярные поля документа для фильтров поиска: фильтр идёт внутри ANN-поиска как expr
+_SCALAR_VARCHAR_FIELDS = {"uploaded_by": 64, "tag": 128}
+SCALAR_FIELDS = ("uploaded_at", *_SCALAR_VARCHAR_FIELDS)
+
+
+# модель эмбеддингов версии — в описании коллекции: векторы разных моделей несравнимы,
+# и процесс со старой моделью не должен ни искать, ни писать в версию новой (и наоборот)
+_MODEL_RE = re.compile(r"\bmodel=(\S+)")
+
+
+def _build_collection(name: str, dim: int, payload: bool = False, model_name: str | None = None) -> Collection:
+    fields = [
+        FieldSchema("chunk_id", DataType.VARCHAR, is_primary=True, max_length=64),
+        FieldSchema("document_id", DataType.VARCHAR, max_length=64),
+        FieldSchema("page_number", DataType.INT64),
+        FieldSchema("chunk_index", DataType.INT64),
+        FieldSchema("embedding", DataType.FLOAT_VECTOR, dim=dim),
+        # время загрузки — unix epoch (сек, UTC)
+        FieldSchema("uploaded_at", DataType.INT64),
+        *(FieldSchema(f, DataType.VARCHAR, max_length=n) for f, n in _SCALAR_VARCHAR_FIELDS.items()),
+    ]
+    if payload:
+        fields += [FieldSchema(f, DataType.VARCHAR, max_length=n) for f, n in PAYLOAD_FIELDS.items()]
+    model_name = model_name or settings.embedding_model_name
+    schema = CollectionSchema(fields=fields, description=f"Chunks embeddings; model={model_name}")
+    col = Collection(name, schema)
+    col.create_index(field_name="embedding", index_params=index_params())
+    col.create_index(field_name="uploaded_at", index_params={"index_type": "STL_SORT"})
+    for f in _SCALAR_VARCHAR_FIELDS:
+        col.create_index(field_name=f, index_params={"index_type": "INVERTED"})
+    return col
+
+
+def create_collection_version(dim: int | None = None, payload: bool | None = None) -> Collection:
+    """
+    Новая пустая версия коллекции (не загружена и не под алиасом) — её наполняет reindex.
+    Версия помечается моделью EMBEDDING_MODEL_NAME этого процесса.
+    """
+    versions = list_collection_versions()
+    n = _version_number(versions[-1]) + 1 if versions else 1
+    dim = dim or get_model().get_sentence_embedding_dimension()
+    payload = settings.milvus_payload_enabled if payload is None else payload
+    return _build_collection(f"{_VERSION_PREFIX}{n}", dim, payload=payload)
+
+
+# модель по имени версии/алиаса; TTL — чтобы подхватить переключение алиаса другим процессом
+_collection_models = TTLCache(maxsize=32, ttl_seconds=30)
+
+
+def collection_model(name: str) -> str | None:
+    """Модель, которой наполнена версия (или версия за алиасом); None — версия без отметки (до её появления)."""
+    model = _collection_models.get(name)
+    if model is None:
+        match = _MODEL_RE.search(Collection(name).description or "")
+        model = match.group(1) if match else ""
+        _collection_models.set(name, model)
+    return model or None
+
+
+def _model_matches(name: str) -> bool:
+    model = collection_model(name)
+    return model is None or model == settings.embedding_model_name
+
+
+def live_model_matches() -> bool:
+    """Живая версия наполнена моделью этого процесса: можно писать в неё (ingest)."""
+    get_collection()
+    return _model_matches(COLLECTION_NAME)
+
+
+def _model_mismatch(action: str):
+    from app.services.search import EmbeddingModelMismatch
+
+    return EmbeddingModelMismatch(
+        f"Cannot {action}: live collection '{COLLECTION_NAME}' was built with model "
+        f"'{collection_model(COLLECTION_NAME)}', this process uses '{settings.embedding_model_name}'. "
+        "Restart it with the new EMBEDDING_MODEL_NAME."
+    )
+
+
+def _writable_collection() -> Collection:
+    # ingest пишет только в живую версию своей модели: векторы старой модели в новой версии — мусор
+    col = get_collection()
+    if not _model_matches(COLLECTION_NAME):
+        raise _model_mismatch("write embeddings")
+    return col
+
+
+_search_versions = TTLCache(maxsize=1, ttl_seconds=30)
+
+
+def search_collection() -> Collection:
+    """
+    Версия для поиска: живая, если её наполнила модель этого процесса. Иначе (reindex уже переключил алиас
+    на новую модель, а процесс ещё не перезапущен) — последняя версия своей модели, она загружается по требованию:
+    до перезапуска поиск идёт по прежним векторам, а не сравнивает векторы разных моделей.
+    """
+    col = get_collection()
+    if _model_matches(COLLECTION_NAME):
+        return col
+    fallback = _search_versions.get(settings.embedding_model_name)
+    if fallback is not None:
+        return fallback
+    for name in reversed(list_collection_versions()):
+        if collection_model(name) == settings.embedding_model_name:
+            fallback = Collection(name)
+            if utility.load_state(name) != LoadState.Loaded:
+                _load_active_partitions(fallback)
+            _search_versions.set(settings.embedding_model_name, fallback)
+            return fallback
+    raise _model_mismatch("search")
+
+
+# схема живой версии: алиас может переключить другой процесс (reindex), поэтому перечитываем её раз в TTL
+_live_fields_cache = TTLCache(maxsize=1, ttl_seconds=30)
+
+
+def collection_fields(collection: Collection | None = None) -> frozenset[str]:
+    if collection is not None:
+        return frozenset(f.name for f in collection.schema.fields)
+    fields = _live_fields_cache.get(COLLECTION_NAME)
+    if fields is None:
+        get_collection()
+        fields = frozenset(f.name for f in Collection(COLLECTION_NAME).schema.fields)
+        _live_fields_cache.set(COLLECTION_NAME, fields)
+    return fields
+
+
+def _fit_varchar(value: str | None, max_bytes: int) -> str:
+    raw = (value or "").encode("utf-8")
+    if len(raw) <= max_bytes:
+        return value or ""
+    return raw[:max_bytes].decode("utf-8", errors="ignore")
+
+
+# корпус (отдел) документа → именованный partition: поиск по корпусу сканирует только его,
+# редко нужные корпуса можно выгружать из памяти (scripts/milvus_corpora.py).
+# Корпус по умолчанию живёт в _default — туда же попали векторы коллекций до появления корпусов
+_DEFAULT_PARTITION = "_default"
+_PARTITION_PREFIX = "corpus_"
+
+
+def corpus_partition(corpus: str | None) -> str:
+    if not corpus or corpus == settings.default_corpus:
+        return _DEFAULT_PARTITION
+    if re.fullmatch(r"[A-Za-z0-9_]{1,64}", corpus):
+        return f"{_PARTITION_PREFIX}{corpus}"
+    # имя partition — только латиница, цифры и _; остальные корпуса — по хешу имени
+    return f"{_PARTITION_PREFIX}{hashlib.sha256(corpus.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _ensure_partition(col: Collection, name: str) -> None:
+    if name == _DEFAULT_PARTITION or col.has_partition(name):
+        return
+    try:
+        col.create_partition(name)
+    except Exception:
+        # partition параллельно создал другой процесс
+        if not col.has_partition(name):
+            raise
+
+
+# partition, готовые к поиску (есть и загружены); кешируются только положительные ответы
+_ready_partitions = TTLCache(maxsize=256, ttl_seconds=30)
+
+
+def _partition_ready(col: Collection, name: str) -> bool:
+    key = f"{col.name}/{name}"
+    if _ready_partitions.get(key):
+        return True
+    if not col.has_partition(name):
+        return False
+    if utility.load_state(col.name, partition_names=[name]) != LoadState.Loaded:
+        # выгруженный корпус поднимается по первому запросу к нему
+        Partition(col, name).load()
+    _ready_partitions.set(key, True)
+    return True
+
+
+def _released_partitions_path() -> Path:
+    return settings.storage_dir / "released_partitions.json"
+
+
+def released_partitions() -> set[str]:
+    """Partition, выгруженные оператором: при старте backend и переключении версии они не загружаются."""
+    path = _released_partitions_path()
+    if not path.exists():
+        return set()
+    return set(json.loads(path.read_text()))
+
+
+def _save_released_partitions(names: set[str]) -> None:
+    path = _released_partitions_path()
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(sorted(names)))
+    tmp.replace(path)
+
+
+def _load_active_partitions(col: Collection) -> None:
+    released = released_partitions()
+    if not released:
+        col.load()
+        return
+    # версия могла быть загружена целиком (reindex грузит её для проверки числа строк) —
+    # выгруженные оператором partition выгружаем явно, а не просто не грузим
+    for p in col.partitions:
+        if p.name in released:
+            p.release()
+    col.load(partition_names=[p.name for p in col.partitions if p.name not in released])
+
+
+def load_corpus(corpus: str) -> None:
+    col = get_collection()
+    name = corpus_partition(corpus)
+    if not col.has_partition(name):
+        raise ValueError(f"Corpus '{corpus}' has no partition ({name}) in {COLLECTION_NAME}")
+    Partition(col, name).load()
+    _save_released_partitions(released_partitions() - {name})
+
+
+def release_corpus(corpus: str) -> None:
+    col = get_collection()
+    name = corpus_partition(corpus)
+    if name == _DEFAULT_PARTITION:
+        raise ValueError("The default corpus stays loaded")
+    if col.has_partition(name):
+        Partition(col, name).release()
+    _save_released_partitions(released_partitions() | {name})
+    _ready_partitions.clear()
+
+
+def partition_load_states() -> dict[str, str]:
+    col = get_collection()
+    return {
+        p.name: utility.load_state(COLLECTION_NAME, partition_names=[p.name]).name for p in col.partitions
+    }
+
+
+def epoch_seconds(value: datetime) -> int:
+    # naive datetime в проекте — UTC (datetime.utcnow)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _entity(row: dict, fields: frozenset[str]) -> dict:
+    entity = {
+        "chunk_id": row["chunk_id"],
+        "document_id": row["document_id"],
+        "page_number": row.get("page_number") or 0,
+        "chunk_index": row["chunk_index"],
+        "embedding": row["embedding"],
+    }
+    for name, max_bytes in PAYLOAD_FIELDS.items():
+        if name in fields:
+            entity[name] = _fit_varchar(row.get(name), max_bytes)
+    if "uploaded_at" in fields:
+        uploaded_at = row.get("uploaded_at")
+        entity["uploaded_at"] = epoch_seconds(uploaded_at) if uploaded_at else 0
+    for name, max_bytes in _SCALAR_VARCHAR_FIELDS.items():
+        if name in fields:
+            entity[name] = _fit_varchar(row.get(name), max_bytes)
+    return entity
+
+
+def supports_filters() -> bool:
+    # версии коллекции до появления скалярных полей фильтровать не умеют — нужен reindex
+    return all(name in collection_fields() for name in SCALAR_FIELDS)
+
+
+def filter_expr(filters: SearchFilters | None) -> str | None:
+    """Boolean expr Milvus из фильтров поиска; None — без фильтра."""
+    if filters is None:
+        return None
+    parts: list[str] = []
+    if filters.uploaded_after is not None:
+        parts.append(f"uploaded_at >= {epoch_seconds(filters.uploaded_after)}")
+    if filters.uploaded_before is not None:
+        parts.append(f"uploaded_at < {epoch_seconds(filters.uploaded_before)}")
+    if filters.uploaded_by:
+        parts.append(f"uploaded_by == {json.dumps(filters.uploaded_by, ensure_ascii=False)}")
+    if filters.tag:
+        parts.append(f"tag == {json.dumps(filters.tag, ensure_ascii=False)}")
+    return " && ".join(parts) or None
+
+
+def _ensure_alias() -> None:
+    if current_collection_version() is not None:
+        return
+    if utility.has_collection(COLLECTION_NAME):
+        # коллекция из времён до версионирования: становится v1, её имя занимает алиас
+        utility.rename_collection(COLLECTION_NAME, f"{_VERSION_PREFIX}1")
+        utility.create_alias(f"{_VERSION_PREFIX}1", COLLECTION_NAME)
+        return
+    col = create_collection_version()
+    utility.create_alias(col.name, COLLECTION_NAME)
+
+
+def activate_collection_version(name: str) -> str | None:
+    """
+    Загружает версию и атомарно переключает на неё алиас; прежняя версия остаётся (для отката),
+    но выгружается из памяти. Возвращает имя прежней версии.
+    """
+    previous = current_collection_version()
+    _load_active_partitions(Collection(name))
+    if previous is None:
+        utility.create_alias(name, COLLECTION_NAME)
+    else:
+        utility.alter_alias(name, COLLECTION_NAME)
+    if previous and previous != name:
+        Collection(previous).release()
+    _collection_models.clear()
+    _search_versions.clear()
+    return previous
+
+
+def drop_collection_version(name: str) -> None:
+    if name == current_collection_version():
+        raise ValueError(f"Collection {name} is live (alias {COLLECTION_NAME}); switch the alias first")
+    utility.drop_collection(name)
+
+
+def count_rows(col: Collection) -> int:
+    # count(*) учитывает удаления, в отличие от num_entities
+    res = col.query(expr="", output_fields=["count(*)"])
+    return int(res[0]["count(*)"]) if res else 0
+
+
 @lru_cache(maxsize=1)
 def get_collection() -> Collection:
     connect()
-    if not utility.has_collection(COLLECTION_NAME):
-        dim = get_model().get_sentence_embedding_dimension()
-        schema = CollectionSchema(
-            fields=[
-                FieldSchema("chunk_id", DataType.VARCHAR, is_primary=True, max_length=64),
-                FieldSchema("document_id", DataType.VARCHAR, max_length=64),
-                FieldSchema("page_number", DataType.INT64),
-                FieldSchema("chunk_index", DataType.INT64),
-                FieldSchema("embedding", DataType.FLOAT_VECTOR, dim=dim),
-            ],
-            description="Chunks embeddings",
-        )
-        col = Collection(COLLECTION_NAME, schema)
-        col.create_index(
-            field_name="embedding",
-            index_params={"index_type": "IVF_FLAT", "metric_type": "IP", "params": {"nlist": 128}},
-        )
-        col.load()
-        return col
-
+    _ensure_alias()
+    # Collection по алиасу: сервер разрешает его на каждом запросе, так что переключение версии
+    # подхватывается без перезапуска процесса
     col = Collection(COLLECTION_NAME)
     if not col.has_index():
-        col.create_index(
-            field_name="embedding",
-            index_params={"index_type": "IVF_FLAT", "metric_type": "IP", "params": {"nlist": 128}},
-        )
-    # load коллекции может быть дорогим; делаем один раз за жизнь процесса
-    col.load()
+        col.create_index(field_name="embedding", index_params=index_params())
+    # load коллекции может быть дорогим; делаем один раз за жизнь процесса.
+    # Выгруженные оператором корпуса остаются выгруженными и после перезапуска
+    _load_active_partitions(col)
     return col
 
 
-def insert_embeddings(rows: list[dict]):
-    col = get_collection()
-    col.insert(
-        [
-            [r["chunk_id"] for r in rows],
-            [r["document_id"] for r in rows],
-            [r.get("page_number") or 0 for r in rows],
-            [r["chunk_index"] for r in rows],
-            [r["embedding"] for r in rows],
-        ]
-    )
-    col.flush()
+def insert_embeddings(rows: list[dict], flush: bool = False, upsert: bool = False, collection: Collection | None = None):
+    # без flush: строки видны поиску из growing segment; flush (seal) — только на чекпоинтах.
+    # upsert — для повторяемых загрузок (reindex с чекпоинта): те же chunk_id не дублируются;
+    # collection — конкретная версия вместо живой (reindex в новую версию)
+    # строки — словарями по полям схемы целевой версии: лишнее (payload для версии без него) отбрасывается;
+    # каждая строка уходит в partition своего корпуса
+    col = collection or _writable_collection()
+    fields = collection_fields(collection)
+    by_partition: dict[str, list[dict]] = defaultdict(list)
+    for r in rows:
+        by_partition[corpus_partition(r.get("corpus"))].append(_entity(r, fields))
+    for partition, entities in by_partition.items():
+        _ensure_partition(col, partition)
+        (col.upsert if upsert else col.insert)(entities, partition_name=partition)
+    if flush:
+        col.flush()
 
 
-def search_embeddings(vector: list[float], top_k: int = 8):
-    col = get_collection()
-    res = col.search(
-        data=[vector],
-        anns_field="embedding",
-        param={"metric_type": "IP", "params": {"nprobe": 10}},
-        limit=top_k,
-        output_fields=["chunk_id", "document_id", "page_number", "chunk_index"],
+def flush_embeddings(collection: Collection | None = None) -> None:
+    (collection or get_collection()).flush()
+
+
+def wait_until_searchable(rows: list[dict], collection: Collection | None = None) -> None:
+    # Strong-запрос ждёт, пока Milvus применит все вставки до его timestamp — после него строки видны поиску
+    if not rows:
+        return
+    col = collection or get_collection()
+    col.query(
+        expr=f"chunk_id in [{json.dumps(rows[-1]['chunk_id'])}]",
+        output_fields=["chunk_id"],
+        consistency_level="Strong",
     )
-    hits = []
-    for hit in res[0]:
-        hits.append(
-            {
-                "chunk_id": hit.entity.get("chunk_id"),
-                "document_id": hit.entity.get("document_id"),
-                "page_number": int(hit.entity.get("page_number")),
-                "chunk_index": int(hit.entity.get("chunk_index")),
-                "score": float(hit.score),
-            }
+
+
+def get_embeddings(chunk_ids: list[str]) -> dict[str, list[float]]:
+    if not chunk_ids:
+        return {}
+    col = _writable_collection()
+    ids = ", ".join(json.dumps(c) for c in chunk_ids)
+    rows = col.query(expr=f"chunk_id in [{ids}]", output_fields=["chunk_id", "embedding"])
+    return {r["chunk_id"]: list(r["embedding"]) for r in rows}
+
+
+def _hit_to_dict(hit, payload: bool = False) -> dict:
+    out = {
+        "chunk_id": hit.entity.get("chunk_id"),
+        "document_id": hit.entity.get("document_id"),
+        "page_number": int(hit.entity.get("page_number")),
+        "chunk_index": int(hit.entity.get("chunk_index")),
+        "score": float(hit.score),
+    }
+    if payload:
+        out.update({name: hit.entity.get(name) for name in PAYLOAD_FIELDS})
+    return out
+
+
+def search_embeddings_batch(
+    vectors: list[list[float]],
+    top_k: int | None = None,
+    min_score: float | None = None,
+    filters: SearchFilters | None = None,
+) -> list[list[dict]]:
+    """
+    Один gRPC-запрос на все векторы; результат — список хитов на каждый вектор по порядку.
+    min_score — порог отсекает сам Milvus (range search) и отдаёт все хиты выше него,
+    до search_range_max_results (по умолчанию 2 * search_top_k), вместо top_k с фильтрацией в Python.
+    filters — скалярный фильтр внутри ANN-поиска: top_k считается уже среди подходящих чанков.
+    С filters.corpus поиск идёт только в partition корпуса (выгруженный загружается по требованию);
+    без корпуса — по всем загруженным partition: выгруженные корпуса (release_corpus) в выдачу не попадают.
+    """
+    if not vectors:
+        return []
+    expr = filter_expr(filters)
+    if min_score is not None:
+        top_k = top_k or settings.search_range_max_results or 2 * settings.search_top_k
+    else:
+        top_k = top_k or settings.search_top_k
+    col = search_collection()
+    partition_names = None
+    if filters is not None and filters.corpus:
+        partition = corpus_partition(filters.corpus)
+        if not _partition_ready(col, partition):
+            # в корпусе ещё нет ни одного документа
+            return [[] for _ in vectors]
+        partition_names = [partition]
+    fields = collection_fields() if col.name == COLLECTION_NAME else collection_fields(col)
+    payload = all(name in fields for name in PAYLOAD_FIELDS)
+
+    def run():
+        return col.search(
+            data=vectors,
+            anns_field="embedding",
+            param=search_params(top_k, index_type=collection_index_type(col), min_score=min_score),
+            limit=top_k,
+            expr=expr,
+            partition_names=partition_names,
+            output_fields=_SEARCH_FIELDS + (list(PAYLOAD_FIELDS) if payload else []),
         )
-    return hits
+
+    try:
+        res = run()
+    except Exception:
+        if partition_names is None:
+            raise
+        # partition могли выгрузить из другого процесса после того, как мы закешировали его готовность
+        _ready_partitions.clear()
+        if not _partition_ready(col, partition_names[0]):
+            return [[] for _ in vectors]
+        res = run()
+    return [[_hit_to_dict(hit, payload=payload) for hit in hits] for hits in res]
+
+
+def search_embeddings(
+    vector: list[float],
+    top_k: int | None = None,
+    min_score: float | None = None,
+    filters: SearchFilters | None = None,
+):
+    return search_embeddings_batch([vector], top_k=top_k, min_score=min_score, filters=filters)[0]
+
+
+_DELETE_BATCH = 1000
+
+
+def _delete_in(field: str, values: list[str], collection: Collection | None = None) -> None:
+    col = collection or get_collection()
+    # длинный expr режем на части: у Milvus есть предел на размер запроса
+    for i in range(0, len(values), _DELETE_BATCH):
+        part = ", ".join(json.dumps(v) for v in values[i : i + _DELETE_BATCH])
+        col.delete(expr=f"{field} in [{part}]")
+
+
+def delete_document_embeddings(document_ids: list[str]) -> None:
+    if document_ids:
+        _delete_in("document_id", list(document_ids))
+
+
+def delete_chunk_embeddings(chunk_ids: list[str]) -> None:
+    if chunk_ids:
+        _delete_in("chunk_id", list(chunk_ids))
+
+
+def delete_from_retained_versions(chunk_ids: list[str]) -> None:
+    """
+    Удаление из версий коллекции, кроме живой (оставлены для --rollback или наполняются reindex):
+    иначе откат вернул бы в поиск удалённые документы. Эти версии не загружены, поэтому удаляем
+    по первичному ключу, а не по expr на document_id.
+    """
+    if not chunk_ids:
+        return
+    current = current_collection_version()
+    for name in list_collection_versions():
+        if name != current:
+            _delete_in("chunk_id", list(chunk_ids), Collection(name))
+
+
+def iter_index_entries(batch_size: int = 10000):
+    """Все (chunk_id, document_id) живой коллекции пачками — для сверки с Postgres."""
+    it = get_collection().query_iterator(batch_size=batch_size, expr="", output_fields=["chunk_id", "document_id"])
+    try:
+        while True:
+            page = it.next()
+            if not page:
+                return
+            yield [(r["chunk_id"], r["document_id"]) for r in page]
+    finally:
+        it.close()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable
+
+from app.core.config import settings
+from app.observability.metrics import MILVUS_WRITE_BATCH_ROWS, MILVUS_WRITE_QUEUE_DEPTH
+
+logger = logging.getLogger("uvicorn.error")
+
+_STOP = object()
+
+
+@dataclass
+class _Write:
+    rows: list[dict]
+    future: Future = field(default_factory=Future)
+
+
+@dataclass
+class _Flush:
+    future: Future = field(default_factory=Future)
+
+
+class MilvusWriter:
+    """
+    Единая точка вставки в живую коллекцию. Вставки от разных документов копятся до max_batch_rows строк
+    или max_wait_ms (от первой в пачке) и уходят одним insert без flush: видимость даёт growing segment
+    самого Milvus. Flush (seal сегментов) — только по явному flush() и при остановке.
+    Future каждой вставки завершается, когда строки вставлены; видимость для поиска вызывающий
+    ждёт сам (milvus_client.wait_until_searchable), один раз на документ.
+    """
+
+    def __init__(
+        self,
+        insert: Callable[[list[dict]], None],
+        flush: Callable[[], None],
+        max_batch_rows: int,
+        max_wait_ms: float,
+    ):
+        self._insert = insert
+        self._flush = flush
+        self.max_batch_rows = max(1, max_batch_rows)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="milvus-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows: list[dict]) -> Future:
+        req = _Write(rows=list(rows))
+        if not req.rows:
+            req.future.set_result(None)
+            return req.future
+        self._queue.put(req)
+        MILVUS_WRITE_QUEUE_DEPTH.set(self._queue.qsize())
+        return req.future
+
+    def write(self, rows: list[dict]) -> None:
+        self.submit(rows).result()
+
+    def flush(self) -> None:
+        """Чекпоинт: дописывает всё, что в очереди, и делает flush коллекции."""
+        req = _Flush()
+        self._queue.put(req)
+        req.future.result()
+
+    def stop(self, timeout: float | None = 30.0) -> None:
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+
+    def _collect(self, first: _Write) -> tuple[list[_Write], object | None]:
+        # возвращает пачку вставок и управляющий элемент (_Flush/_STOP), на котором сбор прервался
+        batch = [first]
+        size = len(first.rows)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if not isinstance(item, _Write):
+                return batch, item
+            batch.append(item)
+            size += len(item.rows)
+        return batch, None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            control = item
+            if isinstance(item, _Write):
+                batch, control = self._collect(item)
+                MILVUS_WRITE_QUEUE_DEPTH.set(self._queue.qsize())
+                self._process(batch)
+            if isinstance(control, _Flush):
+                self._checkpoint(control.future)
+            elif control is _STOP:
+                break
+
+        # дорабатываем то, что успело попасть в очередь до остановки, и закрываем чекпоинтом
+        leftover: list[_Write] = []
+        flushes: list[_Flush] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _Write):
+                leftover.append(item)
+            elif isinstance(item, _Flush):
+                flushes.append(item)
+        if leftover:
+            self._process(leftover)
+        done: Future = Future()
+        self._checkpoint(done)
+        for req in flushes:
+            if done.exception() is None:
+                req.future.set_result(None)
+            else:
+                req.future.set_exception(done.exception())
+        MILVUS_WRITE_QUEUE_DEPTH.set(0)
+
+    def _checkpoint(self, future: Future) -> None:
+        try:
+            self._flush()
+        except Exception as e:
+            logger.warning("Milvus flush failed: %s", e)
+            future.set_exception(e)
+            return
+        future.set_result(None)
+
+    def _process(self, batch: list[_Write]) -> None:
+        rows = [r for req in batch for r in req.rows]
+        MILVUS_WRITE_BATCH_ROWS.observe(len(rows))
+        try:
+            self._insert(rows)
+        except Exception as e:
+            logger.warning("Milvus insert of %d rows failed: %s", len(rows), e)
+            for req in batch:
+                req.future.set_exception(e)
+            return
+        for req in batch:
+            req.future.set_result(None)
+
+
+@lru_cache(maxsize=1)
+def get_milvus_writer() -> MilvusWriter:
+    from app.services.milvus_client import flush_embeddings, insert_embeddings
+
+    return MilvusWriter(
+        insert=insert_embeddings,
+        flush=flush_embeddings,
+        max_batch_rows=settings.milvus_write_batch_rows,
+        max_wait_ms=settings.milvus_write_max_wait_ms,
+    )
+
+
+def stop_milvus_writer() -> None:
+    if get_milvus_writer.cache_info().currsize:
+        get_milvus_writer().stop()
+        get_milvus_writer.cache_clear()
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator
+
+_DONE = object()
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def prefetch(iterable: Iterable, maxsize: int, name: str = "prefetch") -> Iterator:
+    """
+    Итерирует iterable в фоновом потоке, отдавая элементы через очередь длины maxsize:
+    следующий элемент готовится, пока текущий обрабатывается. Ошибка источника пробрасывается
+    потребителю; если потребитель бросил итерацию — поток останавливается.
+    """
+    q: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def run():
+        try:
+            for item in iterable:
+                if not _put(q, (item, None), stop):
+                    return
+            _put(q, (_DONE, None), stop)
+        except BaseException as e:
+            _put(q, (_DONE, e), stop)
+
+    t = threading.Thread(target=run, name=name, daemon=True)
+    t.start()
+    try:
+        while True:
+            item, error = q.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+class BoundedWorker:
+    """
+    Фоновый потребитель: put() кладёт элемент в очередь длины maxsize (блокируется, если она полна),
+    поток применяет к элементам fn по порядку. close() дожидается обработки всего и пробрасывает
+    первую ошибку fn.
+    """
+
+    def __init__(self, fn: Callable[[Any], None], maxsize: int, name: str = "bounded-worker"):
+        self._fn = fn
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+        self._stop = threading.Event()
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._fn(item)
+            except BaseException as e:
+                self._error = e
+                self._stop.set()
+
+    def put(self, item: Any) -> None:
+        # ошибка проверяется и после постановки: поток после ошибки fn вычитывает очередь вхолостую,
+        # и заблокированный put мог пройти — такой элемент уже не будет обработан
+        if self._error is None:
+            _put(self._queue, item, self._stop)
+        if self._error is not None:
+            raise self._error
+
+    def close(self) -> None:
+        self._queue.put(_DONE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
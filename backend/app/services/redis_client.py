@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from functools import lru_cache
+
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# после ошибки Redis не трогается cooldown секунд: иначе каждый запрос ждал бы socket_timeout
+_down_until = 0.0
+_down_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _client():
+    # Redis опционален: без REDIS_URL (или без пакета redis) кеши работают только in-process
+    if not settings.redis_url:
+        return None
+    try:
+        import redis
+    except Exception:
+        return None
+    try:
+        return redis.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_socket_timeout_seconds,
+            socket_connect_timeout=settings.redis_socket_timeout_seconds,
+        )
+    except Exception as e:
+        logger.warning("Redis client init failed: %s", e)
+        return None
+
+
+def get_redis():
+    """Клиент Redis или None: не настроен или недавно отвечал ошибкой."""
+    if _down_until and time.monotonic() < _down_until:
+        return None
+    return _client()
+
+
+def mark_redis_failed(error: Exception) -> None:
+    global _down_until
+    with _down_lock:
+        if _down_until and time.monotonic() < _down_until:
+            return
+        _down_until = time.monotonic() + settings.redis_retry_cooldown_seconds
+    logger.warning("Redis unavailable, skipping it for %.0fs: %s", settings.redis_retry_cooldown_seconds, error)
@@ -1,15 +1,27 @@
 from __future__ import annotations
 
+import logging
 import re
 import time
+from datetime import datetime
 from fastapi import UploadFile
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.models.chunk import Chunk
 from app.models.document import Document
 from app.models.search_event import SearchEvent
-from app.schemas.search import SearchResultItem
+from app.schemas.search import SearchFilters, SearchResultItem
+
+
+class UnsupportedSearchFilter(ValueError):
+    pass
+
+
+class EmbeddingModelMismatch(RuntimeError):
+    # живая версия коллекции наполнена другой моделью, а версии с моделью этого процесса нет
+    pass
 
 
 def _normalize_ws(text: str) -> str:
@@ -71,140 +83,466 @@ def _make_excerpt(source_text: str, query: str, max_len: int = 420) -> str:
     return snippet
 
 
-def search_sources(
+def _min_score(min_similarity_percent: float | None) -> float | None:
+    if min_similarity_percent is None:
+        return None
+    try:
+        p = float(min_similarity_percent)
+        p = 0.0 if p < 0 else 100.0 if p > 100 else p
+        return p / 100.0
+    except Exception:
+        return None
+
+
+def _check_filters(filters: SearchFilters | None) -> SearchFilters | None:
+    """Пустые фильтры → None; фильтры по коллекции без скалярных полей — ошибка, а не молчаливый игнор."""
+    from app.services.milvus_client import supports_filters
+
+    if filters is None or filters.is_empty():
+        return None
+    # корпус — это partition, он есть в любой версии коллекции; скалярным полям нужен reindex
+    if filters.has_scalar_filters() and not supports_filters():
+        raise UnsupportedSearchFilter("Search filters require a reindexed Milvus collection (app.scripts.reindex_milvus)")
+    return filters
+
+
+def _fetch_rows(db: Session, hits: list[dict]):
+    # одна выборка: ровно пары (document_id, chunk_index±1) для всех хитов + их документы
+    keys: set[tuple[str, int]] = set()
+    payload_doc_ids: set[str] = set()
+    for h in hits:
+        if h.get("context") is not None:
+            # хит из коллекции с payload (MILVUS_PAYLOAD_ENABLED) — текст и название уже пришли из Milvus
+            payload_doc_ids.add(h["document_id"])
+            continue
+        for i in (h["chunk_index"] - 1, h["chunk_index"], h["chunk_index"] + 1):
+            if i >= 0:
+                keys.add((h["document_id"], i))
+
+    chunks_by_id: dict[str, Chunk] = {}
+    neighbor_chunks_by_key: dict[tuple[str, int], Chunk] = {}
+    docs_by_id: dict[str, Document] = {}
+    live_doc_ids: set[str] = set()
+    if payload_doc_ids:
+        # дешёвая проверка по первичному ключу: векторы удалённых/недоиндексированных документов
+        # могут ещё лежать в Milvus (до gc_orphans), но в выдачу они попасть не должны
+        live_doc_ids = set(
+            db.execute(
+                select(Document.id).where(Document.id.in_(payload_doc_ids), Document.status == "processed")
+            ).scalars()
+        )
+    if not keys:
+        return chunks_by_id, neighbor_chunks_by_key, docs_by_id, live_doc_ids
+
+    rows = (
+        db.query(Chunk, Document)
+        .join(Document, Document.id == Chunk.document_id)
+        .filter(tuple_(Chunk.document_id, Chunk.chunk_index).in_(sorted(keys)))
+        .all()
+    )
+    for chunk, doc in rows:
+        chunks_by_id[chunk.id] = chunk
+        neighbor_chunks_by_key[(chunk.document_id, chunk.chunk_index)] = chunk
+        docs_by_id[doc.id] = doc
+    return chunks_by_id, neighbor_chunks_by_key, docs_by_id, live_doc_ids
+
+
+def _assemble_results(hits: list[dict], rows, query_text: str) -> list[dict]:
+    chunks_by_id, neighbor_chunks_by_key, docs_by_id, live_doc_ids = rows
+    results: list[dict] = []
+    for h in hits:
+        if h.get("context") is not None:
+            if h["document_id"] not in live_doc_ids:
+                continue
+            results.append(
+                {
+                    "document_id": h["document_id"],
+                    "title": h.get("title") or "",
+                    "score": h["score"],
+                    "excerpt": _make_excerpt(h["context"], query_text),
+                    "page_number": h.get("page_number") or None,
+                }
+            )
+            continue
+        chunk = chunks_by_id.get(h["chunk_id"])
+        doc = docs_by_id.get(h["document_id"])
+        if not chunk or not doc:
+            continue
+        context_parts: list[str] = []
+        prev = neighbor_chunks_by_key.get((chunk.document_id, chunk.chunk_index - 1))
+        nxt = neighbor_chunks_by_key.get((chunk.document_id, chunk.chunk_index + 1))
+        if prev:
+            context_parts.append(prev.text)
+        context_parts.append(chunk.text)
+        if nxt:
+            context_parts.append(nxt.text)
+        excerpt = _make_excerpt("\n".join(context_parts), query_text)
+        results.append(
+            {
+                "document_id": doc.id,
+                "title": doc.title,
+                "score": h["score"],
+                "excerpt": excerpt,
+                "page_number": h.get("page_number") or None,
+            }
+        )
+    return results
+
+
+def _release_connection(db: Session) -> None:
+    # транзакция запроса (get_optional_user, выборка чанков) не должна держать соединение пула,
+    # пока ждём encode, Milvus и реранкер: close() возвращает его в пул, сессия при этом остаётся рабочей
+    db.close()
+
+
+def _build_results(db: Session, hits: list[dict], query_text: str) -> list[dict]:
+    try:
+        return _assemble_results(hits, _fetch_rows(db, hits), query_text)
+    finally:
+        _release_connection(db)
+
+
+def _build_results_batch(db: Session, hits_per_query: list[list[dict]], query_texts: list[str]) -> list[list[dict]]:
+    try:
+        rows = _fetch_rows(db, [h for hits in hits_per_query for h in hits])
+        return [_assemble_results(hits, rows, q) for hits, q in zip(hits_per_query, query_texts)]
+    finally:
+        _release_connection(db)
+
+
+def _log_timing(t_embed: float, t_milvus: float, hits: int, rerank: bool) -> None:
+    # лёгкая диагностика производительности (видно в docker logs backend)
+    try:
+        import logging
+
+        logging.getLogger("uvicorn.error").info(
+            "search timing: embed=%.3fs milvus=%.3fs hits=%d rerank=%s",
+            t_embed,
+            t_milvus,
+            hits,
+            rerank and settings.use_custom_llm,
+        )
+    except Exception:
+        pass
+
+
+def _search_event(
+    user_id: str | None,
+    query_text: str,
+    has_file: bool,
+    duration_ms: int,
+    results_count: int,
+) -> SearchEvent:
+    return SearchEvent(
+        # время поиска, а не момент фоновой записи
+        created_at=datetime.utcnow(),
+        user_id=user_id,
+        query_len=len(query_text),
+        query_preview=query_text[:200],
+        has_file=has_file,
+        duration_ms=duration_ms,
+        results_count=results_count,
+    )
+
+
+def _write_search_events(db: Session, events: list[SearchEvent]) -> None:
+    db.add_all(events)
+    db.commit()
+
+
+def _record_search_events(db: Session, events: list[SearchEvent]) -> None:
+    if not events:
+        return
+    if settings.search_events_buffered:
+        from app.services.event_sink import get_event_sink
+
+        sink = get_event_sink()
+        for event in events:
+            sink.submit(event)
+        return
+    _write_search_events(db, events)
+
+
+async def _record_search_events_async(db: Session, events: list[SearchEvent]) -> None:
+    if not events:
+        return
+    if settings.search_events_buffered:
+        _record_search_events(db, events)
+        return
+    from app.services.executors import run_io
+
+    await run_io(_write_search_events, db, events)
+
+
+def _split_query(query_text: str) -> list[str]:
+    from app.services.file_parser import chunk_text
+
+    return list(chunk_text(query_text))[: settings.document_query_max_chunks]
+
+
+def _use_document_mode(query_mode: str, query_chunks: list[str]) -> bool:
+    if query_mode == "document":
+        return bool(query_chunks)
+    if query_mode == "auto" and len(query_chunks) > 1:
+        logging.getLogger("uvicorn.error").info(
+            "search: query_mode=auto switched to document mode (%d query chunks)", len(query_chunks)
+        )
+        return True
+    return False
+
+
+def _span_excerpt(text: str, max_len: int = 200) -> str:
+    text = _normalize_ws(text)
+    if len(text) <= max_len:
+        return text
+    return text[:max_len].rsplit(" ", 1)[0] + "…"
+
+
+def _aggregate_document_hits(
+    query_chunks: list[str],
+    hits_per_chunk: list[list[dict]],
+    coverage_min_score: float,
+) -> list[dict]:
+    # лучший хит каждого чанка запроса в каждом документе-источнике
+    per_doc: dict[str, dict[int, dict]] = {}
+    for qi, hits in enumerate(hits_per_chunk):
+        for h in hits:
+            by_chunk = per_doc.setdefault(h["document_id"], {})
+            best = by_chunk.get(qi)
+            if best is None or h["score"] > best["score"]:
+                by_chunk[qi] = h
+
+    aggregates: list[dict] = []
+    for document_id, by_chunk in per_doc.items():
+        matches = sorted(by_chunk.items(), key=lambda m: m[1]["score"], reverse=True)
+        best_qi, best_hit = matches[0]
+        covered = sum(1 for _, h in matches if h["score"] >= coverage_min_score)
+        aggregates.append(
+            {
+                "document_id": document_id,
+                "score": best_hit["score"],
+                "coverage": covered / len(query_chunks),
+                "best_hit": best_hit,
+                "best_query_chunk": best_qi,
+                "matches": matches,
+            }
+        )
+    # max-sim по документу + доля покрытых чанков запроса; покрытие важнее одиночного совпадения
+    aggregates.sort(key=lambda a: (a["coverage"], a["score"]), reverse=True)
+    return aggregates[: settings.document_query_max_results]
+
+
+def _build_document_results(db: Session, query_chunks: list[str], aggregates: list[dict]) -> list[dict]:
+    try:
+        rows = _fetch_rows(db, [a["best_hit"] for a in aggregates])
+    finally:
+        _release_connection(db)
+    results: list[dict] = []
+    for a in aggregates:
+        built = _assemble_results([a["best_hit"]], rows, query_chunks[a["best_query_chunk"]])
+        if not built:
+            continue
+        item = built[0]
+        item["coverage"] = round(a["coverage"], 4)
+        item["matched_spans"] = [
+            {
+                "query_chunk_index": qi,
+                "query_excerpt": _span_excerpt(query_chunks[qi]),
+                "score": h["score"],
+                "page_number": h.get("page_number") or None,
+            }
+            for qi, h in a["matches"][: settings.document_query_max_spans]
+        ]
+        results.append(item)
+    return results
+
+
+def _merge_reranked(original: list[dict], reranked: list[dict]) -> list[dict]:
+    # реранкер возвращает только известные ему поля — возвращаем coverage/matched_spans
+    by_doc = {r["document_id"]: r for r in original}
+    return [{**by_doc.get(r.get("document_id"), {}), **r} for r in reranked]
+
+
+async def _rerank_document_results(
+    query_chunks: list[str], aggregates: list[dict], results: list[dict]
+) -> tuple[list[dict], bool]:
+    """
+    Каждый документ переранжируется против своего лучшего куска запроса: документы группируются
+    по best_query_chunk, все группы уходят одним пакетным вызовом реранкера.
+    """
+    from app.services.llm import rerank_sources_batch_async
+
+    best_chunk = {a["document_id"]: a["best_query_chunk"] for a in aggregates}
+    groups: dict[int, list[dict]] = {}
+    for r in results:
+        groups.setdefault(best_chunk[r["document_id"]], []).append(r)
+    order = list(groups)
+    reranked, fell_back = await rerank_sources_batch_async(
+        [query_chunks[qi] for qi in order], [groups[qi] for qi in order]
+    )
+    merged = [item for qi, items in zip(order, reranked) for item in _merge_reranked(groups[qi], items)]
+    # оценки реранкера из разных групп получены на разных запросах, поэтому главный ключ остаётся покрытием
+    merged.sort(
+        key=lambda r: (r.get("coverage") or 0.0, r["rerank_score"] if r.get("rerank_score") is not None else r["score"]),
+        reverse=True,
+    )
+    return merged, fell_back
+
+
+async def search_sources_async(
     db: Session,
     text: str | None,
     file: UploadFile | None,
     user_id: str | None = None,
     min_similarity_percent: float | None = None,
     rerank: bool = True,
+    query_mode: str = "single",
+    filters: SearchFilters | None = None,
 ):
-    from app.services.embeddings import embed_query
+    """
+    Поиск источников для /search и /baseline/search.
+    Парсинг файла уходит в ограниченный CPU-пул, encode — в общий EmbeddingBatcher,
+    блокирующие клиенты Postgres/Milvus — в I/O-пул, реранкер вызывается через httpx
+    без занятия потока.
+
+    query_mode: "single" — весь текст одним вектором (как раньше); "document" — текст режется
+    на чанки, все чанки ищутся одним multi-vector запросом и хиты агрегируются по документам;
+    "auto" — document, если запрос не помещается в один чанк. Document-режим меняет вид выдачи
+    (coverage, matched_spans), поэтому включается только явно.
+    filters — скалярные фильтры (дата загрузки, автор, тег), применяются внутри поиска Milvus.
+    """
+    from app.services.embeddings import embed_query_async, embed_texts_async
+    from app.services.executors import run_cpu, run_io
     from app.services.file_parser import extract_text
-    from app.services.llm import rerank_sources
-    from app.services.milvus_client import search_embeddings
+    from app.services.llm import rerank_sources_async
+    from app.services import search_cache
+    from app.services.milvus_client import search_embeddings, search_embeddings_batch
+    from app.services.uploads import spool_upload_async
 
     if not text and not file:
         return "", []
 
     started = time.perf_counter()
+    await run_io(_release_connection, db)
     has_file = bool(file)
     if file:
-        data = file.file.read()
-        text, _ = extract_text(file.filename, data)
+        spooled = await spool_upload_async(file)
+        try:
+            text, _ = await run_cpu(extract_text, file.filename, spooled.path)
+        finally:
+            spooled.remove()
 
     query_text = (text or "").strip()
     if not query_text:
         return "", []
 
-    min_score: float | None = None
-    if min_similarity_percent is not None:
-        try:
-            p = float(min_similarity_percent)
-            p = 0.0 if p < 0 else 100.0 if p > 100 else p
-            min_score = p / 100.0
-        except Exception:
-            min_score = None
+    min_score = _min_score(min_similarity_percent)
+    filters = await run_io(_check_filters, filters)
 
-    t0 = time.perf_counter()
-    vector = embed_query(query_text)
-    t_embed = time.perf_counter() - t0
+    cache_key, cached = await run_io(search_cache.lookup, query_text, min_score, rerank, query_mode, filters)
+    if cached is not None:
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        await _record_search_events_async(db, [_search_event(user_id, query_text, has_file, duration_ms, len(cached))])
+        return query_text, [SearchResultItem(**r) for r in cached]
 
-    t1 = time.perf_counter()
-    hits = search_embeddings(vector)
-    t_milvus = time.perf_counter() - t1
+    query_chunks = await run_cpu(_split_query, query_text) if query_mode != "single" else []
+    rerank_fell_back = False
 
-    if min_score is not None:
-        hits = [h for h in hits if h["score"] >= min_score]
+    if _use_document_mode(query_mode, query_chunks):
+        t0 = time.perf_counter()
+        vectors = await embed_texts_async(query_chunks)
+        t_embed = time.perf_counter() - t0
 
-    try:
-        chunk_ids = [h["chunk_id"] for h in hits]
-        doc_ids = list({h["document_id"] for h in hits})
-        idxs = set()
-        for h in hits:
-            idxs.add(h["chunk_index"])
-            idxs.add(h["chunk_index"] - 1)
-            idxs.add(h["chunk_index"] + 1)
-        idxs = {i for i in idxs if i >= 0}
-
-        chunks = (
-            db.query(Chunk)
-            .filter(Chunk.id.in_(chunk_ids))
-            .all()
-        )
-        chunks_by_id = {c.id: c for c in chunks}
-
-        neighbor_chunks_by_key: dict[tuple[str, int], Chunk] = {}
-        if doc_ids and idxs:
-            neighbor_chunks = (
-                db.query(Chunk)
-                .filter(Chunk.document_id.in_(doc_ids))
-                .filter(Chunk.chunk_index.in_(list(idxs)))
-                .all()
-            )
-            neighbor_chunks_by_key = {(c.document_id, c.chunk_index): c for c in neighbor_chunks}
+        t1 = time.perf_counter()
+        hits_per_chunk = await run_io(search_embeddings_batch, vectors, min_score=min_score, filters=filters)
+        t_milvus = time.perf_counter() - t1
 
-        docs = (
-            db.query(Document)
-            .filter(Document.id.in_([h["document_id"] for h in hits]))
-            .all()
-        )
-        docs_by_id = {d.id: d for d in docs}
+        coverage_min_score = min_score if min_score is not None else settings.document_query_coverage_min_score
+        aggregates = _aggregate_document_hits(query_chunks, hits_per_chunk, coverage_min_score)
+        hits_count = sum(len(hits) for hits in hits_per_chunk)
 
-        results: list[dict] = []
-        for h in hits:
-            chunk = chunks_by_id.get(h["chunk_id"])
-            doc = docs_by_id.get(h["document_id"])
-            if not chunk or not doc:
-                continue
-            context_parts: list[str] = []
-            prev = neighbor_chunks_by_key.get((chunk.document_id, chunk.chunk_index - 1))
-            nxt = neighbor_chunks_by_key.get((chunk.document_id, chunk.chunk_index + 1))
-            if prev:
-                context_parts.append(prev.text)
-            context_parts.append(chunk.text)
-            if nxt:
-                context_parts.append(nxt.text)
-            excerpt = _make_excerpt("\n".join(context_parts), query_text)
-            results.append(
-                {
-                    "document_id": doc.id,
-                    "title": doc.title,
-                    "score": h["score"],
-                    "excerpt": excerpt,
-                    "page_number": h.get("page_number") or None,
-                }
-            )
+        results = await run_io(_build_document_results, db, query_chunks, aggregates)
+        if rerank and results:
+            results, rerank_fell_back = await _rerank_document_results(query_chunks, aggregates, results)
+    else:
+        t0 = time.perf_counter()
+        vector = await embed_query_async(query_text)
+        t_embed = time.perf_counter() - t0
+
+        t1 = time.perf_counter()
+        hits = await run_io(search_embeddings, vector, min_score=min_score, filters=filters)
+        t_milvus = time.perf_counter() - t1
 
+        hits_count = len(hits)
+
+        results = await run_io(_build_results, db, hits, query_text)
         if rerank:
-            results = rerank_sources(query_text, results)
-        duration_ms = int((time.perf_counter() - started) * 1000)
+            results, rerank_fell_back = await rerank_sources_async(query_text, results)
+    duration_ms = int((time.perf_counter() - started) * 1000)
 
-        # лёгкая диагностика производительности (видно в docker logs backend)
-        try:
-            import logging
-
-            logging.getLogger("uvicorn.error").info(
-                "search timing: embed=%.3fs milvus=%.3fs hits=%d rerank=%s",
-                t_embed,
-                t_milvus,
-                len(hits),
-                rerank and settings.use_custom_llm,
-            )
-        except Exception:
-            pass
-
-        event = SearchEvent(
-            user_id=user_id,
-            query_len=len(query_text),
-            query_preview=query_text[:200],
-            has_file=has_file,
-            duration_ms=duration_ms,
-            results_count=len(results),
-        )
-        db.add(event)
-        db.commit()
+    items = [SearchResultItem(**r) for r in results]
 
-        return query_text, [SearchResultItem(**r) for r in results]
-    finally:
-        pass
+    _log_timing(t_embed, t_milvus, hits_count, rerank)
+    if not rerank_fell_back:
+        # выдачу без реранка (реранкер недоступен) не кешируем под ключом rerank — иначе она жила бы весь TTL
+        await run_io(search_cache.store, cache_key, [item.model_dump() for item in items])
+    await _record_search_events_async(db, [_search_event(user_id, query_text, has_file, duration_ms, len(items))])
+
+    return query_text, items
+
+
+async def search_sources_batch_async(
+    db: Session,
+    queries: list[str],
+    user_id: str | None = None,
+    min_similarity_percent: float | None = None,
+    rerank: bool = False,
+    filters: SearchFilters | None = None,
+):
+    """
+    Пакетный поиск: один encode на все запросы, один Milvus search с N векторами,
+    одна выборка строк из Postgres на все хиты и (опционально) один пакетный вызов реранкера.
+    Соединение Postgres занято только на время выборки, не на время await.
+    Возвращает [(query_text, results)] в порядке входных запросов.
+    """
+    from app.services.embeddings import embed_texts_async
+    from app.services.executors import run_io
+    from app.services.llm import rerank_sources_batch_async
+    from app.services.milvus_client import search_embeddings_batch
+
+    started = time.perf_counter()
+    query_texts = [(q or "").strip() for q in queries]
+    positions = [i for i, q in enumerate(query_texts) if q]
+    out: list[tuple[str, list[SearchResultItem]]] = [(q, []) for q in query_texts]
+    if not positions:
+        return out
+
+    await run_io(_release_connection, db)
+    min_score = _min_score(min_similarity_percent)
+    filters = await run_io(_check_filters, filters)
+    active = [query_texts[i] for i in positions]
+
+    t0 = time.perf_counter()
+    vectors = await embed_texts_async(active)
+    t_embed = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    hits_per_query = await run_io(search_embeddings_batch, vectors, min_score=min_score, filters=filters)
+    t_milvus = time.perf_counter() - t1
+
+    all_hits = [h for hits in hits_per_query for h in hits]
+    results_per_query = await run_io(_build_results_batch, db, hits_per_query, active)
+    if rerank:
+        results_per_query, _ = await rerank_sources_batch_async(active, results_per_query)
+    duration_ms = int((time.perf_counter() - started) * 1000)
+
+    _log_timing(t_embed, t_milvus, len(all_hits), rerank)
+    events = [
+        _search_event(user_id, query_text, False, duration_ms, len(results))
+        for query_text, results in zip(active, results_per_query)
+    ]
+    await _record_search_events_async(db, events)
+
+    for i, query_text, results in zip(positions, active, results_per_query):
+        out[i] = (query_text, [SearchResultItem(**r) for r in results])
+    return out
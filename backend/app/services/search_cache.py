@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+from functools import lru_cache
+
+from app.core.config import settings
+from app.schemas.search import SearchFilters
+from app.services.cache import TwoTierCache
+from app.services.redis_client import get_redis, mark_redis_failed
+
+INDEX_VERSION_KEY = "index_version"
+
+# без Redis версия живёт только в процессе: инвалидация из другого процесса (reindex) не дойдёт,
+# устаревание тогда ограничено TTL кеша
+_local_version = 0
+_local_lock = threading.Lock()
+
+
+def get_index_version() -> int:
+    r = get_redis()
+    if r is not None:
+        try:
+            return int(r.get(INDEX_VERSION_KEY) or 0)
+        except Exception as e:
+            mark_redis_failed(e)
+    return _local_version
+
+
+def bump_index_version() -> int:
+    """Вызывается при любом изменении корпуса: ingest, удаление документа, reindex."""
+    global _local_version
+    with _local_lock:
+        _local_version += 1
+        version = _local_version
+    if get_search_cache.cache_info().currsize:
+        get_search_cache().memory.clear()
+
+    r = get_redis()
+    if r is not None:
+        try:
+            return int(r.incr(INDEX_VERSION_KEY))
+        except Exception as e:
+            mark_redis_failed(e)
+    return version
+
+
+def _dumps(results: list[dict]) -> bytes:
+    return json.dumps(results, ensure_ascii=False).encode("utf-8")
+
+
+def _loads(raw: bytes) -> list[dict]:
+    return json.loads(raw)
+
+
+@lru_cache(maxsize=1)
+def get_search_cache() -> TwoTierCache:
+    return TwoTierCache(
+        name="search",
+        maxsize=settings.search_cache_size,
+        ttl_seconds=settings.search_cache_ttl_seconds,
+        redis_ttl_seconds=settings.search_cache_redis_ttl_seconds,
+        dumps=_dumps,
+        loads=_loads,
+    )
+
+
+def search_cache_key(
+    query_text: str,
+    min_score: float | None,
+    rerank: bool,
+    query_mode: str,
+    index_version: int,
+    filters: SearchFilters | None = None,
+) -> str:
+    normalized = re.sub(r"\s+", " ", query_text or "").strip()
+    query_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return ":".join(
+        [
+            f"v{index_version}",
+            settings.embedding_model_name,
+            query_hash,
+            "none" if min_score is None else f"{min_score:.4f}",
+            "rerank" if rerank else "plain",
+            query_mode,
+            "all" if filters is None else hashlib.sha256(filters.model_dump_json().encode("utf-8")).hexdigest()[:16],
+        ]
+    )
+
+
+def lookup(
+    query_text: str,
+    min_score: float | None,
+    rerank: bool,
+    query_mode: str,
+    filters: SearchFilters | None = None,
+) -> tuple[str, list[dict] | None]:
+    key = search_cache_key(query_text, min_score, rerank, query_mode, get_index_version(), filters)
+    if not settings.search_cache_enabled:
+        return key, None
+    return key, get_search_cache().get(key)
+
+
+def store(key: str, results: list[dict]) -> None:
+    if settings.search_cache_enabled:
+        get_search_cache().set(key, results)
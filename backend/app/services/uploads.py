@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class SpooledUpload:
+    path: Path
+    sha256: str
+    size: int
+
+    def remove(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _check_declared_size(file: UploadFile, max_bytes: int) -> None:
+    # Starlette знает размер заранее — отказываем до копирования
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge(f"File is too large (max {max_bytes // (1024 * 1024)} MB)")
+
+
+def _spool_path(dest: Path | None) -> Path:
+    if dest is not None:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        return dest
+    tmp_dir = settings.storage_dir / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    return tmp_dir / f"{uuid.uuid4()}.part"
+
+
+def spool_upload(file: UploadFile, dest: Path | None = None, max_bytes: int | None = None) -> SpooledUpload:
+    """
+    Копирует загрузку на диск блоками upload_block_size, попутно считая sha256.
+    В памяти одновременно держится не больше одного блока, независимо от размера файла.
+    dest=None — временный файл в storage_dir/tmp (вызывающий удаляет его через remove()).
+    """
+    max_bytes = max_bytes or settings.max_upload_bytes
+    _check_declared_size(file, max_bytes)
+    path = _spool_path(dest)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                block = file.file.read(settings.upload_block_size)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File is too large (max {max_bytes // (1024 * 1024)} MB)")
+                digest.update(block)
+                out.write(block)
+    except BaseException:
+        if path.exists():
+            os.unlink(path)
+        raise
+    return SpooledUpload(path=path, sha256=digest.hexdigest(), size=size)
+
+
+async def spool_upload_async(file: UploadFile, dest: Path | None = None, max_bytes: int | None = None) -> SpooledUpload:
+    """То же, что spool_upload, но чтение блоков идёт через await UploadFile.read."""
+    from app.services.executors import run_io
+
+    max_bytes = max_bytes or settings.max_upload_bytes
+    _check_declared_size(file, max_bytes)
+    path = _spool_path(dest)
+    digest = hashlib.sha256()
+    size = 0
+    out = await run_io(open, path, "wb")
+    try:
+        while True:
+            block = await file.read(settings.upload_block_size)
+            if not block:
+                break
+            size += len(block)
+            if size > max_bytes:
+                raise UploadTooLarge(f"File is too large (max {max_bytes // (1024 * 1024)} MB)")
+            digest.update(block)
+            await run_io(out.write, block)
+    except BaseException:
+        out.close()
+        if path.exists():
+            os.unlink(path)
+        raise
+    out.close()
+    return SpooledUpload(path=path, sha256=digest.hexdigest(), size=size)
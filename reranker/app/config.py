@@ -16,6 +16,8 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("RERANKER_BASE_MODEL", "BASE_MODEL"),
     )
     max_length: int = Field(default=256, validation_alias=AliasChoices("RERANKER_MAX_LENGTH", "MAX_LENGTH"))
+    # сколько пар (query, excerpt) прогонять через модель за один forward pass
+    max_batch_pairs: int = Field(default=64, validation_alias=AliasChoices("RERANKER_MAX_BATCH_PAIRS", "MAX_BATCH_PAIRS"))
 
 
 settings = Settings()
@@ -5,7 +5,7 @@ from app.model import score_pairs
 from app.model import get_model as _get_model
 from app.model import get_tokenizer as _get_tokenizer
 from app.observability import get_langfuse
-from app.schemas import RerankRequest, RerankResponseItem
+from app.schemas import BatchRerankRequest, RerankRequest, RerankResponseItem
 
 app = FastAPI(title="Reranker")
 
@@ -21,6 +21,15 @@ def health():
     return {"ok": True}
 
 
+def _ranked(req: RerankRequest, scores: list[float]) -> list[RerankResponseItem]:
+    items = []
+    for c, s in zip(req.candidates, scores):
+        items.append(RerankResponseItem(**c.model_dump(), rerank_score=float(s)))
+
+    items.sort(key=lambda x: (x.rerank_score, x.score), reverse=True)
+    return items
+
+
 @app.post("/rerank", response_model=list[RerankResponseItem])
 def rerank(req: RerankRequest):
     query = (req.query or "").strip()
@@ -39,9 +48,37 @@ def rerank(req: RerankRequest):
             span.update(output={"duration_ms": int((time.perf_counter() - started) * 1000)})
     else:
         scores = score_pairs(pairs)
-    items = []
-    for c, s in zip(req.candidates, scores):
-        items.append(RerankResponseItem(**c.model_dump(), rerank_score=float(s)))
+    return _ranked(req, scores)
 
-    items.sort(key=lambda x: (x.rerank_score, x.score), reverse=True)
-    return items
+
+@app.post("/rerank/batch", response_model=list[list[RerankResponseItem]])
+def rerank_batch(req: BatchRerankRequest):
+    # все пары всех запросов считаются вместе, ответ — по списку на каждый item в исходном порядке
+    pairs: list[tuple[str, str]] = []
+    for item in req.items:
+        query = (item.query or "").strip()
+        if query:
+            pairs.extend((query, c.excerpt or "") for c in item.candidates)
+
+    lf = get_langfuse()
+    started = time.perf_counter()
+    if lf and pairs:
+        with lf.start_as_current_span(
+            name="reranker_infer_batch",
+            input={"items": len(req.items), "candidates": len(pairs)},
+        ) as span:
+            scores = score_pairs(pairs)
+            span.update(output={"duration_ms": int((time.perf_counter() - started) * 1000)})
+    else:
+        scores = score_pairs(pairs) if pairs else []
+
+    out: list[list[RerankResponseItem]] = []
+    offset = 0
+    for item in req.items:
+        if not (item.query or "").strip():
+            out.append([])
+            continue
+        n = len(item.candidates)
+        out.append(_ranked(item, scores[offset : offset + n]))
+        offset += n
+    return out
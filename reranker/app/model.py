@@ -23,6 +23,16 @@ def get_model():
 
 
 def score_pairs(pairs: list[tuple[str, str]]) -> list[float]:
+    step = max(1, settings.max_batch_pairs)
+    if len(pairs) > step:
+        scores: list[float] = []
+        for i in range(0, len(pairs), step):
+            scores.extend(_score_batch(pairs[i : i + step]))
+        return scores
+    return _score_batch(pairs)
+
+
+def _score_batch(pairs: list[tuple[str, str]]) -> list[float]:
     tok = get_tokenizer()
     model = get_model()
 
@@ -17,3 +17,6 @@ class RerankRequest(BaseModel):
 class RerankResponseItem(Candidate):
     rerank_score: float
 
+
+class BatchRerankRequest(BaseModel):
+    items: list[RerankRequest]
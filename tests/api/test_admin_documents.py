@@ -1,19 +1,34 @@
 from __future__ import annotations
 
+import sys
+import types
+
 from fastapi.testclient import TestClient
 
 
+def _fake_milvus(monkeypatch) -> list[str]:
+    # настоящий milvus_client тянет модель эмбеддингов; удаление векторов только записываем
+    deleted: list[str] = []
+    fake = types.ModuleType("app.services.milvus_client")
+    fake.delete_document_embeddings = lambda ids: deleted.extend(ids)
+    fake.delete_from_retained_versions = lambda chunk_ids: deleted.extend(chunk_ids)
+    monkeypatch.setitem(sys.modules, "app.services.milvus_client", fake)
+    return deleted
+
+
 def test_admin_documents_crud(client: TestClient, admin_token: str, monkeypatch):
     import app.services.ingest as ingest_service
 
     from app.models.document import Document
 
-    def fake_ingest_document(db, title, file, uploaded_by):
+    def fake_ingest_document(db, title, file, uploaded_by, tag=None, corpus=None):
         doc = Document(
             title=title,
             filename=(file.filename or "file.pdf"),
             content_type=(file.content_type or "application/octet-stream"),
             uploaded_by=uploaded_by,
+            tag=tag,
+            corpus=corpus or "default",
             status="processed",
             num_pages=0,
         )
@@ -23,6 +38,7 @@ def test_admin_documents_crud(client: TestClient, admin_token: str, monkeypatch)
         return doc
 
     monkeypatch.setattr(ingest_service, "ingest_document", fake_ingest_document)
+    _fake_milvus(monkeypatch)
 
     headers = {"Authorization": f"Bearer {admin_token}"}
 
@@ -33,12 +49,14 @@ def test_admin_documents_crud(client: TestClient, admin_token: str, monkeypatch)
     upload = client.post(
         "/api/admin/documents",
         headers=headers,
-        data={"title": "Док 1"},
+        data={"title": "Док 1", "tag": "finance", "corpus": "legal"},
         files={"file": ("doc.pdf", b"fake", "application/pdf")},
     )
     assert upload.status_code == 200, upload.text
     doc = upload.json()
     assert doc["title"] == "Док 1"
+    assert doc["tag"] == "finance"
+    assert doc["corpus"] == "legal"
 
     listed = client.get("/api/admin/documents", headers=headers)
     assert listed.status_code == 200
@@ -51,3 +69,139 @@ def test_admin_documents_crud(client: TestClient, admin_token: str, monkeypatch)
     listed2 = client.get("/api/admin/documents", headers=headers)
     assert listed2.status_code == 200
     assert listed2.json() == []
+
+
+def test_upload_queues_document_and_exposes_status(client: TestClient, admin_token: str, monkeypatch, tmp_path):
+    import app.services.ingest_queue as ingest_queue
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "storage_dir", tmp_path)
+    monkeypatch.setattr(ingest_queue, "notify_ingest_workers", lambda: None)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    upload = client.post(
+        "/api/admin/documents",
+        headers=headers,
+        data={"title": "Док 2"},
+        files={"file": ("doc.pdf", b"%PDF-fake", "application/pdf")},
+    )
+    assert upload.status_code == 200, upload.text
+    doc = upload.json()
+    assert doc["status"] == "queued"
+    assert (tmp_path / doc["filename"]).read_bytes() == b"%PDF-fake"
+
+    status = client.get(f"/api/admin/documents/{doc['id']}/status", headers=headers)
+    assert status.status_code == 200, status.text
+    assert status.json()["status"] == "queued"
+    assert status.json()["attempts"] == 0
+
+    missing = client.get("/api/admin/documents/nope/status", headers=headers)
+    assert missing.status_code == 404
+
+    bad = client.post(
+        "/api/admin/documents",
+        headers=headers,
+        data={"title": "Док 3"},
+        files={"file": ("doc.txt", b"text", "text/plain")},
+    )
+    assert bad.status_code == 400
+
+
+def test_upload_over_size_limit_is_rejected(client: TestClient, admin_token: str, monkeypatch, tmp_path):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "storage_dir", tmp_path)
+    monkeypatch.setattr(settings, "max_upload_bytes", 1024)
+    monkeypatch.setattr(settings, "upload_block_size", 256)
+
+    res = client.post(
+        "/api/admin/documents",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        data={"title": "Большой"},
+        files={"file": ("big.pdf", b"x" * 4096, "application/pdf")},
+    )
+    assert res.status_code == 413, res.text
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+def test_upload_of_same_file_is_rejected_as_duplicate(client: TestClient, admin_token: str, monkeypatch, tmp_path):
+    import app.services.ingest_queue as ingest_queue
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "storage_dir", tmp_path)
+    monkeypatch.setattr(ingest_queue, "notify_ingest_workers", lambda: None)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    first = client.post(
+        "/api/admin/documents",
+        headers=headers,
+        data={"title": "Оригинал"},
+        files={"file": ("doc.pdf", b"%PDF-same", "application/pdf")},
+    )
+    assert first.status_code == 200, first.text
+
+    second = client.post(
+        "/api/admin/documents",
+        headers=headers,
+        data={"title": "Копия"},
+        files={"file": ("copy.pdf", b"%PDF-same", "application/pdf")},
+    )
+    assert second.status_code == 409, second.text
+    assert first.json()["id"] in second.json()["detail"]
+    assert [p.name for p in tmp_path.iterdir() if p.is_file()] == [first.json()["filename"]]
+
+
+def test_delete_purges_chunks_vectors_and_files(client: TestClient, db, admin_token: str, monkeypatch, tmp_path):
+    from app.core.config import settings
+    from app.models.chunk import Chunk
+    from app.models.document import Document
+
+    monkeypatch.setattr(settings, "storage_dir", tmp_path)
+    deleted_vectors = _fake_milvus(monkeypatch)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    ids = []
+    for i in range(3):
+        doc = Document(title=f"Док {i}", filename=f"doc{i}.pdf", content_type="application/pdf", status="processed")
+        db.add(doc)
+        db.flush()
+        db.add(Chunk(document_id=doc.id, chunk_index=0, text=f"текст {i}"))
+        (tmp_path / doc.filename).write_bytes(b"%PDF")
+        ids.append(doc.id)
+    db.commit()
+
+    one = client.delete(f"/api/admin/documents/{ids[0]}", headers=headers)
+    assert one.status_code == 200, one.text
+
+    bulk = client.post("/api/admin/documents/bulk-delete", headers=headers, json={"ids": ids[1:] + ["missing"]})
+    assert bulk.status_code == 200, bulk.text
+    assert bulk.json() == {"ok": True, "deleted": 2}
+
+    db.expire_all()
+    assert db.query(Document).count() == 0
+    assert db.query(Chunk).count() == 0
+    chunk_ids = [c for c in deleted_vectors if c not in ids]
+    assert sorted(set(deleted_vectors) - set(chunk_ids)) == sorted(ids)
+    # векторы старых версий коллекции удаляются по chunk_id — по одному чанку на документ
+    assert len(chunk_ids) == 3
+    assert not list(tmp_path.iterdir())
+
+
+def test_delete_rejects_documents_being_indexed(client: TestClient, db, admin_token: str, monkeypatch):
+    from app.models.document import Document
+
+    deleted_vectors = _fake_milvus(monkeypatch)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    busy = Document(title="Док", filename="busy.pdf", content_type="application/pdf", status="embedding")
+    done = Document(title="Док", filename="done.pdf", content_type="application/pdf", status="processed")
+    db.add_all([busy, done])
+    db.commit()
+
+    res = client.post("/api/admin/documents/bulk-delete", headers=headers, json={"ids": [busy.id, done.id]})
+    assert res.status_code == 409
+    assert busy.id in res.json()["detail"]
+
+    db.expire_all()
+    assert db.query(Document).count() == 2
+    assert deleted_vectors == []
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import pytest
+
+
+def _fake_encode(calls: list[list[str]]):
+    def encode(texts: list[str]) -> list[list[float]]:
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    return encode
+
+
+def test_concurrent_requests_are_coalesced_into_one_encode():
+    from app.services.embedding_batcher import EmbeddingBatcher
+
+    calls: list[list[str]] = []
+    batcher = EmbeddingBatcher(_fake_encode(calls), max_batch_size=32, max_wait_ms=200)
+    try:
+        futures = [batcher.submit(["a"]), batcher.submit(["bb", "ccc"]), batcher.submit(["dddd"])]
+        results = [f.result(timeout=5) for f in futures]
+    finally:
+        batcher.stop()
+
+    assert calls == [["a", "bb", "ccc", "dddd"]]
+    # каждый вызывающий получает свой срез, в своём порядке
+    assert results == [[[1.0]], [[2.0], [3.0]], [[4.0]]]
+
+
+def test_batch_is_cut_at_max_batch_size():
+    from app.services.embedding_batcher import EmbeddingBatcher
+
+    calls: list[list[str]] = []
+    batcher = EmbeddingBatcher(_fake_encode(calls), max_batch_size=2, max_wait_ms=200)
+    try:
+        futures = [batcher.submit([t]) for t in ("a", "bb", "ccc")]
+        results = [f.result(timeout=5) for f in futures]
+    finally:
+        batcher.stop()
+
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert results == [[[1.0]], [[2.0]], [[3.0]]]
+
+
+def test_encode_error_is_raised_to_every_caller_in_the_batch():
+    from app.services.embedding_batcher import EmbeddingBatcher
+
+    def encode(texts: list[str]) -> list[list[float]]:
+        raise RuntimeError("cuda oom")
+
+    batcher = EmbeddingBatcher(encode, max_batch_size=32, max_wait_ms=200)
+    try:
+        futures = [batcher.submit(["a"]), batcher.submit(["b"])]
+        for f in futures:
+            with pytest.raises(RuntimeError, match="cuda oom"):
+                f.result(timeout=5)
+    finally:
+        batcher.stop()
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import sys
+import types
+
+import pytest
+
+
+class _FakeRedis:
+    def __init__(self, fail: bool = False):
+        self.data: dict[str, bytes] = {}
+        self.fail = fail
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    def get(self, key):
+        self._call()
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self._call()
+        self.data[key] = value
+
+    def incr(self, key):
+        self._call()
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    from app.services import redis_client
+
+    fake = _FakeRedis()
+    monkeypatch.setattr(redis_client, "_client", lambda: fake)
+    monkeypatch.setattr(redis_client, "_down_until", 0.0)
+    return fake
+
+
+@pytest.fixture
+def encoded() -> list[str]:
+    return []
+
+
+@pytest.fixture
+def embeddings(monkeypatch, encoded):
+    # sentence_transformers в тестах нет: модель заменяется заглушкой, кодирование — счётчиком
+    fake = types.ModuleType("sentence_transformers")
+    fake.SentenceTransformer = object
+    monkeypatch.setitem(sys.modules, "sentence_transformers", fake)
+    monkeypatch.delitem(sys.modules, "app.services.embeddings", raising=False)
+    module = importlib.import_module("app.services.embeddings")
+
+    async def embed_texts_async(texts: list[str]) -> list[list[float]]:
+        encoded.extend(texts)
+        return [[float(len(t)), 0.5] for t in texts]
+
+    monkeypatch.setattr(module, "embed_texts_async", embed_texts_async)
+    module.get_query_cache.cache_clear()
+    yield module
+    module.get_query_cache.cache_clear()
+
+
+def test_query_embedding_is_served_from_memory_tier(embeddings, encoded, redis):
+    first = asyncio.run(embeddings.embed_query_async("договор  поставки"))
+    second = asyncio.run(embeddings.embed_query_async("договор поставки"))
+
+    assert first == second == [17.0, 0.5]
+    assert encoded == ["договор  поставки"]
+    # первый запрос — промах get и set в Redis; второй до Redis не дошёл
+    assert redis.calls == 2
+
+
+def test_query_embedding_is_served_from_redis_tier(embeddings, encoded, redis):
+    key = embeddings.query_cache_key("договор")
+    redis.data[f"embedding:{key}"] = embeddings._dump_vector((1.0, 2.0))
+
+    assert asyncio.run(embeddings.embed_query_async("договор")) == [1.0, 2.0]
+    assert encoded == []
+    # попадание из Redis прогревает in-process уровень
+    assert embeddings.get_query_cache().memory.get(key) == (1.0, 2.0)
+
+
+def test_query_embedding_miss_in_both_tiers_is_encoded_and_stored(embeddings, encoded, redis):
+    assert asyncio.run(embeddings.embed_query_async("договор")) == [7.0, 0.5]
+
+    key = embeddings.query_cache_key("договор")
+    assert encoded == ["договор"]
+    assert embeddings._load_vector(redis.data[f"embedding:{key}"]) == (7.0, 0.5)
+
+
+def test_undecodable_redis_value_is_a_miss(embeddings, encoded, redis):
+    key = embeddings.query_cache_key("договор")
+    redis.data[f"embedding:{key}"] = b"\x00\x01\x02"
+
+    assert asyncio.run(embeddings.embed_query_async("договор")) == [7.0, 0.5]
+    assert encoded == ["договор"]
+
+
+def test_redis_is_skipped_for_cooldown_after_failure(embeddings, encoded, redis, monkeypatch):
+    from app.core.config import settings
+    from app.services import redis_client, search_cache
+
+    monkeypatch.setattr(settings, "redis_retry_cooldown_seconds", 60)
+    redis.fail = True
+
+    assert asyncio.run(embeddings.embed_query_async("договор")) == [7.0, 0.5]
+    assert asyncio.run(embeddings.embed_query_async("поставка")) == [8.0, 0.5]
+    search_cache.get_index_version()
+    search_cache.bump_index_version()
+    # после первой ошибки ни кеши, ни версия индекса Redis не трогают
+    assert redis.calls == 1
+
+    # по истечении cooldown Redis снова используется
+    monkeypatch.setattr(redis_client, "_down_until", 1.0)
+    redis.fail = False
+    assert search_cache.bump_index_version() == 1
+    assert redis.calls == 2
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import pytest
+
+
+def test_vectors_written_by_one_instance_are_read_by_another(tmp_path):
+    from app.services.embedding_store import EmbeddingStore
+
+    writer = EmbeddingStore(tmp_path, "sentence-transformers/all-MiniLM-L6-v2")
+    assert writer.put_many({"h1": [0.1, 0.2], "h2": [0.3, 0.4]}) == 2
+    # уже известные хеши не дописываются повторно
+    assert writer.put_many({"h2": [9.0, 9.0], "h3": [0.5, 0.6]}) == 1
+
+    # как второй процесс (reindex), открывший тот же каталог
+    reader = EmbeddingStore(tmp_path, "sentence-transformers/all-MiniLM-L6-v2")
+    try:
+        assert reader.dim == 2
+        assert len(reader) == 3
+        got = reader.get_many(["h1", "h2", "h3", "missing"])
+        assert set(got) == {"h1", "h2", "h3"}
+        assert got["h1"] == pytest.approx([0.1, 0.2])
+        assert got["h2"] == pytest.approx([0.3, 0.4])
+        assert got["h3"] == pytest.approx([0.5, 0.6])
+
+        # дозапись после того, как reader уже отобразил файл в память
+        writer.put_many({"h4": [0.7, 0.8]})
+        assert reader.get_many(["h4"])["h4"] == pytest.approx([0.7, 0.8])
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_store_is_per_model_and_rejects_other_dims(tmp_path):
+    from app.services.embedding_store import EmbeddingStore
+
+    a = EmbeddingStore(tmp_path, "model/a")
+    b = EmbeddingStore(tmp_path, "model/b")
+    try:
+        a.put_many({"h1": [1.0, 0.0]})
+        assert b.get_many(["h1"]) == {}
+        assert a.path != b.path and a.path.parent == b.path.parent == tmp_path
+        with pytest.raises(ValueError, match="dim"):
+            a.put_many({"h2": [1.0, 0.0, 0.0]})
+    finally:
+        a.close()
+        b.close()
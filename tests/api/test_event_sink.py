@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import threading
+
+
+class _FakeSession:
+    def __init__(self, batches: list[list], gate: threading.Event | None = None):
+        self._batches = batches
+        self._gate = gate
+
+    def add_all(self, batch):
+        if self._gate is not None:
+            self._gate.wait(timeout=5)
+        self._batches.append(list(batch))
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_events_are_written_in_batches():
+    from app.services.event_sink import SearchEventSink
+
+    batches: list[list] = []
+    flushed = threading.Event()
+
+    class Session(_FakeSession):
+        def commit(self):
+            flushed.set()
+
+    sink = SearchEventSink(lambda: Session(batches), max_queue_size=100, batch_size=3, flush_interval_seconds=30)
+    for i in range(3):
+        assert sink.submit(f"e{i}")
+    # полная пачка пишется сразу, не дожидаясь flush_interval
+    assert flushed.wait(timeout=5)
+    assert batches == [["e0", "e1", "e2"]]
+
+    for i in range(3, 8):
+        sink.submit(f"e{i}")
+    sink.stop()
+    # при остановке остаток дописывается пачками не больше batch_size
+    assert [e for b in batches for e in b] == [f"e{i}" for i in range(8)]
+    assert all(len(b) <= 3 for b in batches)
+
+
+def test_events_are_dropped_when_queue_is_full():
+    from app.services.event_sink import SearchEventSink
+
+    batches: list[list] = []
+    gate = threading.Event()
+    # запись «висит», пока не откроем gate: очередь переполняется
+    sink = SearchEventSink(
+        lambda: _FakeSession(batches, gate), max_queue_size=2, batch_size=1, flush_interval_seconds=0.01
+    )
+    accepted = [sink.submit(f"e{i}") for i in range(10)]
+    assert not all(accepted)
+
+    gate.set()
+    sink.stop()
+    # отброшенные события не пишутся, принятые — все
+    written = [e for b in batches for e in b]
+    assert written == [f"e{i}" for i, ok in enumerate(accepted) if ok]
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import pytest
+
+
+def _pages() -> list[tuple[int, str]]:
+    # абзацы разной длины, в т.ч. длиннее max_chars — чтобы сработали все ветки чанкера
+    pages = []
+    for page in range(1, 4):
+        paragraphs = [f"Страница {page}, абзац {i}. " + "слово " * (15 * i) for i in range(1, 7)]
+        paragraphs.append("очень длинный абзац " * (80 + page))
+        pages.append((page, "\n\n".join(paragraphs)))
+    return pages
+
+
+def test_chunk_pages_matches_chunk_text_on_joined_pages():
+    from app.services.file_parser import chunk_pages, chunk_text
+
+    pages = _pages()
+    streamed = list(chunk_pages(pages, max_chars=400, overlap=50))
+    whole = list(chunk_text("\n".join(text for _, text in pages), max_chars=400, overlap=50))
+
+    assert len(whole) > len(pages)
+    assert [chunk for _, chunk in streamed] == whole
+
+
+def test_chunk_pages_marks_page_where_chunk_starts():
+    from app.services.file_parser import chunk_pages
+
+    pages = [(1, "первый абзац\nвторой абзац"), (2, "третий абзац"), (3, "x" * 30)]
+    chunks = list(chunk_pages(pages, max_chars=30, overlap=5))
+
+    assert chunks[0] == (1, "первый абзац\nвторой абзац")
+    assert [page for page, _ in chunks] == [1, 2, 3]
+    assert list(chunk_pages([(None, "")])) == []
+
+
+def test_page_ranges_cover_every_page_once_in_order():
+    from app.services.file_parser import _page_ranges
+
+    for num_pages, parts in ((1, 8), (7, 3), (100, 8), (16, 16), (5, 1)):
+        ranges = _page_ranges(num_pages, parts)
+        assert len(ranges) <= parts
+        assert [p for start, end in ranges for p in range(start, end)] == list(range(num_pages))
+    assert _page_ranges(0, 4) == []
+
+
+class _FakePlumberPage:
+    def __init__(self, text: str, closed: list[int], number: int):
+        self._text = text
+        self._closed = closed
+        self._number = number
+
+    def extract_text(self):
+        return self._text
+
+    def close(self):
+        self._closed.append(self._number)
+
+
+class _FakePlumber:
+    """pdfplumber.open, отдающий заданные тексты страниц и считающий открытия."""
+
+    def __init__(self, texts: list[str]):
+        self.texts = texts
+        self.opened = 0
+        self.closed: list[int] = []
+
+    def open(self, source):
+        self.opened += 1
+        return self
+
+    def __enter__(self):
+        self.pages = [_FakePlumberPage(t, self.closed, i) for i, t in enumerate(self.texts)]
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _EmptyTextBackend:
+    # быстрый движок, не нашедший текста на части страниц (скан, нестандартные шрифты)
+    name = "stub"
+    texts: list[str] = []
+
+    def extract_range(self, source, start, end):
+        return list(self.texts[start:end])
+
+
+def test_extract_page_range_falls_back_to_pdfplumber_for_empty_pages(monkeypatch):
+    from app.core.config import settings
+    from app.services import file_parser
+
+    plumber = _FakePlumber(["p0", "p1", "текст со скана", "p3", ""])
+    monkeypatch.setattr(file_parser.pdfplumber, "open", plumber.open)
+    monkeypatch.setitem(file_parser.PDF_BACKENDS, "stub", _EmptyTextBackend)
+    monkeypatch.setattr(_EmptyTextBackend, "texts", ["p0", "p1", "", "нормальный текст", "ab"])
+    monkeypatch.setattr(settings, "pdf_fallback_min_chars", 5)
+
+    texts = file_parser._extract_page_range("stub", b"%PDF", 2, 5)
+
+    # страница 2 — текст pdfplumber; у страницы 4 pdfplumber нашёл меньше — остаётся своё
+    assert texts == ["текст со скана", "нормальный текст", "ab"]
+    assert plumber.opened == 1
+    assert plumber.closed == [2, 4]
+
+
+def test_extract_page_range_skips_fallback_when_text_found(monkeypatch):
+    from app.core.config import settings
+    from app.services import file_parser
+
+    plumber = _FakePlumber(["fallback"] * 2)
+    monkeypatch.setattr(file_parser.pdfplumber, "open", plumber.open)
+    monkeypatch.setitem(file_parser.PDF_BACKENDS, "stub", _EmptyTextBackend)
+    monkeypatch.setattr(_EmptyTextBackend, "texts", ["первая страница", "вторая страница"])
+    monkeypatch.setattr(settings, "pdf_fallback_min_chars", 5)
+
+    assert file_parser._extract_page_range("stub", b"%PDF", 0, 2) == ["первая страница", "вторая страница"]
+    assert plumber.opened == 0
+
+    # сам pdfplumber повторно не переизвлекает: пустые страницы у него — честно пустые
+    monkeypatch.setattr(file_parser.PdfPlumberBackend, "extract_range", lambda self, source, start, end: ["", ""])
+    assert file_parser._extract_page_range("pdfplumber", b"%PDF", 0, 2) == ["", ""]
+    assert plumber.opened == 0
+
+
+def test_pdf_backend_is_selected_by_name_or_settings(monkeypatch):
+    from app.core.config import settings
+    from app.services.file_parser import PdfiumBackend, PdfPlumberBackend, get_pdf_backend
+
+    monkeypatch.setattr(settings, "pdf_backend", "pdfplumber")
+    assert isinstance(get_pdf_backend(), PdfPlumberBackend)
+    assert isinstance(get_pdf_backend("pdfium"), PdfiumBackend)
+    with pytest.raises(ValueError, match="Unknown PDF backend 'ocr'"):
+        get_pdf_backend("ocr")
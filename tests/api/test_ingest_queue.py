@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy.orm import Session
+
+
+def _queued_document(db: Session, **kwargs):
+    from app.models.document import Document
+
+    doc = Document(title="Док", filename="doc.pdf", content_type="application/pdf", status="queued", **kwargs)
+    db.add(doc)
+    db.commit()
+    return doc
+
+
+def test_failed_job_is_retried_with_backoff_then_marked_failed(db: Session, monkeypatch):
+    from app.core.config import settings
+    from app.services import ingest_queue
+
+    monkeypatch.setattr(settings, "ingest_max_attempts", 2)
+    monkeypatch.setattr(settings, "ingest_retry_backoff_seconds", 60)
+    doc = _queued_document(db)
+
+    claimed = ingest_queue.claim_next_job(db)
+    assert claimed is not None and claimed.id == doc.id
+    assert claimed.status == "parsing"
+    assert claimed.attempts == 1
+
+    ingest_queue.record_failure(db, claimed, RuntimeError("milvus down"))
+    assert claimed.status == "queued"
+    assert claimed.next_attempt_at is not None
+    assert "milvus down" in claimed.error
+    # следующая попытка ещё не наступила
+    assert ingest_queue.claim_next_job(db) is None
+
+    claimed.next_attempt_at = None
+    db.commit()
+    again = ingest_queue.claim_next_job(db)
+    assert again is not None and again.attempts == 2
+    ingest_queue.record_failure(db, again, RuntimeError("still down"))
+    assert again.status == "failed"
+    assert ingest_queue.claim_next_job(db) is None
+
+
+def test_workers_do_not_claim_jobs_while_not_ready(db: Session):
+    from app.services.ingest_queue import IngestWorkerPool
+
+    state = {"ready": False}
+
+    def ready() -> bool:
+        if state["ready"] is None:
+            raise RuntimeError("milvus down")
+        return state["ready"]
+
+    pool = IngestWorkerPool(lambda: db, workers=1, poll_interval_seconds=0.1, ready=ready)
+    # живая версия другой модели: задачи не берутся, попытки не тратятся
+    assert not pool._can_claim()
+    state["ready"] = None
+    assert not pool._can_claim()
+    state["ready"] = True
+    assert pool._can_claim()
+    assert IngestWorkerPool(lambda: db, workers=1, poll_interval_seconds=0.1)._can_claim()
+
+
+def test_job_lease_is_renewed_and_lost_after_takeover(db: Session, monkeypatch):
+    from datetime import datetime, timedelta
+
+    from app.core.config import settings
+    from app.services import ingest, ingest_queue
+
+    monkeypatch.setattr(settings, "ingest_job_stale_seconds", 60)
+    doc = _queued_document(db)
+    first = ingest_queue.claim_next_job(db)
+    attempt = first.attempts
+
+    # обработка идёт дольше stale-порога, но каждая пачка продлевает задачу
+    first.updated_at = datetime.utcnow() - timedelta(seconds=120)
+    db.commit()
+    ingest._renew_job(db.get_bind(), doc.id, attempt)
+    db.expire_all()
+    assert ingest_queue.claim_next_job(db) is None
+
+    # без продления задачу перехватывает другой воркер — первый больше не пишет
+    first.updated_at = datetime.utcnow() - timedelta(seconds=120)
+    db.commit()
+    assert ingest_queue.claim_next_job(db).attempts == attempt + 1
+    with pytest.raises(ingest.IngestJobLost):
+        ingest._renew_job(db.get_bind(), doc.id, attempt)
+
+
+def test_lost_job_does_not_touch_document_status(db: Session, monkeypatch):
+    from app.services import ingest, ingest_queue
+
+    doc = _queued_document(db)
+    claimed = ingest_queue.claim_next_job(db)
+
+    def process_document(db, doc):
+        raise ingest.IngestJobLost(doc.id)
+
+    monkeypatch.setattr(ingest, "process_document", process_document)
+    ingest_queue.run_job(db, claimed)
+    db.refresh(doc)
+    assert (doc.status, doc.error, doc.next_attempt_at) == ("parsing", None, None)
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import importlib
+import sys
+import types
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture
+def milvus_client(monkeypatch):
+    # модуль импортирует модель эмбеддингов; sentence_transformers в тестах нет
+    fake = types.ModuleType("app.services.embeddings")
+    fake.get_model = None
+    fake.embed_texts = None
+    monkeypatch.setitem(sys.modules, "app.services.embeddings", fake)
+    monkeypatch.delitem(sys.modules, "app.services.milvus_client", raising=False)
+    return importlib.import_module("app.services.milvus_client")
+
+
+def test_filter_expr_builds_range_and_escapes_strings(milvus_client):
+    from app.schemas.search import SearchFilters
+
+    assert milvus_client.filter_expr(None) is None
+    assert milvus_client.filter_expr(SearchFilters()) is None
+    assert milvus_client.filter_expr(SearchFilters(corpus="legal")) is None
+
+    after = datetime(2024, 1, 1)
+    before = datetime(2024, 1, 1, 3, tzinfo=timezone(timedelta(hours=3)))
+    expr = milvus_client.filter_expr(
+        SearchFilters(uploaded_after=after, uploaded_before=before, uploaded_by="u-1", tag="финансы")
+    )
+    # naive datetime — UTC; обе границы здесь один и тот же момент
+    assert expr == (
+        'uploaded_at >= 1704067200 && uploaded_at < 1704067200 && uploaded_by == "u-1" && tag == "финансы"'
+    )
+
+
+def test_filter_expr_cannot_be_broken_out_of_by_quotes(milvus_client):
+    from app.schemas.search import SearchFilters
+
+    expr = milvus_client.filter_expr(SearchFilters(tag='x" || tag != "', uploaded_by="a\\b"))
+    assert expr == 'uploaded_by == "a\\\\b" && tag == "x\\" || tag != \\""'
+
+
+def test_corpus_partition_names(milvus_client, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "default_corpus", "default")
+    assert milvus_client.corpus_partition(None) == "_default"
+    assert milvus_client.corpus_partition("") == "_default"
+    assert milvus_client.corpus_partition("default") == "_default"
+    assert milvus_client.corpus_partition("legal_2024") == "corpus_legal_2024"
+
+    # кириллица, пробелы, слишком длинные имена — по хешу; имя стабильно и допустимо для Milvus
+    for corpus in ("Юридический отдел", "a-b", "x" * 65):
+        name = milvus_client.corpus_partition(corpus)
+        assert name == milvus_client.corpus_partition(corpus)
+        assert name.startswith("corpus_") and len(name) == len("corpus_") + 16
+        assert name.replace("_", "").isalnum() and name.isascii()
+    assert milvus_client.corpus_partition("a-b") != milvus_client.corpus_partition("a_b")
+
+
+class _FakePartition:
+    def __init__(self, name: str):
+        self.name = name
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+class _FakeCollection:
+    def __init__(self, names: list[str], name: str = "document_chunks_v1", model: str | None = None):
+        self.name = name
+        self.description = f"Chunks embeddings; model={model}" if model else "Chunks embeddings"
+        self.partitions = [_FakePartition(n) for n in names]
+        self.loaded: list[str] | str | None = None
+
+    def has_partition(self, name: str) -> bool:
+        return any(p.name == name for p in self.partitions)
+
+    def load(self, partition_names=None):
+        self.loaded = partition_names or "all"
+
+    def release(self):
+        self.loaded = None
+
+
+def test_released_corpora_stay_released_on_next_load(milvus_client, monkeypatch, tmp_path):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "storage_dir", tmp_path)
+    monkeypatch.setattr(settings, "default_corpus", "default")
+    col = _FakeCollection(["_default", "corpus_legal", "corpus_archive"])
+    monkeypatch.setattr(milvus_client, "get_collection", lambda: col)
+    partition = types.SimpleNamespace(load=lambda: None, release=lambda: None)
+    monkeypatch.setattr(milvus_client, "Partition", lambda c, name: partition)
+
+    milvus_client._load_active_partitions(col)
+    assert col.loaded == "all"
+
+    milvus_client.release_corpus("archive")
+    assert milvus_client.released_partitions() == {"corpus_archive"}
+    with pytest.raises(ValueError):
+        milvus_client.release_corpus("default")
+
+    # как после перезапуска backend или переключения версии коллекции
+    milvus_client._load_active_partitions(col)
+    assert col.loaded == ["_default", "corpus_legal"]
+
+    milvus_client.load_corpus("archive")
+    assert milvus_client.released_partitions() == set()
+    with pytest.raises(ValueError):
+        milvus_client.load_corpus("missing")
+
+
+def test_search_params_radius_and_index_specific_params(milvus_client, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "milvus_search_ef", 64)
+    monkeypatch.setattr(settings, "milvus_search_nprobe", 16)
+
+    assert milvus_client.search_params(10, "IVF_FLAT") == {"metric_type": "IP", "params": {"nprobe": 16}}
+    assert milvus_client.search_params(100, "hnsw")["params"] == {"ef": 100}
+    assert milvus_client.search_params(10, "FLAT")["params"] == {}
+
+    # radius чуть ниже порога: хит ровно с min_score тоже попадает в выдачу
+    params = milvus_client.search_params(10, "HNSW", min_score=0.75)["params"]
+    assert params["ef"] == 64
+    assert 0.75 - 1e-5 < params["radius"] < 0.75
+
+
+def test_range_search_limit_is_capped(milvus_client, monkeypatch):
+    from app.core.config import settings
+
+    calls: list[dict] = []
+    col = types.SimpleNamespace(
+        name="document_chunks_v1",
+        indexes=[types.SimpleNamespace(field_name="embedding", params={"index_type": "HNSW"})],
+        search=lambda **kwargs: calls.append(kwargs) or [[]],
+    )
+    monkeypatch.setattr(milvus_client, "search_collection", lambda: col)
+    monkeypatch.setattr(milvus_client, "collection_fields", lambda collection=None: frozenset())
+    monkeypatch.setattr(settings, "search_top_k", 10)
+    monkeypatch.setattr(settings, "search_range_max_results", None)
+
+    milvus_client.search_embeddings_batch([[0.1, 0.2]], min_score=0.5)
+    monkeypatch.setattr(settings, "search_range_max_results", 50)
+    milvus_client.search_embeddings_batch([[0.1, 0.2]], min_score=0.5)
+    milvus_client.search_embeddings_batch([[0.1, 0.2]])
+
+    assert [c["limit"] for c in calls] == [20, 50, 10]
+    assert "radius" in calls[0]["param"]["params"] and "radius" not in calls[2]["param"]["params"]
+
+
+class _FakeUtility:
+    def __init__(self, aliases: dict[str, str], collections: list[str]):
+        self.aliases = aliases
+        self.collections = collections
+        self.calls: list[tuple] = []
+
+    def list_aliases(self, name: str) -> list[str]:
+        return [a for a, target in self.aliases.items() if target == name]
+
+    def has_collection(self, name: str) -> bool:
+        return name in self.collections
+
+    def list_collections(self) -> list[str]:
+        return list(self.collections)
+
+    def create_alias(self, name: str, alias: str):
+        self.calls.append(("create_alias", name, alias))
+        self.aliases[alias] = name
+
+    def alter_alias(self, name: str, alias: str):
+        self.calls.append(("alter_alias", name, alias))
+        self.aliases[alias] = name
+
+    def rename_collection(self, old: str, new: str):
+        self.calls.append(("rename_collection", old, new))
+        self.collections[self.collections.index(old)] = new
+
+    def load_state(self, name: str, partition_names=None):
+        from pymilvus.client.types import LoadState
+
+        return LoadState.NotLoad
+
+
+def _versions(milvus_client, monkeypatch, tmp_path, live: str | None, **collections: _FakeCollection) -> _FakeUtility:
+    """Фейковый Milvus: версии по именам, алиас document_chunks → live."""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "storage_dir", tmp_path)
+    fake_utility = _FakeUtility({"document_chunks": live} if live else {}, list(collections))
+
+    def collection(name: str):
+        target = fake_utility.aliases.get(name, name)
+        col = collections[target]
+        col.name = name
+        return col
+
+    monkeypatch.setattr(milvus_client, "utility", fake_utility)
+    monkeypatch.setattr(milvus_client, "Collection", collection)
+    return fake_utility
+
+
+def test_version_switch_keeps_released_corpora_released(milvus_client, monkeypatch, tmp_path):
+    old = _FakeCollection(["_default", "corpus_archive"])
+    # reindex загрузил новую версию целиком, чтобы сверить число строк
+    new = _FakeCollection(["_default", "corpus_legal", "corpus_archive"])
+    new.load()
+    fake_utility = _versions(
+        milvus_client, monkeypatch, tmp_path, "document_chunks_v1", document_chunks_v1=old, document_chunks_v2=new
+    )
+    milvus_client._save_released_partitions({"corpus_archive"})
+
+    assert milvus_client.activate_collection_version("document_chunks_v2") == "document_chunks_v1"
+
+    assert fake_utility.aliases["document_chunks"] == "document_chunks_v2"
+    assert [p.name for p in new.partitions if p.released] == ["corpus_archive"]
+    assert new.loaded == ["_default", "corpus_legal"]
+    assert old.loaded is None
+
+
+def test_blue_green_switch_and_rollback(milvus_client, monkeypatch, tmp_path):
+    v1, v2 = _FakeCollection(["_default"]), _FakeCollection(["_default"])
+    fake_utility = _versions(milvus_client, monkeypatch, tmp_path, None, document_chunks_v1=v1, document_chunks_v2=v2)
+
+    # первая версия: алиас создаётся
+    assert milvus_client.activate_collection_version("document_chunks_v1") is None
+    assert fake_utility.calls == [("create_alias", "document_chunks_v1", "document_chunks")]
+    assert milvus_client.current_collection_version() == "document_chunks_v1"
+
+    # новая версия: алиас переключается, прежняя остаётся для отката, но выгружается
+    assert milvus_client.activate_collection_version("document_chunks_v2") == "document_chunks_v1"
+    assert fake_utility.calls[-1] == ("alter_alias", "document_chunks_v2", "document_chunks")
+    assert (v1.loaded, v2.loaded) == (None, "all")
+
+    monkeypatch.delitem(sys.modules, "app.scripts.reindex_milvus", raising=False)
+    reindex = importlib.import_module("app.scripts.reindex_milvus")
+    monkeypatch.setattr(reindex, "connect", lambda: None)
+    bumped: list[bool] = []
+    monkeypatch.setattr(reindex, "bump_index_version", lambda: bumped.append(True))
+
+    reindex.rollback()
+    assert fake_utility.aliases["document_chunks"] == "document_chunks_v1"
+    assert (v1.loaded, v2.loaded) == ("all", None)
+    assert bumped == [True]
+    # откатываться дальше некуда
+    with pytest.raises(SystemExit):
+        reindex.rollback()
+
+
+def test_pre_versioning_collection_becomes_v1(milvus_client, monkeypatch, tmp_path):
+    legacy = _FakeCollection(["_default"])
+    fake_utility = _versions(
+        milvus_client, monkeypatch, tmp_path, None, document_chunks=legacy, document_chunks_v1=legacy
+    )
+    fake_utility.collections = ["document_chunks"]
+
+    milvus_client._ensure_alias()
+
+    assert fake_utility.calls == [
+        ("rename_collection", "document_chunks", "document_chunks_v1"),
+        ("create_alias", "document_chunks_v1", "document_chunks"),
+    ]
+    # версия без отметки модели считается совместимой с любой
+    assert milvus_client.collection_model("document_chunks_v1") is None
+
+
+def test_process_with_old_model_searches_its_own_version_and_does_not_write(milvus_client, monkeypatch, tmp_path):
+    from app.core.config import settings
+    from app.services.search import EmbeddingModelMismatch
+
+    old = _FakeCollection(["_default"], model="old-model")
+    new = _FakeCollection(["_default"], model="new-model")
+    new.load()
+    _versions(
+        milvus_client, monkeypatch, tmp_path, "document_chunks_v2", document_chunks_v1=old, document_chunks_v2=new
+    )
+    monkeypatch.setattr(milvus_client, "get_collection", lambda: milvus_client.Collection("document_chunks"))
+
+    # процесс ещё не перезапущен с новой моделью после reindex
+    monkeypatch.setattr(settings, "embedding_model_name", "old-model")
+    assert milvus_client.collection_model("document_chunks") == "new-model"
+    assert not milvus_client.live_model_matches()
+    fallback = milvus_client.search_collection()
+    assert fallback is old and old.loaded == "all"
+    with pytest.raises(EmbeddingModelMismatch):
+        milvus_client.insert_embeddings([{"chunk_id": "c1"}])
+
+    # перезапущенный процесс с новой моделью работает с живой версией
+    monkeypatch.setattr(settings, "embedding_model_name", "new-model")
+    milvus_client._search_versions.clear()
+    assert milvus_client.live_model_matches()
+    assert milvus_client.search_collection().description.endswith("model=new-model")
+
+    # версии своей модели нет вовсе — поиск отказывает, а не сравнивает векторы разных моделей
+    monkeypatch.setattr(settings, "embedding_model_name", "other-model")
+    with pytest.raises(EmbeddingModelMismatch, match="other-model"):
+        milvus_client.search_collection()
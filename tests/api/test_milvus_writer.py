@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+
+class _FakeMilvus:
+    def __init__(self, gate: threading.Event | None = None):
+        self.ops: list = []
+        self.fail_insert: Exception | None = None
+        self.fail_flush: Exception | None = None
+        self._gate = gate
+
+    def insert(self, rows: list[dict]) -> None:
+        if self._gate is not None:
+            self._gate.wait(timeout=5)
+        if self.fail_insert is not None:
+            raise self.fail_insert
+        self.ops.append(("insert", [r["id"] for r in rows]))
+
+    def flush(self) -> None:
+        if self.fail_flush is not None:
+            raise self.fail_flush
+        self.ops.append(("flush",))
+
+
+def _rows(*ids: str) -> list[dict]:
+    return [{"id": i} for i in ids]
+
+
+def _writer(milvus: _FakeMilvus, max_batch_rows: int = 100, max_wait_ms: float = 5000):
+    from app.services.milvus_writer import MilvusWriter
+
+    return MilvusWriter(milvus.insert, milvus.flush, max_batch_rows=max_batch_rows, max_wait_ms=max_wait_ms)
+
+
+def test_flush_writes_everything_queued_before_it():
+    milvus = _FakeMilvus()
+    writer = _writer(milvus)
+
+    first = writer.submit(_rows("a", "b"))
+    second = writer.submit(_rows("c"))
+    # flush прерывает сбор пачки: вставки до него уходят одним insert раньше flush коллекции
+    writer.flush()
+    assert first.done() and second.done()
+    assert milvus.ops == [("insert", ["a", "b", "c"]), ("flush",)]
+
+    third = writer.submit(_rows("d"))
+    writer.stop()
+    assert third.result(timeout=0) is None
+    assert milvus.ops[2:] == [("insert", ["d"]), ("flush",)]
+
+
+def test_batch_is_cut_at_max_batch_rows():
+    milvus = _FakeMilvus()
+    writer = _writer(milvus, max_batch_rows=3)
+
+    futures = [writer.submit(_rows(f"{i}a", f"{i}b")) for i in range(3)]
+    writer.stop()
+    assert all(f.result(timeout=0) is None for f in futures)
+    assert milvus.ops == [("insert", ["0a", "0b", "1a", "1b"]), ("insert", ["2a", "2b"]), ("flush",)]
+
+
+def test_stop_processes_writes_queued_after_stop_and_answers_pending_flush():
+    from app.services.milvus_writer import _STOP, _Flush
+
+    gate = threading.Event()
+    milvus = _FakeMilvus(gate)
+    writer = _writer(milvus, max_wait_ms=0)
+
+    first = writer.submit(_rows("a"))
+    # писатель занят вставкой: STOP, вставка и flush после него попадают в остаток очереди
+    writer._queue.put(_STOP)
+    late = writer.submit(_rows("b"))
+    pending_flush = _Flush()
+    writer._queue.put(pending_flush)
+    gate.set()
+    writer._thread.join(timeout=5)
+
+    assert not writer._thread.is_alive()
+    assert first.result(timeout=0) is None and late.result(timeout=0) is None
+    assert pending_flush.future.result(timeout=0) is None
+    assert milvus.ops == [("insert", ["a"]), ("insert", ["b"]), ("flush",)]
+
+
+def test_insert_error_reaches_every_write_of_the_batch():
+    milvus = _FakeMilvus()
+    milvus.fail_insert = RuntimeError("milvus down")
+    writer = _writer(milvus)
+
+    futures = [writer.submit(_rows("a")), writer.submit(_rows("b"))]
+    writer.flush()
+    for f in futures:
+        with pytest.raises(RuntimeError, match="milvus down"):
+            f.result(timeout=0)
+
+    # ошибка не останавливает писателя: следующие вставки проходят
+    milvus.fail_insert = None
+    writer.write(_rows("c"))
+    writer.stop()
+    assert milvus.ops == [("flush",), ("insert", ["c"]), ("flush",)]
+
+
+def test_flush_error_reaches_flush_caller():
+    milvus = _FakeMilvus()
+    milvus.fail_flush = RuntimeError("flush failed")
+    writer = _writer(milvus)
+
+    write = writer.submit(_rows("a"))
+    with pytest.raises(RuntimeError, match="flush failed"):
+        writer.flush()
+    # строки при этом вставлены: ошибка flush не переносится на вставки
+    assert write.result(timeout=0) is None
+    assert milvus.ops == [("insert", ["a"])]
+    writer.stop()
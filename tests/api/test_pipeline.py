@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+
+def _thread(name: str) -> threading.Thread | None:
+    return next((t for t in threading.enumerate() if t.name == name), None)
+
+
+def test_prefetch_yields_in_order_and_raises_source_error():
+    from app.services.pipeline import prefetch
+
+    def source():
+        yield 1
+        yield 2
+        raise ValueError("broken source")
+
+    got = []
+    with pytest.raises(ValueError, match="broken source"):
+        for item in prefetch(source(), maxsize=1):
+            got.append(item)
+    # ошибка приходит после всех элементов, выданных до неё
+    assert got == [1, 2]
+
+
+def test_prefetch_thread_stops_when_consumer_abandons_iterator():
+    from app.services.pipeline import prefetch
+
+    produced = []
+
+    def source():
+        i = 0
+        while True:
+            produced.append(i)
+            yield i
+            i += 1
+
+    it = prefetch(source(), maxsize=2, name="prefetch-abandoned")
+    assert next(it) == 0
+    it.close()
+
+    thread = _thread("prefetch-abandoned")
+    if thread is not None:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+    # источник не читается дальше очереди: брошенный итератор не вычитывает его до конца
+    assert len(produced) <= 5
+
+
+def test_bounded_worker_processes_items_in_order():
+    from app.services.pipeline import BoundedWorker
+
+    seen = []
+    worker = BoundedWorker(seen.append, maxsize=2)
+    for i in range(10):
+        worker.put(i)
+    worker.close()
+    assert seen == list(range(10))
+
+
+def test_bounded_worker_error_surfaces_on_blocked_put():
+    from app.services.pipeline import BoundedWorker
+
+    gate = threading.Event()
+
+    def fn(item):
+        gate.wait(timeout=5)
+        raise RuntimeError(f"write {item} failed")
+
+    worker = BoundedWorker(fn, maxsize=1)
+    # поток висит на первом элементе, очередь полна: третий put блокируется до ошибки fn
+    threading.Timer(0.1, gate.set).start()
+    with pytest.raises(RuntimeError, match="write 0 failed"):
+        for i in range(3):
+            worker.put(i)
+    with pytest.raises(RuntimeError, match="write 0 failed"):
+        worker.put(3)
+    with pytest.raises(RuntimeError, match="write 0 failed"):
+        worker.close()
+
+
+def test_bounded_worker_close_raises_first_error_and_skips_the_rest():
+    from app.services.pipeline import BoundedWorker
+
+    seen = []
+
+    def fn(item):
+        if item == 1:
+            raise RuntimeError("write 1 failed")
+        seen.append(item)
+
+    worker = BoundedWorker(fn, maxsize=10)
+    for i in range(4):
+        worker.put(i)
+    with pytest.raises(RuntimeError, match="write 1 failed"):
+        worker.close()
+    assert seen == [0]
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import importlib
+import sys
+import types
+
+import pytest
+from sqlalchemy.orm import Session
+
+
+@pytest.fixture
+def encoded() -> list[list[str]]:
+    return []
+
+
+@pytest.fixture
+def reindex(monkeypatch, encoded):
+    # sentence_transformers в тестах нет: модуль эмбеддингов заменяется заглушкой
+    def embed_texts(texts: list[str]) -> list[list[float]]:
+        encoded.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    fake = types.ModuleType("app.services.embeddings")
+    fake.get_model = None
+    fake.embed_texts = embed_texts
+    monkeypatch.setitem(sys.modules, "app.services.embeddings", fake)
+    for name in ("app.services.milvus_client", "app.scripts.reindex_milvus"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    return importlib.import_module("app.scripts.reindex_milvus")
+
+
+def _chunks(db: Session, per_document: int) -> None:
+    from app.models.chunk import Chunk
+    from app.models.document import Document
+
+    for title in ("a", "b"):
+        doc = Document(id=f"doc-{title}", title=title, filename=f"{title}.pdf", content_type="application/pdf")
+        db.add(doc)
+        db.add_all(Chunk(document_id=doc.id, chunk_index=i, text=f"{title}{i}") for i in range(per_document))
+    db.commit()
+
+
+def test_chunk_batches_are_keyset_paginated_and_resumable(reindex, db: Session):
+    _chunks(db, 3)
+
+    batches = list(reindex.iter_chunk_batches(db, batch_size=2))
+    keys = [[(r.document_id, r.chunk_index) for r in rows] for rows in batches]
+    assert keys == [
+        [("doc-a", 0), ("doc-a", 1)],
+        [("doc-a", 2), ("doc-b", 0)],
+        [("doc-b", 1), ("doc-b", 2)],
+    ]
+    assert batches[0][0].title == "a"
+
+    # продолжение с чекпоинта — строго после последнего записанного ключа
+    resumed = list(reindex.iter_chunk_batches(db, batch_size=2, after=("doc-a", 2)))
+    assert [(r.document_id, r.chunk_index) for rows in resumed for r in rows] == [
+        ("doc-b", 0),
+        ("doc-b", 1),
+        ("doc-b", 2),
+    ]
+    assert reindex.count_chunks(db, after=("doc-a", 2)) == 3
+
+
+def test_chunk_batches_with_context_read_neighbours_across_batch_boundary(reindex, db: Session):
+    _chunks(db, 3)
+
+    batches = list(reindex.iter_chunk_batches(db, batch_size=2, document_ids=["doc-a"], with_context=True))
+    contexts = [r.context for rows in batches for r in rows]
+    assert contexts == ["a0\na1", "a0\na1\na2", "a1\na2"]
+
+
+def test_resume_continues_after_checkpoint_into_same_collection(reindex, db: Session, monkeypatch, tmp_path):
+    _chunks(db, 3)
+    path = tmp_path / "reindex_checkpoint.json"
+    reindex.save_checkpoint(
+        path,
+        {
+            "collection": "document_chunks_v2",
+            "started_at": "2999-01-01T00:00:00",
+            "document_id": "doc-a",
+            "chunk_index": 2,
+            "inserted": 3,
+        },
+    )
+
+    inserted: list[tuple[str, list]] = []
+    saved: list[dict] = []
+    activated: list[str] = []
+
+    class _Target:
+        def __init__(self, name: str):
+            self.name = name
+
+        def load(self):
+            pass
+
+    def insert_embeddings(rows, flush, upsert, collection):
+        inserted.append((collection.name, [(r["document_id"], r["chunk_index"]) for r in rows]))
+
+    def save_checkpoint(path, state, _save=reindex.save_checkpoint):
+        saved.append(state)
+        _save(path, state)
+
+    def create_collection_version():
+        raise AssertionError("--resume must not create a new version")
+
+    monkeypatch.setattr(sys, "argv", ["reindex", "--resume", "--checkpoint", str(path), "--batch-size", "2"])
+    monkeypatch.setattr(reindex, "SessionLocal", lambda: db)
+    monkeypatch.setattr(reindex, "connect", lambda: None)
+    monkeypatch.setattr(reindex, "Collection", _Target)
+    monkeypatch.setattr(reindex, "create_collection_version", create_collection_version)
+    monkeypatch.setattr(reindex, "collection_fields", lambda col: [])
+    monkeypatch.setattr(reindex, "get_embedding_store", lambda: None)
+    monkeypatch.setattr(reindex, "insert_embeddings", insert_embeddings)
+    monkeypatch.setattr(reindex, "save_checkpoint", save_checkpoint)
+    monkeypatch.setattr(reindex, "flush_embeddings", lambda col: None)
+    monkeypatch.setattr(reindex, "count_rows", lambda col: 6)
+    monkeypatch.setattr(reindex, "activate_collection_version", lambda name: activated.append(name) or "v1")
+    monkeypatch.setattr(reindex, "bump_index_version", lambda: None)
+
+    reindex.main()
+
+    # строго после (doc-a, 2) и в ту же версию, что в чекпоинте
+    assert inserted == [
+        ("document_chunks_v2", [("doc-b", 0), ("doc-b", 1)]),
+        ("document_chunks_v2", [("doc-b", 2)]),
+    ]
+    assert [(s["collection"], s["started_at"], s["document_id"], s["chunk_index"], s["inserted"]) for s in saved] == [
+        ("document_chunks_v2", "2999-01-01T00:00:00", "doc-b", 1, 5),
+        ("document_chunks_v2", "2999-01-01T00:00:00", "doc-b", 2, 6),
+    ]
+    assert activated == ["document_chunks_v2"]
+    # после переключения алиаса чекпоинт больше не нужен
+    assert reindex.load_checkpoint(path) is None
+
+
+def test_embed_batch_encodes_only_chunks_missing_from_store(reindex, encoded, tmp_path):
+    from app.services.embedding_store import EmbeddingStore
+    from app.services.file_parser import chunk_text_hash
+
+    rows = [
+        reindex.ChunkRow(f"c{i}", "doc-a", i, None, text, None, "a", None, None, None, None)
+        for i, text in enumerate(["known", "fresh", "known"])
+    ]
+    store = EmbeddingStore(tmp_path, "model")
+    try:
+        store.put_many({chunk_text_hash("known"): [9.0, 9.0]})
+
+        vectors, n_encoded = reindex.embed_batch(rows, store)
+
+        assert n_encoded == 1
+        assert encoded == [["fresh"]]
+        assert vectors == [pytest.approx([9.0, 9.0]), [5.0, 1.0], pytest.approx([9.0, 9.0])]
+        # новый вектор сохранён для следующих прогонов
+        assert store.get_many([chunk_text_hash("fresh")])[chunk_text_hash("fresh")] == pytest.approx([5.0, 1.0])
+    finally:
+        store.close()
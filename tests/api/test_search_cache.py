@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture
+def search_cache(monkeypatch):
+    from app.core.config import settings
+    from app.services import search_cache
+
+    # только in-process: без Redis версия индекса живёт в процессе
+    monkeypatch.setattr(search_cache, "get_redis", lambda: None)
+    monkeypatch.setattr(settings, "search_cache_enabled", True)
+    search_cache.get_search_cache.cache_clear()
+    yield search_cache
+    search_cache.get_search_cache.cache_clear()
+
+
+def test_key_includes_version_model_and_normalized_query(search_cache):
+    from app.core.config import settings
+    from app.schemas.search import SearchFilters
+
+    key = search_cache.search_cache_key("  договор   поставки ", 0.5, True, "single", 7)
+    parts = key.split(":")
+    assert parts[0] == "v7"
+    assert parts[1] == settings.embedding_model_name
+    assert parts[-4:] == ["0.5000", "rerank", "single", "all"]
+    # пробелы не влияют на ключ
+    assert key == search_cache.search_cache_key("договор поставки", 0.5, True, "single", 7)
+
+    plain = search_cache.search_cache_key("договор поставки", None, False, "single", 7)
+    assert plain.split(":")[-4:-1] == ["none", "plain", "single"]
+
+    filtered = search_cache.search_cache_key("договор поставки", 0.5, True, "single", 7, SearchFilters(tag="finance"))
+    other = search_cache.search_cache_key("договор поставки", 0.5, True, "single", 7, SearchFilters(tag="legal"))
+    assert len({key, filtered, other}) == 3
+
+
+def test_index_version_bump_makes_old_entries_miss(search_cache):
+    key, cached = search_cache.lookup("договор", None, False, "single")
+    assert cached is None
+    search_cache.store(key, [{"document_id": "d1", "score": 0.9}])
+    assert search_cache.lookup("договор", None, False, "single") == (key, [{"document_id": "d1", "score": 0.9}])
+
+    search_cache.bump_index_version()
+    new_key, cached = search_cache.lookup("договор", None, False, "single")
+    assert new_key != key
+    assert cached is None
+    # in-process уровень при смене версии очищается целиком
+    assert search_cache.get_search_cache().get(key) is None
@@ -6,10 +6,10 @@ from fastapi.testclient import TestClient
 def test_search_empty_request_returns_empty_payload(client: TestClient, monkeypatch):
     import app.services.search as search_service
 
-    def fake_search_sources(*args, **kwargs):
+    async def fake_search_sources(*args, **kwargs):
         return "", []
 
-    monkeypatch.setattr(search_service, "search_sources", fake_search_sources)
+    monkeypatch.setattr(search_service, "search_sources_async", fake_search_sources)
 
     res = client.post("/api/search", files={})
     assert res.status_code == 200
@@ -25,7 +25,7 @@ def test_search_with_text_returns_results(client: TestClient, monkeypatch):
 
     from app.schemas.search import SearchResultItem
 
-    def fake_search_sources(db, text, file, user_id=None, min_similarity_percent=None, rerank=True):
+    async def fake_search_sources(db, text, file, user_id=None, min_similarity_percent=None, rerank=True, query_mode="auto", filters=None):
         return (text or "").strip(), [
             SearchResultItem(
                 document_id="doc-1",
@@ -36,7 +36,7 @@ def test_search_with_text_returns_results(client: TestClient, monkeypatch):
             )
         ]
 
-    monkeypatch.setattr(search_service, "search_sources", fake_search_sources)
+    monkeypatch.setattr(search_service, "search_sources_async", fake_search_sources)
 
     res = client.post("/api/search", data={"text": "запрос", "min_similarity_percent": "30", "rerank": "true"})
     assert res.status_code == 200, res.text
@@ -44,3 +44,107 @@ def test_search_with_text_returns_results(client: TestClient, monkeypatch):
     assert payload["query"] == "запрос"
     assert len(payload["results"]) == 1
     assert payload["results"][0]["document_id"] == "doc-1"
+
+
+def test_search_document_mode_returns_matched_spans(client: TestClient, monkeypatch):
+    import app.services.search as search_service
+
+    from app.schemas.search import MatchedSpan, SearchResultItem
+
+    seen: dict = {}
+
+    async def fake_search_sources(db, text, file, user_id=None, min_similarity_percent=None, rerank=True, query_mode="auto", filters=None):
+        seen["query_mode"] = query_mode
+        return (text or "").strip(), [
+            SearchResultItem(
+                document_id="doc-1",
+                title="Документ 1",
+                score=0.8,
+                excerpt="Фрагмент",
+                coverage=0.5,
+                matched_spans=[MatchedSpan(query_chunk_index=0, query_excerpt="запрос", score=0.8)],
+            )
+        ]
+
+    monkeypatch.setattr(search_service, "search_sources_async", fake_search_sources)
+
+    res = client.post("/api/search", data={"text": "запрос", "query_mode": "document"})
+    assert res.status_code == 200, res.text
+    assert seen["query_mode"] == "document"
+    item = res.json()["results"][0]
+    assert item["coverage"] == 0.5
+    assert item["matched_spans"][0]["query_chunk_index"] == 0
+
+    bad = client.post("/api/search", data={"text": "запрос", "query_mode": "pages"})
+    assert bad.status_code == 422
+
+
+def test_search_batch_returns_results_in_order(client: TestClient, monkeypatch):
+    import app.services.search as search_service
+
+    from app.schemas.search import SearchResultItem
+
+    async def fake_search_sources_batch_async(db, queries, user_id=None, min_similarity_percent=None, rerank=False, filters=None):
+        return [
+            (q.strip(), [SearchResultItem(document_id=f"doc-{i}", title="Документ", score=0.5, excerpt=q)] if q.strip() else [])
+            for i, q in enumerate(queries)
+        ]
+
+    monkeypatch.setattr(search_service, "search_sources_batch_async", fake_search_sources_batch_async)
+
+    res = client.post("/api/search/batch", json={"queries": ["первый", "  ", "третий"], "min_similarity_percent": 40})
+    assert res.status_code == 200, res.text
+    payload = res.json()["results"]
+    assert [r["query"] for r in payload] == ["первый", "", "третий"]
+    assert payload[0]["results"][0]["document_id"] == "doc-0"
+    assert payload[1]["results"] == []
+    assert payload[2]["results"][0]["document_id"] == "doc-2"
+
+
+def test_search_batch_rejects_too_many_queries(client: TestClient, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "search_batch_max_queries", 2)
+    res = client.post("/api/search/batch", json={"queries": ["a", "b", "c"]})
+    assert res.status_code == 400
+
+
+def test_search_passes_filters_to_service(client: TestClient, monkeypatch):
+    import app.services.search as search_service
+
+    seen = {}
+
+    async def fake_search_sources(db, text, file, filters=None, **kwargs):
+        seen["filters"] = filters
+        return (text or "").strip(), []
+
+    monkeypatch.setattr(search_service, "search_sources_async", fake_search_sources)
+
+    res = client.post(
+        "/api/search",
+        data={"text": "запрос", "uploaded_after": "2024-01-01T00:00:00", "uploaded_by": "u-1", "tag": "finance", "corpus": "legal"},
+    )
+    assert res.status_code == 200, res.text
+    filters = seen["filters"]
+    assert filters.uploaded_after.year == 2024
+    assert filters.uploaded_before is None
+    assert (filters.uploaded_by, filters.tag, filters.corpus) == ("u-1", "finance", "legal")
+
+
+def test_search_filters_on_legacy_collection_return_400(client: TestClient, monkeypatch):
+    import sys
+    import types
+
+    fake_milvus = types.ModuleType("app.services.milvus_client")
+    fake_milvus.supports_filters = lambda: False
+    fake_milvus.search_embeddings_batch = None
+    monkeypatch.setitem(sys.modules, "app.services.milvus_client", fake_milvus)
+    # фильтр отклоняется до encode и реранкера — их модули достаточно заглушить
+    for name, attr in (("app.services.embeddings", "embed_texts_async"), ("app.services.llm", "rerank_sources_batch_async")):
+        stub = types.ModuleType(name)
+        setattr(stub, attr, None)
+        monkeypatch.setitem(sys.modules, name, stub)
+
+    res = client.post("/api/search/batch", json={"queries": ["запрос"], "filters": {"tag": "finance"}})
+    assert res.status_code == 400
+    assert "reindex" in res.json()["detail"]
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from sqlalchemy.orm import Session
+
+
+def _document_with_chunks(db: Session, title: str, n: int, status: str = "processed"):
+    from app.models.chunk import Chunk
+    from app.models.document import Document
+
+    doc = Document(title=title, filename=f"{title}.pdf", content_type="application/pdf", status=status)
+    db.add(doc)
+    db.flush()
+    chunks = [Chunk(document_id=doc.id, chunk_index=i, text=f"{title} чанк {i}") for i in range(n)]
+    db.add_all(chunks)
+    db.commit()
+    return doc, chunks
+
+
+def _hit(chunk, score: float = 0.9) -> dict:
+    return {
+        "chunk_id": chunk.id,
+        "document_id": chunk.document_id,
+        "chunk_index": chunk.chunk_index,
+        "page_number": 0,
+        "score": score,
+    }
+
+
+def test_fetch_rows_reads_exactly_hit_chunks_and_their_neighbours(db: Session):
+    from app.services.search import _assemble_results, _fetch_rows
+
+    a, a_chunks = _document_with_chunks(db, "A", 6)
+    b, b_chunks = _document_with_chunks(db, "B", 3)
+
+    hits = [_hit(a_chunks[2]), _hit(b_chunks[0], 0.8)]
+    rows = _fetch_rows(db, hits)
+    chunks_by_id, neighbor_chunks_by_key, docs_by_id, live_doc_ids = rows
+
+    # пары (document_id, chunk_index±1), без индекса -1 и без чужих чанков того же документа
+    assert set(neighbor_chunks_by_key) == {(a.id, 1), (a.id, 2), (a.id, 3), (b.id, 0), (b.id, 1)}
+    assert set(chunks_by_id) == {a_chunks[i].id for i in (1, 2, 3)} | {b_chunks[i].id for i in (0, 1)}
+    assert set(docs_by_id) == {a.id, b.id}
+    assert live_doc_ids == set()
+
+    results = _assemble_results(hits, rows, "чанк")
+    assert [r["document_id"] for r in results] == [a.id, b.id]
+    assert "A чанк 1" in results[0]["excerpt"] and "A чанк 3" in results[0]["excerpt"]
+    assert "A чанк 4" not in results[0]["excerpt"]
+
+
+def test_build_results_returns_connection_before_next_await(db: Session):
+    from app.services.search import _build_results, _build_results_batch
+
+    a, a_chunks = _document_with_chunks(db, "A", 2)
+    db.query(type(a)).all()
+    assert db.in_transaction()
+
+    results = _build_results(db, [_hit(a_chunks[0])], "чанк")
+    # реранкер и следующие шаги ждутся без открытой транзакции
+    assert not db.in_transaction()
+    assert results[0]["title"] == "A"
+
+    batch = _build_results_batch(db, [[_hit(a_chunks[1])], []], ["чанк", "пусто"])
+    assert not db.in_transaction()
+    assert [len(r) for r in batch] == [1, 0]
+
+
+def test_fetch_rows_keeps_payload_hits_only_for_processed_documents(db: Session):
+    from app.services.search import _assemble_results, _fetch_rows
+
+    live, _ = _document_with_chunks(db, "live", 0)
+    queued, _ = _document_with_chunks(db, "queued", 0, status="queued")
+    # хиты из коллекции с payload: текст уже в Milvus, документ — удалён или ещё не доиндексирован
+    hits = [
+        {"chunk_id": f"c-{doc_id}", "document_id": doc_id, "chunk_index": 0, "score": 0.9, "context": "контекст"}
+        for doc_id in (live.id, queued.id, "deleted-doc")
+    ]
+
+    rows = _fetch_rows(db, hits)
+    assert rows[3] == {live.id}
+    assert [r["document_id"] for r in _assemble_results(hits, rows, "контекст")] == [live.id]
+
+
+def test_aggregate_document_hits_ranks_by_coverage_then_best_score(monkeypatch):
+    from app.core.config import settings
+    from app.services.search import _aggregate_document_hits
+
+    monkeypatch.setattr(settings, "document_query_max_results", 10)
+    query_chunks = ["q0", "q1", "q2", "q3"]
+    hits_per_chunk = [
+        [{"document_id": "wide", "score": 0.6}, {"document_id": "narrow", "score": 0.95}],
+        [{"document_id": "wide", "score": 0.55}, {"document_id": "wide", "score": 0.7}],
+        [{"document_id": "wide", "score": 0.4}, {"document_id": "narrow", "score": 0.3}],
+        [],
+    ]
+
+    aggregates = _aggregate_document_hits(query_chunks, hits_per_chunk, coverage_min_score=0.5)
+
+    assert [a["document_id"] for a in aggregates] == ["wide", "narrow"]
+    wide, narrow = aggregates
+    # лучший хит на каждый чанк запроса; покрыты чанки со score >= порога
+    assert wide["coverage"] == 0.5
+    assert wide["score"] == 0.7 and wide["best_query_chunk"] == 1
+    assert [(qi, h["score"]) for qi, h in wide["matches"]] == [(1, 0.7), (0, 0.6), (2, 0.4)]
+    assert narrow["coverage"] == 0.25
+    assert narrow["score"] == 0.95 and narrow["best_query_chunk"] == 0
+
+
+def test_aggregate_document_hits_is_capped(monkeypatch):
+    from app.core.config import settings
+    from app.services.search import _aggregate_document_hits
+
+    monkeypatch.setattr(settings, "document_query_max_results", 2)
+    hits = [[{"document_id": f"d{i}", "score": i / 10} for i in range(5)]]
+    aggregates = _aggregate_document_hits(["q"], hits, coverage_min_score=0.0)
+    assert [a["document_id"] for a in aggregates] == ["d4", "d3"]